@@ -1,12 +1,30 @@
 import argparse
 import logging
 from .locker import OcLdapUserLocker
+from .daemon import LockerDaemon
 
 _p = argparse.ArgumentParser(description="LDAP user locker job for Scheduler usage")
 _p.add_argument("--config", type=str, required=True, help="Path to JSON configuration")
 _p.add_argument("--log-level", type=int, default=20, help="Logging level (integer)")
+_p.add_argument("--profile", action="store_true", help="Log rule evaluation statistics at the end of the run")
+_p.add_argument("--workers", type=int, help="Number of worker processes to evaluate rules in")
+_p.add_argument("--deadline", type=int, help="Seconds a run may take, users not reached by then are left for the next run")
+_p.add_argument("--resume", action="store_true", help="Continue the run interrupted from the checkpoint, if configured")
+_p.add_argument("--daemon", action="store_true", help="Keep running, start the job every '--interval' seconds")
+_p.add_argument("--interval", type=int, default=3600, help="Seconds between job starts in daemon mode")
+_snapshot = _p.add_mutually_exclusive_group()
+_snapshot.add_argument("--snapshot-write", type=str, help="Write directory snapshot to the path given and evaluate from it")
+_snapshot.add_argument("--snapshot-read", type=str, help="Evaluate from directory snapshot at the path given")
+_p.add_argument("--snapshot-ttl", type=int, help="Seconds the snapshot is reused for, it is re-written when expired")
 _args=_p.parse_args()
 
 logging.basicConfig(format = "%(pathname)s: %(asctime)-15s: %(levelname)s: %(funcName)s: %(lineno)d: %(message)s", level = _args.log_level)
 
-OcLdapUserLocker(_args.config).run()
+_locker = OcLdapUserLocker(_args.config, profile=_args.profile,
+        snapshot_path=_args.snapshot_write or _args.snapshot_read, snapshot_ttl=_args.snapshot_ttl,
+        snapshot_refresh=bool(_args.snapshot_write), workers=_args.workers, deadline=_args.deadline, resume=_args.resume)
+
+if _args.daemon:
+    LockerDaemon(_locker, _args.interval).run()
+else:
+    _locker.run()
@@ -0,0 +1,152 @@
+import datetime
+import json
+import logging
+import os
+
+
+def get_next_action_date(lock_date, days_before_lock, notification_days):
+    """
+    Find out the earliest date when processing of the user may give another result:
+    the next notification or the lock. The date is conservative: 'days before lock' may become equal
+    to the value configured at some time of that date, so processing earlier only repeats the calculation.
+    Time attributes may only grow, so the real lock date may be later but never earlier.
+    :param datetime.datetime lock_date: date when account will be locked
+    :param int days_before_lock: days left for the date when account will be locked
+    :param list notification_days: 'days_before' values of the notifications configured
+    :return datetime.date: 'None' if the account is to be locked now
+    """
+    if days_before_lock <= 0:
+        return None
+
+    _days = max(list(_x for _x in notification_days if 0 < _x < days_before_lock) + [0])
+    return (lock_date - datetime.timedelta(days=_days + 1)).date()
+
+
+class ActionIndex:
+    def __init__(self, path):
+        """
+        Next action dates of users, kept in a JSON file sorted by date
+        :param str path: path to the file
+        """
+        self._path = path
+        self._dates = dict()
+        # state of change tracking since the previous run, see 'sync.ChangeTracker'
+        self.change_state = None
+        self.last_full_scan = None
+        self.policy_digest = None
+
+    def __len__(self):
+        return len(self._dates)
+
+    def load(self):
+        """
+        Read the index from the file, the index is empty if the file does not exist
+        """
+        self.clear()
+
+        if not os.path.exists(self._path):
+            logging.info("Action index '%s' does not exist yet" % self._path)
+            return
+
+        with open(self._path, mode='rt') as _fl_in:
+            _data = json.load(_fl_in)
+
+        self.change_state = _data.get("change_state")
+        self.policy_digest = _data.get("policy_digest")
+
+        if _data.get("last_full_scan"):
+            self.last_full_scan = datetime.datetime.fromisoformat(_data.get("last_full_scan"))
+
+        for _date, _dns in (_data.get("dates") or dict()).items():
+            _date = datetime.date.fromisoformat(_date)
+
+            for _dn in _dns:
+                self._dates[_dn] = _date
+
+        logging.info("Action index '%s': %d users" % (self._path, len(self._dates)))
+
+    def save(self):
+        """
+        Write the index to the file, the previous one is replaced at once
+        """
+        _dates = dict()
+
+        for _dn, _date in self._dates.items():
+            _dates.setdefault(_date.isoformat(), list()).append(_dn)
+
+        _data = {
+            "change_state": self.change_state,
+            "last_full_scan": self.last_full_scan.isoformat() if self.last_full_scan else None,
+            "policy_digest": self.policy_digest,
+            "dates": dict((_date, sorted(_dns)) for _date, _dns in sorted(_dates.items()))}
+
+        with open(self._path + ".tmp", mode='wt') as _fl_out:
+            json.dump(_data, _fl_out, indent=1)
+
+        os.replace(self._path + ".tmp", self._path)
+        logging.info("Action index '%s' saved: %d users" % (self._path, len(self._dates)))
+
+    def clear(self):
+        """
+        Forget all users and run states
+        """
+        self._dates = dict()
+        self.change_state = None
+        self.last_full_scan = None
+        self.policy_digest = None
+
+    def set(self, dn, date):
+        """
+        Set the next action date of a user
+        :param str dn: user record DN
+        :param datetime.date date: next action date, 'None' to remove the user
+        """
+        if date is None:
+            self.discard(dn)
+            return
+
+        self._dates[dn] = date
+
+    def get(self, dn):
+        """
+        :param str dn: user record DN
+        :return datetime.date: next action date, 'None' if the user is not in the index
+        """
+        return self._dates.get(dn)
+
+    def discard(self, dn):
+        """
+        Remove a user from the index
+        :param str dn: user record DN
+        """
+        self._dates.pop(dn, None)
+
+    def pop_due(self, date):
+        """
+        Remove the users due for the date given (or earlier) from the index
+        :param datetime.date date: date of the run
+        :return list: DNs of the users due, the earliest first
+        """
+        _due = sorted((_x for _x in self._dates.items() if _x[1] <= date), key=lambda _x: (_x[1], _x[0]))
+
+        for _dn, _date in _due:
+            del self._dates[_dn]
+
+        return list(_x[0] for _x in _due)
+
+    def is_full_scan_due(self, now, full_scan_days, policy_digest):
+        """
+        Check if all users are to be processed: the index was never built, is too old, or the policy changed
+        :param datetime.datetime now: current date and time
+        :param int full_scan_days: days between full scans
+        :param str policy_digest: digest of the current policy configuration
+        :return bool:
+        """
+        if not self.last_full_scan or not self.change_state:
+            return True
+
+        if self.policy_digest != policy_digest:
+            logging.info("Policy configuration changed since the last full scan")
+            return True
+
+        return (now - self.last_full_scan) >= datetime.timedelta(days=full_scan_days)
@@ -0,0 +1,104 @@
+import datetime
+import json
+import logging
+import os
+
+# actions recorded, any of them means the user is not to be processed again by a resumed run
+ACTION_DONE = "done"
+ACTION_NOTIFIED = "notified"
+ACTION_LOCKED = "locked"
+
+
+class RunCheckpoint:
+    def __init__(self, path):
+        """
+        Progress of a run: the users processed and the actions completed, to resume an interrupted run.
+        Kept in a text file: a JSON header line, then a line per user processed or action completed,
+        appended and flushed at once, so the file is valid whenever the process is killed.
+        :param str path: path to the file
+        """
+        self._path = path
+        self._file = None
+        self._users = set()
+        self.actions = dict()
+
+    def __contains__(self, dn):
+        return dn in self._users
+
+    def __len__(self):
+        return len(self._users)
+
+    def resume(self, date, policy_digest):
+        """
+        Load the checkpoint of the run interrupted, if it was started the same date with the same policy
+        Decisions (notifications especially) depend on the date, so a checkpoint of another day is not valid
+        :param datetime.date date: date of the run
+        :param str policy_digest: digest of the current policy configuration
+        :return bool: the checkpoint was loaded and is open for appending
+        """
+        if not os.path.exists(self._path):
+            logging.info("Checkpoint '%s' does not exist, nothing to resume" % self._path)
+            return False
+
+        with open(self._path, mode='rt') as _fl_in:
+            try:
+                _header = json.loads(_fl_in.readline())
+            except ValueError:
+                _header = dict()
+
+            if _header.get("date") != date.isoformat() or _header.get("policy_digest") != policy_digest:
+                logging.warning("Checkpoint '%s' is of another day or policy, not resumed" % self._path)
+                return False
+
+            for _line in _fl_in:
+                # the last line may be incomplete if the process was killed while writing it
+                if not _line.endswith("\n"):
+                    break
+
+                _action, _dn = _line.rstrip("\n").split("\t", 1)
+                self._users.add(_dn)
+                self.actions[_action] = self.actions.get(_action, 0) + 1
+
+        logging.info("Resuming from checkpoint '%s': %d users processed already" % (self._path, len(self._users)))
+        self._file = open(self._path, mode='at')
+        return True
+
+    def start(self, date, policy_digest):
+        """
+        Start a new checkpoint, the previous one is dropped
+        :param datetime.date date: date of the run
+        :param str policy_digest: digest of the current policy configuration
+        """
+        self._users = set()
+        self.actions = dict()
+        self._file = open(self._path, mode='wt')
+        self._file.write(json.dumps({
+            "date": date.isoformat(),
+            "policy_digest": policy_digest,
+            "started": datetime.datetime.now().isoformat()}) + "\n")
+        self._file.flush()
+
+    def add(self, dn, action=ACTION_DONE):
+        """
+        Record the user processed or the action completed
+        :param str dn: user record DN
+        :param str action: action completed
+        """
+        self._users.add(dn)
+        self.actions[action] = self.actions.get(action, 0) + 1
+        self._file.write("%s\t%s\n" % (action, dn))
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        """
+        Drop the checkpoint of the run completed
+        """
+        self.close()
+
+        if os.path.exists(self._path):
+            os.remove(self._path)
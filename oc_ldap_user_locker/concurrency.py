@@ -0,0 +1,117 @@
+import logging
+import socket
+import threading
+import time
+from ldap3.core.exceptions import LDAPResponseTimeoutError, LDAPOperationResult
+
+# busy, unwillingToPerform: the server asks to slow down
+OVERLOAD_LDAP_RESULTS = [51, 53]
+
+
+def is_overload_ldap_error(error):
+    """
+    :param Exception error: error raised by LDAP operation
+    :return bool: the server is overloaded, fewer requests are to be in flight
+    """
+    if isinstance(error, (LDAPResponseTimeoutError, socket.timeout)):
+        return True
+
+    return isinstance(error, LDAPOperationResult) and error.result in OVERLOAD_LDAP_RESULTS
+
+
+class AdaptiveLimit:
+    def __init__(self, min_limit=1, max_limit=8, target_latency=0.5, backoff=0.5):
+        """
+        Number of requests in flight adjusted by AIMD (additive increase, multiplicative decrease):
+        it grows by one per window of requests completed in time, and is multiplied by 'backoff'
+        when a request is slower than the target or the server is overloaded.
+        Requests started before the decrease do not decrease it again, so a burst of slow responses
+        counts as a single signal.
+        :param int min_limit: requests allowed in flight always
+        :param int max_limit: requests allowed in flight at most
+        :param float target_latency: seconds, a slower response means the server is saturated
+        :param float backoff: multiplier of the limit on overload
+        """
+        if not min_limit or min_limit < 1 or not max_limit or max_limit < min_limit:
+            raise ValueError("Invalid concurrency bounds: '%s' - '%s'" % (min_limit, max_limit))
+
+        if not 0 < backoff < 1:
+            raise ValueError("Invalid backoff: '%s'" % backoff)
+
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self._target_latency = target_latency
+        self._backoff = backoff
+        self._limit = float(min_limit)
+        # requests completed in time since the limit was changed
+        self._window = 0
+        self._in_flight = 0
+        self._started = 0
+        self._decreased_at = 0
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self):
+        return int(self._limit)
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def acquire(self):
+        """
+        Wait until a request may be sent
+        :return int: sequence number of the request, to be given to 'release'
+        """
+        with self._condition:
+            while self._in_flight >= self.limit:
+                self._condition.wait()
+
+            self._in_flight += 1
+            self._started += 1
+            return self._started
+
+    def release(self, sequence, latency, overloaded=False):
+        """
+        Record the request completed and adjust the limit
+        :param int sequence: sequence number returned by 'acquire'
+        :param float latency: seconds the request took
+        :param bool overloaded: the server refused the request as busy, or did not respond in time
+        """
+        with self._condition:
+            self._in_flight -= 1
+
+            if overloaded or (self._target_latency and latency > self._target_latency):
+                if sequence > self._decreased_at:
+                    self._limit = max(float(self.min_limit), self._limit * self._backoff)
+                    self._window = 0
+                    self._decreased_at = self._started
+                    logging.debug("Concurrency of LDAP requests decreased to %d, latency %.3f seconds%s" % (
+                        self.limit, latency, ", server is overloaded" if overloaded else ""))
+            else:
+                self._window += 1
+
+                if self._window >= self.limit:
+                    self._limit = min(float(self.max_limit), self._limit + 1)
+                    self._window = 0
+
+            self._condition.notify_all()
+
+    def call(self, func, is_overloaded):
+        """
+        Call the function when a request may be sent
+        :param func: function without arguments
+        :param is_overloaded: function telling the error means the server is overloaded
+        :return: result of the function
+        """
+        _sequence = self.acquire()
+        _start = time.monotonic()
+
+        try:
+            _result = func()
+        except Exception as _e:
+            self.release(_sequence, time.monotonic() - _start, overloaded=is_overloaded(_e))
+            raise
+
+        self.release(_sequence, time.monotonic() - _start)
+        return _result
@@ -0,0 +1,58 @@
+import logging
+import signal
+import threading
+import time
+
+
+class LockerDaemon:
+    def __init__(self, locker, interval):
+        """
+        Long-running mode: runs the locker on schedule keeping it alive between runs,
+        so LDAP connection, compiled policy and mailer are reused
+        :param OcLdapUserLocker locker: locker to run
+        :param int interval: seconds between starts of subsequent runs
+        """
+        if not interval or interval <= 0:
+            raise ValueError("Invalid interval: '%s'" % interval)
+
+        self._locker = locker
+        self._interval = interval
+        self._stop_event = threading.Event()
+
+    def stop(self, signum=None, frame=None):
+        """
+        Stop gracefully: the current run skips the users not processed yet, no more runs are started
+        Suitable as a signal handler
+        """
+        logging.info("Shutting down%s" % (" on signal %d" % signum if signum else ""))
+        self._stop_event.set()
+        self._locker.stop()
+
+    def run_once(self):
+        """
+        Reload configuration if it was modified and run the locker
+        Errors are logged and the LDAP connection is dropped, so the next run reconnects
+        """
+        try:
+            self._locker.reload_config()
+            self._locker.run()
+        except Exception as _e:
+            logging.exception(_e)
+            self._locker._ldap_c = None
+
+    def run(self):
+        """
+        Run the locker every interval until stopped, SIGTERM and SIGINT stop gracefully
+        """
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, self.stop)
+            signal.signal(signal.SIGINT, self.stop)
+
+        logging.info("Daemon started, interval: %d seconds" % self._interval)
+
+        while not self._stop_event.is_set():
+            _started = time.monotonic()
+            self.run_once()
+            self._stop_event.wait(max(0, self._interval - (time.monotonic() - _started)))
+
+        logging.info("Daemon stopped")
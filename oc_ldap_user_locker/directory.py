@@ -0,0 +1,111 @@
+import ldap3
+from ldap3.core.exceptions import LDAPOperationResult
+from oc_ldap_client.oc_ldap_objects import OcLdapUserRecord, OcLdapGroupRecord
+import logging
+
+# Simple Paged Results control, RFC 2696
+_PAGED_RESULTS_OID = '1.2.840.113556.1.4.319'
+
+# object classes the client gives to user and group records it reads and writes
+USER_OBJECT_CLASS = OcLdapUserRecord().get_attribute('objectClass')
+GROUP_OBJECT_CLASS = OcLdapGroupRecord().get_attribute('objectClass')
+
+# users to process, the ones locked permanently are left out
+ACTIVE_USERS_FILTER = "(&(objectClass=%s)(!(pwdAccountLockedTime=000001010000Z)))" % USER_OBJECT_CLASS
+
+_NO_SUCH_OBJECT = 32
+
+
+def iter_search(ldap_c, search_filter, attributes=None, page_size=100, get_operational_attributes=False):
+    """
+    Paged search under base DN of the catalogue
+    Only one page is kept in memory, and the connection may be used for other operations while iterating
+    :param OcLdap ldap_c: LDAP catalogue client
+    :param str search_filter: LDAP search filter
+    :param list attributes: attributes to request, 'None' for DNs only
+    :param int page_size: number of records per page
+    :param bool get_operational_attributes: request operational attributes also
+    :return: generator of tuples (DN, dictionary of attributes)
+    """
+    _search_args = {
+            "search_base": ldap_c.baseDn,
+            "search_scope": ldap3.SUBTREE,
+            "search_filter": search_filter,
+            "attributes": attributes or ldap3.NO_ATTRIBUTES,
+            "get_operational_attributes": get_operational_attributes,
+            "paged_size": page_size}
+
+    logging.debug("Paged search: %s, page size %d" % (search_filter, page_size))
+    _cookie = None
+
+    while True:
+        ldap_c.ldap_c.search(paged_cookie=_cookie, **_search_args)
+        _result = ldap_c.ldap_c.result
+
+        if _result.get("result") != 0:
+            raise LDAPOperationResult(result=_result.get("result"), description=_result.get("description"),
+                                      message=_result.get("message"))
+
+        # take everything needed from the connection before yielding:
+        # it is overwritten by any other operation made by the caller
+        _page = list((_x.entry_dn, _x.entry_attributes_as_dict) for _x in ldap_c.ldap_c.entries)
+        _cookie = ((_result.get("controls") or dict()).get(_PAGED_RESULTS_OID) or dict()).get("value", dict()).get("cookie")
+
+        for _item in _page:
+            yield _item
+
+        if not _cookie:
+            break
+
+
+def read_record(ldap_c, dn, attributes):
+    """
+    Read the attributes requested of the exact record
+    Operational attributes are to be named explicitly
+    :param OcLdap ldap_c: LDAP catalogue client
+    :param str dn: record DN
+    :param list attributes: attributes to request
+    :return tuple: (DN, dictionary of attributes), 'None' if record is not found
+    """
+    if not dn or not isinstance(dn, str):
+        raise ValueError('Invalid DN given')
+
+    _found = ldap_c.ldap_c.search(
+        search_base=dn,
+        search_scope=ldap3.BASE,
+        search_filter='(objectClass=*)',
+        attributes=attributes,
+        get_operational_attributes=False)
+
+    if not _found:
+        _result = ldap_c.ldap_c.result or dict()
+
+        # other errors (like 'busy') do not mean the record is missing
+        if _result.get("result") not in [0, _NO_SUCH_OBJECT]:
+            raise LDAPOperationResult(result=_result.get("result"), description=_result.get("description"),
+                                      message=_result.get("message"))
+
+        logging.error("Record '%s' was not found" % dn)
+        return None
+
+    _entries = ldap_c.ldap_c.entries
+    ldap_c._check_search_rslt(_entries)
+
+    return (_entries[0].entry_dn, _entries[0].entry_attributes_as_dict)
+
+
+def get_record(ldap_c, dn, rec_type, attributes):
+    """
+    Get a record with the attributes requested only
+    :param OcLdap ldap_c: LDAP catalogue client
+    :param str dn: record DN
+    :param rec_type: a class of record expected (OcLdapRecord or derived one)
+    :param list attributes: attributes to request
+    :return: record of 'rec_type', empty one if not found
+    """
+    _result = read_record(ldap_c, dn, attributes)
+
+    if _result is None:
+        return rec_type(ldap_record=None)
+
+    return rec_type(ldap_record={'dn': _result[0], 'attributes': _result[1]})
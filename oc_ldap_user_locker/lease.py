@@ -0,0 +1,279 @@
+import datetime
+import fcntl
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import ldap3
+from ldap3.utils.dn import parse_dn
+
+# LDAP result codes
+_ENTRY_ALREADY_EXISTS = 68
+
+
+def get_holder():
+    """
+    :return str: lease holder name of this process
+    """
+    return "%s:%d" % (socket.gethostname(), os.getpid())
+
+
+class FileLease:
+    def __init__(self, path):
+        """
+        Lease kept as an exclusive lock of a local file, for instances running on the same host
+        or sharing the file system; the lock is released by the system if the process dies
+        :param str path: path to the lock file, it is created if absent and kept
+        """
+        self._path = path
+        self._file = None
+        self.holder = get_holder()
+
+    @property
+    def lost(self):
+        # the lock can not be taken away while the file is open
+        return False
+
+    def acquire(self, wait=0, poll_interval=5):
+        """
+        Take the lease, waiting for it if held by another instance
+        :param float wait: seconds to wait, do not wait if zero
+        :param float poll_interval: seconds between attempts while waiting
+        :return bool: the lease is taken
+        """
+        _until = time.monotonic() + (wait or 0)
+        _file = open(self._path, mode='a+t')
+
+        while True:
+            try:
+                fcntl.flock(_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                _left = _until - time.monotonic()
+
+                if _left <= 0:
+                    _file.seek(0)
+                    logging.info("Lease '%s' is held by: %s" % (self._path, _file.read().strip() or "unknown"))
+                    _file.close()
+                    return False
+
+                time.sleep(min(poll_interval, _left))
+
+        # holder information is for logs of other instances only
+        _file.seek(0)
+        _file.truncate()
+        _file.write(json.dumps({"holder": self.holder, "taken": datetime.datetime.now().isoformat()}) + "\n")
+        _file.flush()
+        self._file = _file
+        logging.info("Lease '%s' is taken" % self._path)
+        return True
+
+    def release(self):
+        if self._file is None:
+            return
+
+        self._file.seek(0)
+        self._file.truncate()
+        fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        self._file.close()
+        self._file = None
+        logging.info("Lease '%s' is released" % self._path)
+
+
+class LdapLease:
+    def __init__(self, connect, dn, ttl=600):
+        """
+        Lease kept in LDAP entry, for instances running on different hosts
+        The entry ('applicationProcess' object class) is created by the first holder and kept,
+        'description' holds the holder and the expiration time in JSON.
+        The lease is taken and renewed with a single modification replacing the exact value read,
+        so of two instances only one succeeds. It is renewed by a thread every third of TTL while held,
+        and expires in TTL if the holder dies. Clocks of the hosts are to be synchronized.
+        :param connect: function without arguments returning new bound 'OcLdapUserCat'
+        :param str dn: lease entry DN
+        :param int ttl: seconds the lease is valid for without renewal
+        """
+        if not ttl or ttl <= 0:
+            raise ValueError("Invalid lease TTL: '%s'" % ttl)
+
+        self._connect = connect
+        self._dn = dn
+        self._ttl = ttl
+        self._ldap_c = None
+        self._value = None
+        self._lost = False
+        self._renewal = None
+        self._stop_event = threading.Event()
+        self.holder = get_holder()
+
+    @property
+    def lost(self):
+        """
+        :return bool: the lease expired or was taken by another instance while held
+        """
+        return self._lost
+
+    def _make_value(self, expires):
+        """
+        :param datetime.datetime expires: expiration time
+        :return str: 'description' value
+        """
+        return json.dumps({"holder": self.holder, "expires": expires.isoformat()}, sort_keys=True)
+
+    def _get_expires(self, value):
+        """
+        :param str value: 'description' value
+        :return datetime.datetime: expiration time, 'None' if the value is not parsed
+        """
+        try:
+            return datetime.datetime.fromisoformat(json.loads(value).get("expires"))
+        except (ValueError, TypeError, AttributeError):
+            return None
+
+    def _now(self):
+        return datetime.datetime.now(datetime.timezone.utc)
+
+    def _read_value(self):
+        """
+        :return str: current 'description' value of the entry, 'None' if absent
+        """
+        _connection = self._ldap_c.ldap_c
+        _connection.search(self._dn, "(objectClass=*)", search_scope=ldap3.BASE, attributes=["description"])
+
+        if not _connection.entries:
+            return None
+
+        _values = _connection.entries[0].entry_attributes_as_dict.get("description") or list()
+        return _values[0] if _values else None
+
+    def _replace_value(self, old, new):
+        """
+        Replace the value only if it was not changed by another instance
+        :param str old: value read
+        :param str new: value to set
+        :return bool: replaced
+        """
+        _changes = [(ldap3.MODIFY_ADD, [new])]
+
+        if old is not None:
+            _changes.insert(0, (ldap3.MODIFY_DELETE, [old]))
+
+        return bool(self._ldap_c.ldap_c.modify(self._dn, {"description": _changes}))
+
+    def _try_acquire(self):
+        """
+        :return bool: the lease is taken
+        """
+        _value = self._make_value(self._now() + datetime.timedelta(seconds=self._ttl))
+
+        if self._ldap_c.ldap_c.add(self._dn, ["applicationProcess"], {"cn": parse_dn(self._dn)[0][1],
+                                                                      "description": _value}):
+            self._value = _value
+            return True
+
+        if self._ldap_c.ldap_c.result.get("result") != _ENTRY_ALREADY_EXISTS:
+            raise ValueError("Lease entry '%s' is not created: %s" % (
+                self._dn, self._ldap_c.ldap_c.result.get("description")))
+
+        _current = self._read_value()
+        _expires = self._get_expires(_current) if _current else None
+
+        if _expires is not None and _expires > self._now():
+            logging.info("Lease '%s' is held by: %s" % (self._dn, _current))
+            return False
+
+        if not self._replace_value(_current, _value):
+            return False
+
+        self._value = _value
+        return True
+
+    def acquire(self, wait=0, poll_interval=5):
+        """
+        Take the lease, waiting for it if held by another instance
+        :param float wait: seconds to wait, do not wait if zero
+        :param float poll_interval: seconds between attempts while waiting
+        :return bool: the lease is taken
+        """
+        _until = time.monotonic() + (wait or 0)
+        self._ldap_c = self._connect()
+
+        while not self._try_acquire():
+            _left = _until - time.monotonic()
+
+            if _left <= 0:
+                self._close()
+                return False
+
+            time.sleep(min(poll_interval, _left))
+
+        logging.info("Lease '%s' is taken for %d seconds" % (self._dn, self._ttl))
+        self._lost = False
+        self._stop_event.clear()
+        self._renewal = threading.Thread(target=self._renew_loop, name="lease-renewal", daemon=True)
+        self._renewal.start()
+        return True
+
+    def renew(self):
+        """
+        Extend the lease held
+        :return bool: renewed, 'False' if the lease was taken by another instance
+        """
+        _value = self._make_value(self._now() + datetime.timedelta(seconds=self._ttl))
+
+        if not self._replace_value(self._value, _value):
+            return False
+
+        self._value = _value
+        return True
+
+    def _renew_loop(self):
+        while not self._stop_event.wait(self._ttl / 3.0):
+            try:
+                if self.renew():
+                    continue
+
+                logging.error("Lease '%s' was taken by another instance" % self._dn)
+                self._lost = True
+                return
+            except Exception as _e:
+                logging.warning("Lease '%s' is not renewed: %s" % (self._dn, _e))
+
+                if self._get_expires(self._value) <= self._now():
+                    logging.error("Lease '%s' expired" % self._dn)
+                    self._lost = True
+                    return
+
+    def release(self):
+        """
+        Stop renewal and expire the lease, so the next instance takes it at once
+        """
+        if self._ldap_c is None:
+            return
+
+        self._stop_event.set()
+
+        if self._renewal is not None:
+            self._renewal.join()
+            self._renewal = None
+
+        if not self._lost:
+            try:
+                self._replace_value(self._value, self._make_value(self._now()))
+                logging.info("Lease '%s' is released" % self._dn)
+            except Exception as _e:
+                logging.warning("Lease '%s' is not released, it expires in %d seconds: %s" % (
+                    self._dn, self._ttl, _e))
+
+        self._close()
+
+    def _close(self):
+        try:
+            self._ldap_c.ldap_c.unbind()
+        except Exception as _e:
+            logging.debug("Lease connection is not closed: %s" % _e)
+
+        self._ldap_c = None
+        self._value = None
@@ -0,0 +1,57 @@
+import datetime
+
+_MICROSECONDS_PER_DAY = 86400 * 10 ** 6
+
+
+def get_lock_dates(user_recs, days_valid, time_attributes, now=None):
+    """
+    Calculate lock dates and days before lock for a batch of users sharing the same configuration
+    Time attributes are put to 'datetime64' columns (NaT if not set) and processed with a few vectorized
+    operations, results are the same as for one-by-one calculation.
+    Requires 'numpy', ImportError is raised if it is not installed.
+    :param list user_recs: records from LDAP
+    :param int days_valid: how many days record is valid
+    :param list time_attributes: list of time attributes to check (strings)
+    :param datetime.datetime now: current date and time without timezone, 'now' if not given
+    :return list: tuples (lock date, days before lock) for each record; (None, None) means 'never'
+    """
+    import numpy
+
+    if not user_recs:
+        return list()
+
+    if not time_attributes:
+        return [(None, None)] * len(user_recs)
+
+    if now is None:
+        now = datetime.datetime.now()
+
+    _values = numpy.array(list(
+        list(_discard_timezone(_x.get_attribute(_time_attrib)) for _time_attrib in time_attributes)
+        for _x in user_recs), dtype='datetime64[us]')
+
+    # NaT is the smallest integer, so it loses to any value set
+    _latest = _values.view('int64').max(axis=1)
+    _never = _latest == numpy.iinfo('int64').min
+    _lock_dates = _latest + days_valid * _MICROSECONDS_PER_DAY
+    _now = numpy.datetime64(now.replace(tzinfo=None), 'us').astype('int64')
+
+    # floor division, as 'timedelta.days' does for negative values
+    _days_before_lock = (_lock_dates - _now) // _MICROSECONDS_PER_DAY
+    _lock_dates = _lock_dates.astype('datetime64[us]').astype(datetime.datetime)
+
+    return list((None, None) if _never[_i] else (_lock_dates[_i], int(_days_before_lock[_i]))
+                for _i in range(len(user_recs)))
+
+
+def _discard_timezone(value):
+    """
+    Prepare time attribute value for conversion to 'datetime64', 'None' becomes NaT
+    Timezone is discarded as for one-by-one calculation
+    :param datetime.datetime value: attribute value
+    :return datetime.datetime:
+    """
+    if not value:
+        return None
+
+    return value.replace(tzinfo=None)
@@ -5,14 +5,57 @@ from oc_ldap_client.oc_ldap import OcLdapRecord
 from oc_ldap_client.oc_ldap_objects import OcLdapUserCat, OcLdapUserRecord
 import re
 import datetime
+import itertools
+import collections
+import concurrent.futures
+import hashlib
+import threading
+import time
 from copy import copy
-from .mailer import LockMailer
+from .profiler import RuleProfiler
+from .policy import CompiledPolicy, SUBSTITUTE_ATTRIBUTES
+from .directory import iter_search, get_record, read_record, ACTIVE_USERS_FILTER
+from .membership import BitsetEngine
+from .lockdates import get_lock_dates
+from .action_index import ActionIndex, get_next_action_date
+from .sync import ChangeTracker
+from .snapshot import DirectorySnapshot
+from .checkpoint import RunCheckpoint, ACTION_NOTIFIED, ACTION_LOCKED
+from .resilience import RetryPolicy, CircuitBreaker, is_transient_ldap_error, is_transient_smtp_error
+from .concurrency import AdaptiveLimit, is_overload_ldap_error
+from .pool import LdapConnectionPool, clone_connection, open_connection, is_alive
+from .lease import FileLease, LdapLease
+from ldap3.utils.dn import to_dn
+
+# 'resilience' configuration defaults: timeouts are in seconds
+RESILIENCE_DEFAULTS = {
+    "ldap_timeout": 60,
+    "smtp_timeout": 60,
+    "retries": 2,
+    "retry_delay": 1,
+    "retry_max_delay": 30,
+    "smtp_failures": 5,
+    "smtp_reset_seconds": 900,
+    "connection_check_seconds": 60}
+
+# condition statistics file is shared by lockers of all directories and policy sets
+_STATISTICS_LOCK = threading.Lock()
 
 class OcLdapUserLocker:
-    def __init__(self, config_path):
+    def __init__(self, config_path, profile=False, snapshot_path=None, snapshot_ttl=None, snapshot_refresh=False,
+                 offline=False, workers=None, config=None, deadline=None, resume=False):
         """
         Initialization
         :param str config_path: path to JSON locker configuration
+        :param bool profile: collect rule evaluation statistics and log them at the end of the run
+        :param str snapshot_path: path to directory snapshot to evaluate from, LDAP is read directly if not set
+        :param int snapshot_ttl: seconds the snapshot may be used for, it is re-written from LDAP when expired
+        :param bool snapshot_refresh: write the snapshot from LDAP before every run
+        :param bool offline: evaluation from snapshot only, LDAP configuration is not required
+        :param int workers: number of worker processes to evaluate rules in, evaluated in this process if not set
+        :param dict config: configuration read already, the file is not read then
+        :param int deadline: seconds a run may take, users not reached by then are left for the next run
+        :param bool resume: continue the run interrupted from the checkpoint, if configured
         """
         if not config_path:
             raise ValueError("No configuration path provided")
@@ -21,25 +64,85 @@ class OcLdapUserLocker:
         logging.info("Configuration path: '%s'" % config_path)
         self._config_path = config_path
 
-        with open(config_path, mode='rt') as _fl_in:
-            self.config = json.load(_fl_in)
+        if config is None:
+            self._config_mtime = os.path.getmtime(config_path)
 
-        self._check_ldap_params()
+            with open(config_path, mode='rt') as _fl_in:
+                config = json.load(_fl_in)
+        else:
+            self._config_mtime = None
+
+        self.config = config
+
+        if not offline:
+            self._check_ldap_params()
+
+        self._stop_event = threading.Event()
+        self._deadline = deadline
+        self._deadline_at = None
+        self._resume = resume
+        self._checkpoint = None
+        self._incomplete = False
+        self._lease = None
         self._mailer = None
+        self._smtp_breaker = None
         self._ldap_c = None
-
-    def _check_ldap_params(self):
+        self._ldap_limiter = None
+        self._ldap_limiter_config = None
+        self._ldap_pool = None
+        self._ldap_pool_primary = None
+        self._readers = None
+        self._reader_local = threading.local()
+        self._snapshot_path = os.path.abspath(snapshot_path) if snapshot_path else None
+        self._snapshot_ttl = snapshot_ttl
+        self._snapshot_refresh = snapshot_refresh
+        self._snapshot = None
+        self._profile = profile
+        self._workers = workers
+        self._profiler = None
+        self._policy = None
+        self._decisions = None
+        self._referenced_dns = None
+        self._referenced_records = None
+        self._bitset = None
+        # 'numpy' was not imported, lock dates are calculated one-by-one without trying it again
+        self._numpy_missing = False
+        self._action_index = None
+        self._policy_sets = None
+        self._policy_sets_config = None
+        self._directories = None
+        self._directories_config = None
+        # locker the mailer is taken from, directory lockers share the one of the main locker
+        self._mailer_owner = self
+        self._mailer_lock = threading.Lock()
+        self._summary = collections.Counter()
+
+    def _check_ldap_params(self, config=None):
         """
         Check LDAP parameters are set
         update them from environment if not
+        :param dict config: configuration to check, updated in place; the one of the locker if not given
         """
-        _ldap_params = self.config.get("LDAP")
+        if config is None:
+            config = self.config
+
+        _ldap_params = config.get("LDAP")
 
         if not _ldap_params:
             logging.debug("LDAP configuration missing, trying to create it from environment")
-            self.config["LDAP"] = dict()
-            _ldap_params = self.config.get("LDAP")
+            config["LDAP"] = dict()
+            _ldap_params = config.get("LDAP")
+
+        # several directories to process
+        for _params in (_ldap_params if isinstance(_ldap_params, list) else [_ldap_params]):
+            self._check_directory_params(_params)
 
+    def _check_directory_params(self, ldap_params):
+        """
+        Check parameters of single LDAP directory are set
+        update them from environment if not
+        :param dict ldap_params: parameters to check, updated in place
+        """
         _ldap_env = {
             "url": "LDAP_URL",
             "user_cert": "LDAPTLS_CERT",
@@ -48,7 +151,7 @@ class OcLdapUserLocker:
             "baseDn": "LDAP_BASE_DN"}
 
         for _key in _ldap_env.keys():
-            _value = _ldap_params.get(_key) or os.getenv(_ldap_env.get(_key))
+            _value = ldap_params.get(_key) or os.getenv(_ldap_env.get(_key))
 
             if not _value:
                 raise ValueError("%s not set", _ldap_env.get(_key))
@@ -59,7 +162,394 @@ class OcLdapUserLocker:
                     _value = os.path.join(os.path.dirname(self._config_path), _value)
 
             logging.debug("%s: '%s'" % (_ldap_env.get(_key), _value))
-            self.config["LDAP"][_key] = _value
+            ldap_params[_key] = _value
+
+    def reload_config(self):
+        """
+        Read configuration again if the file was modified since it was read
+        LDAP connection, mailer and compiled policy are kept unless the corresponding sections were changed
+        :return bool: configuration was re-read
+        """
+        _mtime = os.path.getmtime(self._config_path)
+
+        if _mtime == self._config_mtime:
+            return False
+
+        logging.info("Configuration '%s' was modified, reloading" % self._config_path)
+
+        with open(self._config_path, mode='rt') as _fl_in:
+            _config = json.load(_fl_in)
+
+        # the configuration is applied only if valid, the previous one is kept otherwise
+        self._check_ldap_params(_config)
+        _previous = self.config
+        self.config = _config
+        self._config_mtime = _mtime
+
+        if _config.get("LDAP") != _previous.get("LDAP"):
+            logging.info("LDAP configuration changed, reconnecting on the next run")
+            self._close_ldap()
+
+        if _config.get("SMTP") != _previous.get("SMTP"):
+            self._mailer = None
+            self._smtp_breaker = None
+
+        if _config.get("users") == _previous.get("users"):
+            # keep the compiled policy
+            _config["users"] = _previous.get("users")
+
+        return True
+
+    def _close_ldap(self):
+        """
+        Unbind and drop LDAP connection, it is made again on the next run
+        """
+        if self._ldap_c is None:
+            return
+
+        try:
+            self._ldap_c.ldap_c.unbind()
+        except Exception as _e:
+            logging.debug("LDAP connection is not closed: %s" % _e)
+
+        self._ldap_c = None
+
+    def stop(self):
+        """
+        Request the run to stop: users not processed yet are skipped
+        """
+        logging.info("Stop requested")
+        self._stop_event.set()
+
+    def _is_stopped(self):
+        """
+        :return bool: the run is not to process all users: stop was requested, the lease was lost,
+            the deadline has passed or the evaluation was cut short
+        """
+        return self._is_stop_requested() or self._is_deadline_passed() or self._incomplete
+
+    def _is_stop_requested(self):
+        """
+        :return bool: stop was requested or the lease was lost, nothing more is to be done
+        """
+        if self._stop_event.is_set():
+            return True
+
+        return self._lease is not None and self._lease.lost
+
+    def _is_deadline_passed(self):
+        return self._deadline_at is not None and time.monotonic() >= self._deadline_at
+
+    def _get_evaluation_path(self, key):
+        """
+        Get path to a file from 'evaluation' configuration, relative to configuration directory
+        :param str key: 'evaluation' configuration key
+        :return str: absolute path or None if not configured
+        """
+        _path = (self.config.get("evaluation") or dict()).get(key)
+
+        if not _path:
+            return None
+
+        if not os.path.isabs(_path):
+            _path = os.path.join(os.path.dirname(self._config_path), _path)
+
+        return _path
+
+    def _load_statistics(self):
+        """
+        Load condition statistics observed in previous runs
+        :return dict: statistics by condition signature, empty if not configured or not collected yet
+        """
+        _path = self._get_evaluation_path("statistics")
+
+        if not _path or not os.path.exists(_path):
+            return dict()
+
+        logging.debug("Loading condition statistics from '%s'" % _path)
+
+        with open(_path, mode='rt') as _fl_in:
+            return json.load(_fl_in)
+
+    def _save_statistics(self):
+        """
+        Merge condition statistics observed in this run to the ones from previous runs and save them
+        """
+        _path = self._get_evaluation_path("statistics")
+
+        if not _path or self._policy is None:
+            return
+
+        with _STATISTICS_LOCK:
+            _statistics = self._policy.collect_statistics(self._load_statistics())
+            logging.debug("Saving condition statistics to '%s'" % _path)
+
+            with open(_path, mode='wt') as _fl_out:
+                json.dump(_statistics, _fl_out, indent=4, sort_keys=True)
+
+    def _get_policy(self):
+        """
+        Get policy compiled from 'users' configuration, compile it if configuration was changed
+        :return CompiledPolicy:
+        """
+        _users_conf = self.config.get("users")
+
+        if self._policy is None or self._policy.users is not _users_conf:
+            self._policy = CompiledPolicy(_users_conf, statistics=self._load_statistics())
+
+        return self._policy
+
+    def _get_policy_digest(self):
+        """
+        :return str: digest of policy configuration, to find out it was changed since the previous run
+        """
+        _policy_conf = self.config.get("policy_sets") or self.config.get("users")
+        return hashlib.sha256(json.dumps(_policy_conf, sort_keys=True).encode("utf8")).hexdigest()
+
+    def _get_policy_sets(self):
+        """
+        Get lockers for 'policy_sets' configuration, create them if configuration was changed
+        Every set is configured as the whole configuration with the keys of the set replaced
+        :return list: OcLdapUserLocker objects, empty if policy sets are not configured
+        """
+        if self._policy_sets is not None and self._policy_sets_config is self.config:
+            return self._policy_sets
+
+        _sets_conf = self.config.get("policy_sets") or list()
+
+        if _sets_conf and self.config.get("users"):
+            raise ValueError("'users' and 'policy_sets' can not be configured both")
+
+        self._policy_sets = list()
+        self._policy_sets_config = self.config
+
+        for _index, _set_conf in enumerate(_sets_conf):
+            if not _set_conf.get("users"):
+                raise ValueError("No 'users' configured for policy set #%d" % _index)
+
+            _config = dict((_k, _v) for _k, _v in self.config.items() if _k != "policy_sets")
+            _config.update(_set_conf)
+            _config["name"] = _set_conf.get("name") or "#%d" % _index
+
+            # templates are relative to the same configuration directory
+            self._policy_sets.append(OcLdapUserLocker(self._config_path, profile=self._profile, offline=True,
+                                                      config=_config))
+
+        return self._policy_sets
+
+    def _get_directories(self):
+        """
+        Get lockers for LDAP directories if 'LDAP' configuration is a list, create them if configuration was changed
+        Directory lockers share the mailer and the stop request of this one, and compile the policy themselves:
+        condition statistics are observed by every directory thread apart and merged when the directories are done;
+        action index and snapshot files get the directory position as a suffix
+        :return list: OcLdapUserLocker objects, empty if a single directory is configured
+        """
+        if self._directories is not None and self._directories_config is self.config:
+            return self._directories
+
+        _ldap_conf = self.config.get("LDAP")
+
+        # connections to the directories which were not re-configured are kept
+        _connections = dict((json.dumps(_x.config.get("LDAP"), sort_keys=True), _x._ldap_c)
+                            for _x in self._directories or list())
+        self._directories = list()
+        self._directories_config = self.config
+
+        if not isinstance(_ldap_conf, list):
+            return self._directories
+
+        for _index, _ldap_params in enumerate(_ldap_conf):
+            _config = dict(self.config)
+            _config["LDAP"] = _ldap_params
+            _evaluation = dict(self.config.get("evaluation") or dict())
+
+            for _key in ["action_index", "checkpoint"]:
+                if _evaluation.get(_key):
+                    _evaluation[_key] = self._get_directory_path(_evaluation.get(_key), _index)
+
+            _config["evaluation"] = _evaluation
+
+            _lease = self.config.get("lease") or dict()
+
+            if _lease.get("path") or _lease.get("dn"):
+                # every directory is a shard with its own lease
+                _config["lease"] = dict(_lease)
+                _config["lease"]["path"] = self._get_directory_path(_lease.get("path"), _index)
+                _config["lease"]["dn"] = self._get_directory_dn(_lease.get("dn"), _index)
+
+            _locker = OcLdapUserLocker(
+                    self._config_path, snapshot_path=self._get_directory_path(self._snapshot_path, _index),
+                    snapshot_ttl=self._snapshot_ttl, snapshot_refresh=self._snapshot_refresh,
+                    workers=self._workers, config=_config, resume=self._resume)
+            _locker._ldap_c = _connections.get(json.dumps(_ldap_params, sort_keys=True))
+            _locker._mailer_owner = self
+            _locker._stop_event = self._stop_event
+            self._directories.append(_locker)
+
+        return self._directories
+
+    def _get_directory_path(self, path, index):
+        """
+        :param str path: path to a file kept per directory
+        :param int index: directory position in 'LDAP' configuration
+        :return str: path with the position added before the extension, 'None' if no path given
+        """
+        if not path:
+            return None
+
+        _root, _ext = os.path.splitext(path)
+        return "%s.%d%s" % (_root, index, _ext)
+
+    def _get_directory_dn(self, dn, index):
+        """
+        :param str dn: DN of an entry kept per directory
+        :param int index: directory position in 'LDAP' configuration
+        :return str: DN with the position added to the first RDN, 'None' if no DN given
+        """
+        if not dn:
+            return None
+
+        _rdns = to_dn(dn)
+        return ",".join(["%s.%d" % (_rdns[0], index)] + _rdns[1:])
+
+    def _get_directory_name(self):
+        """
+        :return str: directory description for logs
+        """
+        _ldap_params = self.config.get("LDAP") or dict()
+        return "%s %s" % (_ldap_params.get("url"), _ldap_params.get("baseDn"))
+
+    def _prepare_dotted_conditions(self):
+        """
+        Evaluate dotted conditions against all referenced records at once, if configured ('inverted' strategy)
+        Then a condition for a user is checked as an intersection of referenced DNs with the ones matched,
+        without reading referenced records for each user
+        """
+        self._referenced_dns = None
+        _strategy = (self.config.get("evaluation") or dict()).get("dotted_conditions") or "lookup"
+
+        if _strategy not in ["lookup", "inverted"]:
+            raise NotImplementedError("Dotted conditions strategy '%s' is not supported" % _strategy)
+
+        if _strategy == "lookup":
+            return
+
+        # one level of dereferencing is supported, deeper conditions are checked by lookup
+        _conditions = dict()
+
+        for _section in self._get_policy().sections:
+            for _condition in _section.conditions:
+                if _condition.depth != 1:
+                    continue
+
+                _conditions.setdefault(_condition.attrib.split(".", 1)[1].lower(), dict())[_condition.signature] = _condition
+
+        self._referenced_dns = dict()
+
+        for _attrib, _attrib_conditions in _conditions.items():
+            _matched = dict((_signature, set()) for _signature in _attrib_conditions.keys())
+
+            for _dn, _attributes in self._iter_records_with(_attrib):
+                _object_rec = OcLdapRecord({'dn': _dn, 'attributes': _attributes})
+
+                for _signature, _condition in _attrib_conditions.items():
+                    try:
+                        if self._compare_attribute(_attrib, _object_rec, _condition.match_conf):
+                            _matched[_signature].add(_dn.lower())
+                    except NotImplementedError as _e:
+                        logging.warning("Record '%s' is not comparable for '%s': %s" % (_dn, _condition.attrib, _e))
+
+            for _signature, _dns in _matched.items():
+                logging.info("Condition '%s': %d referenced records matched" % (
+                    _attrib_conditions[_signature].attrib, len(_dns)))
+                self._referenced_dns[_signature] = frozenset(_dns)
+
+    def _prepare_bitset_engine(self):
+        """
+        Compile membership conditions to masks, if 'bitset' engine is configured
+        Flat conditions on configured attributes and dotted conditions evaluated with 'inverted' strategy
+        are compiled, the rest are evaluated as usual
+        """
+        self._bitset = None
+        _evaluation = self.config.get("evaluation") or dict()
+        _engine = _evaluation.get("engine") or "default"
+
+        if _engine not in ["default", "bitset"]:
+            raise NotImplementedError("Evaluation engine '%s' is not supported" % _engine)
+
+        if _engine == "default":
+            return
+
+        self._bitset = BitsetEngine(_evaluation.get("bitset_attributes") or ["memberOf"])
+
+        for _section in self._get_policy().sections:
+            for _condition in _section.conditions:
+                if _condition.head.lower() not in self._bitset.attributes or _condition.signature in self._bitset:
+                    continue
+
+                if _condition.is_dotted:
+                    if self._referenced_dns is not None and _condition.signature in self._referenced_dns:
+                        self._bitset.add_condition(
+                                _condition.signature, sorted(self._referenced_dns[_condition.signature]))
+
+                    continue
+
+                _match_conf = _condition.match_conf or dict()
+                _comparison = _match_conf.get('comparison') or dict()
+
+                if (_comparison.get('type') or 'flat') != 'flat':
+                    continue
+
+                self._bitset.add_condition(
+                        _condition.signature, _match_conf.get('values'), _comparison.get('condition') or 'all')
+
+        self._bitset.log_summary()
+
+    def _compare_referenced_dns(self, user_rec, condition):
+        """
+        Check dotted condition by referenced DNs matched in advance
+        :param OcLdapRecord user_rec: LDAP record for user account
+        :param PolicyCondition condition: compiled condition
+        :return bool:
+        """
+        _object_dn_list = user_rec.get_attribute(condition.head)
+
+        if not _object_dn_list:
+            logging.debug("Comparing attribute '%s' is empty" % condition.head)
+            return False
+
+        if not isinstance(_object_dn_list, list):
+            _object_dn_list = [_object_dn_list]
+
+        _matched_dns = self._referenced_dns[condition.signature]
+        return any(_x.lower() in _matched_dns for _x in _object_dn_list if _x and isinstance(_x, str))
+
+    def _evaluate_condition(self, user_rec, condition, masks=None):
+        """
+        Check single compiled condition for the user, choosing the evaluation strategy
+        :param OcLdapRecord user_rec: LDAP record for user account
+        :param PolicyCondition condition: compiled condition
+        :param dict masks: user attribute masks for 'bitset' engine by attribute name, filled on demand
+        :return bool:
+        """
+        if self._bitset is not None and condition.signature in self._bitset:
+            if masks is None:
+                masks = dict()
+
+            _head = condition.head.lower()
+
+            if _head not in masks:
+                masks[_head] = self._bitset.get_mask(user_rec.get_attribute(_head))
+
+            # 'None' means values are not comparable as masks, regular comparison will report it
+            if masks[_head] is not None:
+                return self._bitset.match(condition.signature, masks[_head])
+
+        if self._referenced_dns is not None and condition.signature in self._referenced_dns:
+            return self._compare_referenced_dns(user_rec, condition)
+
+        return self._compare_attribute(condition.attrib, user_rec, condition.match_conf)
 
     def _compare_attribute_values(self, values, match_conf):
         """
@@ -174,7 +664,11 @@ class OcLdapUserLocker:
         _result = False
         for _object_dn in _object_dn_list:
             logging.debug("Started configuration analysis for object with DN = %s" % _object_dn)
-            _object_rec = self._ldap_c.get_record(_object_dn, OcLdapRecord)
+
+            if self._profiler:
+                self._profiler.add_fetch()
+
+            _object_rec = self._get_referenced_record(_object_dn)
             if not self._compare_attribute(_attrib_split, _object_rec, match_conf):
                 logging.debug("Failed on attribute: '%s'" % _attrib_split)
             else:
@@ -182,28 +676,48 @@ class OcLdapUserLocker:
                 break
         return _result
 
-    def _check_user_conf(self, user_rec, conf):
+    def _check_user_conf(self, user_rec, section, results=None, masks=None):
         """
         Check user configuration is suitable for our case
         :param OcLdapRecord user_rec: LDAP record for user account
-        :param dict conf: user configuration
+        :param PolicySection section: compiled user configuration
+        :param dict results: condition results for this user by condition signature, shared between sections
+        :param dict masks: user attribute masks for 'bitset' engine, shared between sections
         :return int: number of attributes matched, or None if configuration is not applicable
         """
 
         # if no 'condition_attributes' specified - it is our case
-        if not conf.get('condition_attributes'):
+        if not section.conditions:
             return 0
 
+        if results is None:
+            results = dict()
+
         # search for attribute otherwise
-        # all of attributes are to be matched
+        # all of attributes are to be matched, conditions are ordered by cost
+        # so the evaluation stops at the first failed one without checking expensive ones
         # we have to raise an exception if one of mandatory values is not specified
         _matched_attributes = 0
-        for _attrib in conf['condition_attributes'].keys():
-            logging.debug("Comparing attribute: '%s'" % _attrib)
-            _match_conf = conf['condition_attributes'][_attrib]
 
-            if not self._compare_attribute(_attrib, user_rec, _match_conf):
-                logging.debug("Failed on attribute: '%s'" % _attrib)
+        for _condition in section.conditions:
+            logging.debug("Comparing attribute: '%s'" % _condition.attrib)
+            _result = results.get(_condition.signature)
+
+            if _result is None:
+                # the same condition was not checked in another section yet
+                if self._profiler:
+                    _started = self._profiler.begin(section.index, _condition.attrib)
+
+                _result = self._evaluate_condition(user_rec, _condition, masks)
+                _condition.observe(_result)
+                results[_condition.signature] = _result
+
+                if self._profiler:
+                    self._profiler.end(_started, section.index, _condition.attrib, matched=_result,
+                                       short_circuit=not _result and _matched_attributes + 1 < len(section.conditions))
+
+            if not _result:
+                logging.debug("Failed on attribute: '%s'" % _condition.attrib)
                 return None
 
             _matched_attributes += 1
@@ -214,30 +728,140 @@ class OcLdapUserLocker:
         """
         Parse users configuration and find valid days
         :param OcLdapRecord user_rec: LDAP record for user account
-        :return int:
+        :return dict: configuration section to apply, None if nothing is suitable
         """
         logging.debug("Started configuration analysis for %s" % user_rec.get_attribute('cn'))
-        _users_conf = self.config.get("users")
-        _conf_f = None
+        _policy = self._get_policy()
+
+        if self._decisions is None:
+            return self._evaluate_sections(user_rec, _policy)
+
+        # users with the same values of tested attributes get the same decision within the run
+        _fingerprint = _policy.get_fingerprint(user_rec)
+
+        if _fingerprint in self._decisions:
+            logging.debug("Decision for the same attribute values is known already")
+            return self._decisions[_fingerprint]
+
+        _conf = self._evaluate_sections(user_rec, _policy)
+        self._decisions[_fingerprint] = _conf
+        return _conf
+
+    def _evaluate_sections(self, user_rec, policy):
+        """
+        Evaluate compiled configuration sections to find the one to apply
+        :param OcLdapRecord user_rec: LDAP record for user account
+        :param CompiledPolicy policy: compiled 'users' configuration
+        :return dict: configuration section to apply, None if nothing is suitable
+        """
+        _results = dict()
+        _masks = dict()
+
+        # sections testing attributes the user does not have are not to be evaluated at all
+        _inapplicable = policy.get_inapplicable_sections(user_rec)
+
+        for _section in policy.ordered_sections:
+            if _section.index in _inapplicable:
+                logging.debug("Skipping section #%d: tested attributes missing" % _section.index)
+
+                if self._profiler:
+                    self._profiler.end(self._profiler.begin(_section.index), _section.index, short_circuit=True)
 
-        # analyse all cases one-by-one
-        _matched_attributes = None
+                continue
+
+            if self._profiler:
+                _started = self._profiler.begin(_section.index)
 
-        for _conf in _users_conf:
-            _matched_attributes_c = self._check_user_conf(user_rec, _conf)
+            _matched_attributes = self._check_user_conf(user_rec, _section, _results, _masks)
 
-            if _matched_attributes_c is None:
+            if self._profiler:
+                self._profiler.end(_started, _section.index, matched=_matched_attributes is not None)
+
+            if _matched_attributes is None:
                 # this configuration can not be applied
                 continue
 
-            # NOTE: checking '_matched_attributes' for 'None' is a sort of paranoia since
-            #       it should never happen
-            if _conf_f is None or _matched_attributes_c > _matched_attributes:
-                # we found at least one suitable configration:
-                _conf_f = _conf
-                _matched_attributes = _matched_attributes_c
+            # sections are ordered by the number of conditions, then by position in configuration,
+            # so none of the rest can match more attributes or win on tie
+            logging.debug("Section #%d matched %d attributes" % (_section.index, _matched_attributes))
+            return _section.conf
+
+        return None
+
+    def _read_record(self, dn, attributes, referenced=False):
+        """
+        Read record from the snapshot if evaluating from it, from LDAP otherwise
+        :param str dn: record distinct name (DN)
+        :param list attributes: attributes to read
+        :param bool referenced: the record is referenced by dotted condition, user record otherwise
+        :return tuple: (DN, dictionary of attributes), 'None' if record is not found
+        """
+        if self._snapshot is not None:
+            return self._snapshot.read_record(dn, attributes, referenced=referenced)
+
+        return self._call_ldap(lambda _ldap_c: read_record(_ldap_c, dn, attributes))
+
+    def _iter_records_with(self, attrib):
+        """
+        Iterate over records having the attribute given: referenced ones from the snapshot
+        if evaluating from it, all under base DN otherwise
+        :param str attrib: attribute name
+        :return: generator of tuples (DN, dictionary with the attribute)
+        """
+        if self._snapshot is not None:
+            return self._snapshot.iter_referenced(attrib)
+
+        return iter_search(self._ldap_c, "(%s=*)" % attrib, attributes=[attrib])
+
+    def _get_user_record(self, user_dn):
+        """
+        Read user record with the attributes the policy needs only
+        :param str user_dn: user record distinct name (DN)
+        :return OcLdapUserRecord:
+        """
+        _result = self._read_record(user_dn, self._get_policy().user_projection)
+
+        if _result is None:
+            return OcLdapUserRecord(ldap_record=None)
+
+        return OcLdapUserRecord(ldap_record={'dn': _result[0], 'attributes': _result[1]})
+
+    def _get_user_view(self, user_dn, schema):
+        """
+        Read compact view of user record with the attributes the policy needs only
+        :param str user_dn: user record distinct name (DN)
+        :param UserViewSchema schema: attributes to keep
+        :return UserView: 'None' if the record is not found
+        """
+        _result = self._read_record(user_dn, self._get_policy().user_projection)
+
+        if _result is None:
+            return None
+
+        return schema.make_view(*_result)
+
+    def _get_referenced_record(self, object_dn):
+        """
+        Read record referenced by dotted condition, with the attributes the conditions need only
+        :param str object_dn: record distinct name (DN)
+        :return OcLdapRecord:
+        """
+        _key = object_dn.lower()
+
+        if self._referenced_records is not None and _key in self._referenced_records:
+            return self._referenced_records[_key]
 
-        return _conf_f
+        _result = self._read_record(object_dn, self._get_policy().referenced_projection, referenced=True)
+
+        if _result is None:
+            _object_rec = OcLdapRecord(ldap_record=None)
+        else:
+            _object_rec = OcLdapRecord(ldap_record={'dn': _result[0], 'attributes': _result[1]})
+
+        if self._referenced_records is not None:
+            self._referenced_records[_key] = _object_rec
+
+        return _object_rec
 
     def _process_single_user(self, user_dn):
         """
@@ -245,118 +869,675 @@ class OcLdapUserLocker:
         :param str user_dn: user record distinct name (DN)
         """
         logging.info("Processing user: DN=%s" % user_dn)
-        _users_conf = self.config.get("users")
-        _user_rec = self._ldap_c.get_record(user_dn, OcLdapUserRecord)
-        logging.debug("User login: '%s'" % _user_rec.get_attribute('cn'))
-        logging.debug("User e-mail: '%s'" % _user_rec.get_attribute('mail'))
-        logging.debug("User created: '%s'" % _user_rec.get_attribute('createTimeStamp'))
-        logging.debug("User modified: '%s'" % _user_rec.get_attribute('modifyTimeStamp'))
-        logging.debug("User last login: '%s'" % _user_rec.get_attribute("authTimestamp"))
-        logging.debug("User created: '%s'" % _user_rec.get_attribute("createTimestamp"))
-        logging.debug("Locked time: '%s'" % _user_rec.get_attribute("pwdAccountLockedTime"))
-        logging.debug("Type of user created: '%s'" % type(_user_rec.get_attribute('createTimeStamp')))
-        logging.debug("Type of user last login: '%s'" % type(_user_rec.get_attribute("authTimestamp")))
-        logging.debug("Type of user modification date: '%s'" % type(_user_rec.get_attribute("modifyTimeStamp")))
+        self._summary["users"] += 1
+        self._process_user_record(self._get_user_record(user_dn))
+        self._set_processed([user_dn])
+
+    def _process_user_record(self, user_rec):
+        """
+        Process user record read already
+        :param OcLdapUserRecord user_rec: user record with the attributes the policy needs at least
+        """
+        logging.debug("User login: '%s'" % user_rec.get_attribute('cn'))
+        logging.debug("User e-mail: '%s'" % user_rec.get_attribute('mail'))
+        logging.debug("User created: '%s'" % user_rec.get_attribute('createTimeStamp'))
+        logging.debug("User modified: '%s'" % user_rec.get_attribute('modifyTimeStamp'))
+        logging.debug("User last login: '%s'" % user_rec.get_attribute("authTimestamp"))
+        logging.debug("User created: '%s'" % user_rec.get_attribute("createTimestamp"))
+        logging.debug("Locked time: '%s'" % user_rec.get_attribute("pwdAccountLockedTime"))
+        logging.debug("Type of user created: '%s'" % type(user_rec.get_attribute('createTimeStamp')))
+        logging.debug("Type of user last login: '%s'" % type(user_rec.get_attribute("authTimestamp")))
+        logging.debug("Type of user modification date: '%s'" % type(user_rec.get_attribute("modifyTimeStamp")))
 
         # search configuration to apply by attributes given
-        _conf = self._find_valid_conf(_user_rec)
+        _conf = self._find_valid_conf(user_rec)
 
         # if no configuration found - do nothing
         if _conf is None:
-            logging.info("No suitable locking configuration for '%s'" % _user_rec.get_attribute('cn'))
+            logging.info("No suitable locking configuration for '%s'" % user_rec.get_attribute('cn'))
             return
 
         # this will raise an exception if any of mandatory parameter is missing or has wrong type
         logging.info("User '%s' is valid for '%d' days, time attributes: '%s'" % (
-            _user_rec.get_attribute('cn'), _conf['days_valid'], ':'.join(_conf['time_attributes'])))
+            user_rec.get_attribute('cn'), _conf['days_valid'], ':'.join(_conf['time_attributes'])))
 
         # now check the time attributes specified in the conf and find out the nearest one
         # note that 'tzinfo' is to be discarged because of possible datetime exception while
         #   subtracting them
-        _lock_date = self._get_account_lock_date(_user_rec, _conf['days_valid'], _conf['time_attributes'])
+        _lock_date = self._get_account_lock_date(user_rec, _conf['days_valid'], _conf['time_attributes'])
 
         if not _lock_date:
             # should never happen
-            logging.debug("Account '%s' is not to be locked ever", _user_rec.get_attribute('cn'))
+            logging.debug("Account '%s' is not to be locked ever", user_rec.get_attribute('cn'))
             return
 
-        logging.debug("Account lock date for '%s': '%s'" % (
-            _user_rec.get_attribute('cn'), _lock_date.isoformat(sep=" ")))
+        self._apply_lock_date(user_rec, _conf, _lock_date, self._get_days_before_lock(_lock_date))
 
-        _days_before_lock = self._get_days_before_lock(_lock_date)
-        logging.debug("Days before lock account '%s': %d" % (
-            _user_rec.get_attribute('cn'), _days_before_lock))
+    def _process_users_batch(self, user_dns):
+        """
+        Process a batch of user records
+        Compact views of records are kept in memory instead of full records,
+        lock dates are calculated with vectorized operations for all users sharing the same configuration
+        :param list user_dns: user records distinct names (DN)
+        """
+        logging.info("Processing batch of %d users" % len(user_dns))
+        self._apply_lock_dates(self._get_users_by_conf(user_dns))
+        self._set_processed(user_dns)
 
-        # check lock e-mail notifications
-        self._check_lock_notifications(
-            _user_rec, _conf, lock_date=_lock_date, days_before_lock=_days_before_lock)
+    def _get_users_by_conf(self, user_dns):
+        """
+        Read compact views of user records and find configuration sections to apply
+        :param list user_dns: user records distinct names (DN)
+        :return dict: lists of tuples (user record, configuration) by (days valid, time attributes)
+        """
+        self._summary["users"] += len(user_dns)
+        _by_conf = dict()
+        _schema = self._get_policy().user_schema
+        # keep the attributes used only while the batch is processed
+        _user_recs = self._map_readers(lambda _dn: self._get_user_view(_dn, _schema), user_dns)
 
-        if _days_before_lock > 0:
-            logging.debug("Is not the time to lock '%s', returning" % _user_rec.get_attribute('cn'))
-            return
+        for _user_dn, _user_rec in zip(user_dns, _user_recs):
+            logging.debug("Processing user: DN=%s" % _user_dn)
 
-        logging.info("Locking '%s', days: '%d'" % (
-            _user_rec.get_attribute('cn'), _days_before_lock))
+            if _user_rec is None:
+                continue
 
-        _user_rec.lock()
-        self._ldap_c.put_record(_user_rec)
+            _conf = self._find_valid_conf(_user_rec)
 
-    def _check_lock_notifications(self, user_rec, conf, lock_date, days_before_lock):
+            if _conf is None:
+                logging.info("No suitable locking configuration for '%s'" % _user_rec.get_attribute('cn'))
+                continue
+
+            _by_conf.setdefault((_conf['days_valid'], tuple(_conf['time_attributes'])), list()).append(
+                    (_user_rec, _conf))
+
+        return _by_conf
+
+    def _process_users_prioritized(self, user_dns, batch_size):
         """
-        Check if user is to be notified about account locking
-        Send mail notifications is so
-        :param OcLdapRecord user_rec: user record from LDAP catalogue
-        :param dict conf: configuration to check agianst
-        :param datetime.datetime lock_date: date when account will be locked
-        :param int days_before_lock: days left for the date when account will be locked
+        Process the most urgent users first: the ones to be locked, then the ones to be notified
+        (the nearest lock first), then the rest
+        All users are evaluated first without taking actions, compact views of records are kept only;
+        then actions are taken in order of urgency until the run is stopped or the deadline has passed.
+        With a deadline the evaluation takes its share of the time left at most, the users evaluated by then
+        are processed in order of urgency until the deadline.
+        :param user_dns: iterable of user records distinct names (DN)
+        :param int batch_size: users to evaluate at once
         """
-        # if any of argumets absent then we should have an exception.
-        # so do not check
+        _queue = list()
+        _user_dns = iter(user_dns)
+        _evaluate_until = None
+
+        if self._deadline_at is not None:
+            _share = (self.config.get("evaluation") or dict()).get("evaluation_share") or 0.5
+            _evaluate_until = time.monotonic() + max(0, self._deadline_at - time.monotonic()) * _share
+
+        while True:
+            if self._is_stopped() or (_evaluate_until is not None and time.monotonic() >= _evaluate_until):
+                # the rest are left for the next run
+                logging.info("Evaluation time is over, %d users are evaluated" % len(_queue))
+                self._incomplete = True
+                break
 
-        if not conf.get("lock_notifications"):
-            logging.debug("Notifications are not configured for '%s'" % user_rec.get_attribute('cn'))
-            return
+            _batch = list(itertools.islice(_user_dns, batch_size))
 
-        if not user_rec.get_attribute("mail"):
-            logging.debug("User '%s' nas no mail, nothing to do" % user_rec.get_attribute('cn'))
-            return
+            if not _batch:
+                break
 
-        # if 'days_before_lock' is negative - use zero-value notification since account is to be locked now
-        if days_before_lock < 0:
-            days_before_lock = 0
+            _queued = set()
 
-        # if no suitable configuration for 'days_before_lock' - skip
-        _conf = list(filter(lambda x: x.get("days_before") == days_before_lock, conf.get("lock_notifications")))
+            for _user_rec, _conf, _lock_date, _days_before_lock in self._iter_lock_dates(
+                    self._get_users_by_conf(_batch)):
+                _queued.add(_user_rec.dn)
+                _queue.append((self._get_priority(_user_rec, _conf, _days_before_lock), _lock_date, _user_rec.dn,
+                               _user_rec, _conf, _days_before_lock))
 
-        if not _conf:
-            # empty list?
-            logging.debug("No notification for '%s' in %d days before lock" %
-                          (user_rec.get_attribute('cn'), days_before_lock))
-            return
+            # nothing is to be done for the rest
+            self._set_processed(list(_x for _x in _batch if _x not in _queued))
 
-        _conf = _conf.pop()
+        _queue.sort(key=lambda _x: _x[:3])
+        _priorities = collections.Counter(_x[0] for _x in _queue)
+        logging.info("Users by priority: to lock: %d, to notify: %d, others: %d" % (
+            _priorities[0], _priorities[1], _priorities[2]))
 
-        if not self._mailer:
-            self._mailer = LockMailer(self.config.get("SMTP") or dict(), os.path.dirname(self._config_path))
+        for _processed, (_priority, _lock_date, _dn, _user_rec, _conf, _days_before_lock) in enumerate(_queue):
+            # the evaluation may have stopped, the users evaluated by then are processed
+            if (_processed and self._is_stop_requested()) or self._is_deadline_passed():
+                _left = collections.Counter(_x[0] for _x in _queue[_processed:])
+                logging.warning("Stopped, users not processed: to lock: %d, to notify: %d, others: %d" % (
+                    _left[0], _left[1], _left[2]))
+                return
 
-        # filter substitutes for mail template
-        _substitutes = dict((_k, user_rec.get_attribute(_k)) for _k in [
-            'cn', 'givenName', 'sn', 'displayName'])
+            self._apply_lock_date(_user_rec, _conf, _lock_date, _days_before_lock)
+            self._set_processed([_dn])
 
-        _substitutes.update({
-            "lockDate": lock_date.strftime("%Y-%d-%m"),
-            "lockDays": str(days_before_lock)})
+    def _get_priority(self, user_rec, conf, days_before_lock):
+        """
+        :param user_rec: LDAP record for user account, or compact view of it
+        :param dict conf: configuration applied
+        :param int days_before_lock: days left for the date when account will be locked
+        :return int: 0 - to be locked, 1 - to be notified, 2 - nothing to do now
+        """
+        if days_before_lock <= 0:
+            return 0
 
-        self._mailer.send_notification(user_rec.get_attribute('mail'), _conf.get("template"), _substitutes)
+        if self._get_lock_notification(user_rec, conf, days_before_lock):
+            return 1
 
+        return 2
 
-    def _get_days_before_lock(self, lock_date):
+    def _process_users_pooled(self, user_dns, pool, batch_size):
+        """
+        Process users with rules evaluated by worker processes
+        Projected records are read here and sent to workers by batches, a few batches are kept in flight;
+        lock dates, notifications and locks are done here as for '_process_users_batch'
+        :param user_dns: iterable of user records distinct names (DN)
+        :param EvaluationPool pool: worker processes
+        :param int batch_size: users sent to a worker at once
+        """
+        _policy = self._get_policy()
+        _schema = _policy.user_schema
+        _pending = collections.deque()
+        _user_dns = iter(user_dns)
+
+        while True:
+            _dns = list(itertools.islice(_user_dns, batch_size))
+            _batch = list(filter(None, self._map_readers(
+                lambda _dn: self._read_record(_dn, _policy.user_projection), _dns)))
+
+            if _batch:
+                logging.info("Evaluating batch of %d users by workers" % len(_batch))
+                self._summary["users"] += len(_batch)
+                _pending.append((_dns, list(_schema.make_view(*_x) for _x in _batch), pool.submit(_batch)))
+
+            if not _pending:
+                break
+
+            if _batch and len(_pending) < pool.workers * 2:
+                continue
+
+            _dns, _views, _future = _pending.popleft()
+            _indexes, _statistics = _future.result()
+            _policy.add_statistics(_statistics)
+            _by_conf = dict()
+
+            for _user_rec, _index in zip(_views, _indexes):
+                if _index is None:
+                    logging.info("No suitable locking configuration for '%s'" % _user_rec.get_attribute('cn'))
+                    continue
+
+                _conf = _policy.sections[_index].conf
+                _by_conf.setdefault((_conf['days_valid'], tuple(_conf['time_attributes'])), list()).append(
+                        (_user_rec, _conf))
+
+            self._apply_lock_dates(_by_conf)
+            self._set_processed(_dns)
+
+    def _apply_lock_dates(self, by_conf):
+        """
+        Calculate lock dates for users grouped by configuration and apply them
+        :param dict by_conf: lists of tuples (user record, configuration) by (days valid, time attributes)
+        """
+        for _user_rec, _conf, _lock_date, _days_before_lock in self._iter_lock_dates(by_conf):
+            self._apply_lock_date(_user_rec, _conf, _lock_date, _days_before_lock)
+
+    def _iter_lock_dates(self, by_conf):
+        """
+        Calculate lock dates for users grouped by configuration
+        :param dict by_conf: lists of tuples (user record, configuration) by (days valid, time attributes)
+        :return: generator of tuples (user record, configuration, lock date, days before lock),
+                 users never to be locked are skipped
+        """
+        _now = datetime.datetime.now()
+
+        for (_days_valid, _time_attributes), _users in by_conf.items():
+            _user_recs = list(_x[0] for _x in _users)
+            logging.debug("Calculating lock dates for %d users valid for '%d' days, time attributes: '%s'" % (
+                len(_user_recs), _days_valid, ':'.join(_time_attributes)))
+
+            for (_user_rec, _conf), (_lock_date, _days_before_lock) in zip(
+                    _users, self._get_lock_dates(_user_recs, _days_valid, list(_time_attributes), _now)):
+
+                if not _lock_date:
+                    logging.debug("Account '%s' is not to be locked ever", _user_rec.get_attribute('cn'))
+                    continue
+
+                yield (_user_rec, _conf, _lock_date, _days_before_lock)
+
+    def _get_lock_dates(self, user_recs, days_valid, time_attributes, now):
+        """
+        Calculate lock dates and days before lock for users sharing the same configuration
+        Vectorized if 'numpy' is installed, one-by-one otherwise
+        :param list user_recs: records from LDAP
+        :param int days_valid: how many days record is valid
+        :param list time_attributes: list of time attributes to check (strings)
+        :param datetime.datetime now: current date and time
+        :return list: tuples (lock date, days before lock); (None, None) means 'never'
+        """
+        if not self._numpy_missing:
+            try:
+                return get_lock_dates(user_recs, days_valid, time_attributes, now=now)
+            except ImportError:
+                logging.warning("'numpy' is not installed, calculating lock dates one-by-one")
+                self._numpy_missing = True
+
+        _result = list()
+
+        for _user_rec in user_recs:
+            _lock_date = self._get_account_lock_date(_user_rec, days_valid, time_attributes)
+            _result.append((_lock_date, self._get_days_before_lock(_lock_date, now) if _lock_date else None))
+
+        return _result
+
+    def _apply_lock_date(self, user_rec, conf, lock_date, days_before_lock):
+        """
+        Send notifications and lock the user account according to the lock date
+        :param OcLdapRecord user_rec: user record from LDAP catalogue
+        :param dict conf: configuration applied
+        :param datetime.datetime lock_date: date when account will be locked
+        :param int days_before_lock: days left for the date when account will be locked
+        """
+        logging.debug("Account lock date for '%s': '%s'" % (
+            user_rec.get_attribute('cn'), lock_date.isoformat(sep=" ")))
+        logging.debug("Days before lock account '%s': %d" % (
+            user_rec.get_attribute('cn'), days_before_lock))
+
+        if self._action_index is not None:
+            self._action_index.set(user_rec.dn, get_next_action_date(
+                lock_date, days_before_lock,
+                list(_x.get("days_before") for _x in conf.get("lock_notifications") or list())))
+
+        # check lock e-mail notifications
+        _notified = self._check_lock_notifications(
+            user_rec, conf, lock_date=lock_date, days_before_lock=days_before_lock)
+
+        if days_before_lock > 0:
+            logging.debug("Is not the time to lock '%s', returning" % user_rec.get_attribute('cn'))
+            return
+
+        if not _notified:
+            # locked users are not processed any more, so the lock waits for the notification
+            logging.warning("Lock of '%s' is held until the notification is sent" % user_rec.get_attribute('cn'))
+            return
+
+        logging.info("Locking '%s', days: '%d'" % (
+            user_rec.get_attribute('cn'), days_before_lock))
+
+        self._lock_user(user_rec, conf)
+
+    def _lock_user(self, user_rec, conf=None):
+        """
+        Lock user account
+        :param user_rec: LDAP record for user account, or compact view of it
+        :param dict conf: configuration applied, to check the lock date against the live record
+            if evaluated from snapshot
+        """
+        if self._snapshot is not None or not isinstance(user_rec, OcLdapUserRecord):
+            # full record is required to save modifications, the live one if evaluated from snapshot
+            _dn = user_rec.dn
+            user_rec = self._call_ldap(lambda _ldap_c: get_record(
+                _ldap_c, _dn, OcLdapUserRecord, self._get_policy().user_projection))
+
+            if not user_rec.dn:
+                logging.warning("User record was not found in LDAP, not locked")
+                return
+
+            if self._snapshot is not None and conf is not None:
+                # the user may have logged in after the snapshot was written
+                _lock_date = self._get_account_lock_date(user_rec, conf.get("days_valid"), conf.get("time_attributes"))
+
+                if not _lock_date or self._get_days_before_lock(_lock_date) > 0:
+                    logging.info("Account '%s' is not due for lock by the live record, not locked" % (
+                        user_rec.get_attribute('cn')))
+                    return
+
+        user_rec.lock()
+        self._call_ldap(lambda _ldap_c: _ldap_c.put_record(user_rec))
+        self._summary["locks"] += 1
+
+        if self._checkpoint is not None:
+            self._checkpoint.add(user_rec.dn, ACTION_LOCKED)
+
+    def _check_lock_notifications(self, user_rec, conf, lock_date, days_before_lock):
+        """
+        Check if user is to be notified about account locking
+        Send mail notifications is so
+        :param OcLdapRecord user_rec: user record from LDAP catalogue
+        :param dict conf: configuration to check agianst
+        :param datetime.datetime lock_date: date when account will be locked
+        :param int days_before_lock: days left for the date when account will be locked
+        :return bool: 'False' if the notification due was deferred
+        """
+        # if any of argumets absent then we should have an exception.
+        # so do not check
+        _conf = self._get_lock_notification(user_rec, conf, days_before_lock)
+
+        if not _conf:
+            return True
+
+        # if 'days_before_lock' is negative - use zero-value notification since account is to be locked now
+        if days_before_lock < 0:
+            days_before_lock = 0
+
+        # filter substitutes for mail template
+        _substitutes = dict((_k, user_rec.get_attribute(_k)) for _k in SUBSTITUTE_ATTRIBUTES)
+
+        _substitutes.update({
+            "lockDate": lock_date.strftime("%Y-%d-%m"),
+            "lockDays": str(days_before_lock)})
+
+        if not self._send_notification(user_rec.get_attribute('mail'), _conf.get("template"), _substitutes):
+            self._defer_user(user_rec.dn)
+            return False
+
+        self._summary["notifications"] += 1
+
+        if self._checkpoint is not None:
+            self._checkpoint.add(user_rec.dn, ACTION_NOTIFIED)
+
+        return True
+
+    def _get_mailer(self):
+        """
+        Get mailer, it is created when the first notification is due
+        :return LockMailer:
+        """
+        if self._mailer_owner is not self:
+            return self._mailer_owner._get_mailer()
+
+        with self._mailer_lock:
+            if not self._mailer:
+                # mail-related modules are heavy, import them only when the first notification is due
+                from .mailer import LockMailer
+                self._mailer = LockMailer(self.config.get("SMTP") or dict(), os.path.dirname(self._config_path),
+                                          timeout=self._get_resilience_param("smtp_timeout"))
+
+        return self._mailer
+
+    def _get_smtp_breaker(self):
+        """
+        Get circuit breaker for SMTP relay, shared the same way the mailer is
+        :return CircuitBreaker:
+        """
+        if self._mailer_owner is not self:
+            return self._mailer_owner._get_smtp_breaker()
+
+        with self._mailer_lock:
+            if not self._smtp_breaker:
+                self._smtp_breaker = CircuitBreaker(
+                    "SMTP", failures=self._get_resilience_param("smtp_failures"),
+                    reset_timeout=self._get_resilience_param("smtp_reset_seconds"))
+
+        return self._smtp_breaker
+
+    def _send_notification(self, mail, template, substitutes):
+        """
+        Send notification, repeating on transient errors
+        The relay failing repeatedly is not called until the circuit breaker lets a trial through
+        :param str mail: e-mail address
+        :param str template: template name
+        :param dict substitutes: template substitutes
+        :return bool: sent, 'False' if deferred because the relay is unavailable
+        """
+        _breaker = self._get_smtp_breaker()
+
+        if not _breaker.allow():
+            return False
+
+        try:
+            self._get_retry_policy().call(
+                lambda: self._get_mailer().send_notification(mail, template, substitutes), is_transient_smtp_error)
+        except Exception as _e:
+            if not is_transient_smtp_error(_e):
+                raise
+
+            logging.error("SMTP relay is unavailable: %s" % _e)
+            _breaker.record_failure()
+            return False
+
+        _breaker.record_success()
+        return True
+
+    def _defer_user(self, user_dn):
+        """
+        Leave the user for the next run: notification could not be sent
+        :param str user_dn: user record distinct name (DN)
+        """
+        logging.warning("Notification deferred: DN=%s" % user_dn)
+        self._summary["deferred"] += 1
+
+        if self._action_index is not None:
+            self._action_index.set(user_dn, datetime.date.today())
+
+    def _get_resilience_param(self, key):
+        """
+        :param str key: 'resilience' configuration key
+        :return: value configured, the default one otherwise
+        """
+        _value = (self.config.get("resilience") or dict()).get(key)
+        return RESILIENCE_DEFAULTS.get(key) if _value is None else _value
+
+    def _get_retry_policy(self):
+        """
+        :return RetryPolicy: retries of LDAP and SMTP calls configured
+        """
+        return RetryPolicy(retries=self._get_resilience_param("retries"),
+                           delay=self._get_resilience_param("retry_delay"),
+                           max_delay=self._get_resilience_param("retry_max_delay"))
+
+    def _call_ldap(self, func):
+        """
+        Call LDAP operation, repeating it on transient errors, the connection is re-opened if lost
+        The number of requests in flight is limited if the concurrency is adaptive
+        :param func: function taking LDAP connection of the calling thread
+        :return: result of the function
+        """
+        if not getattr(self._reader_local, "reader", False):
+            return self._call_ldap_with(self._ldap_c, func)
+
+        # reader threads take connections from the pool
+        with self._ldap_pool.connection() as _ldap_c:
+            return self._call_ldap_with(_ldap_c, func)
+
+    def _call_ldap_with(self, ldap_c, func):
+        """
+        Call LDAP operation with the connection given, see '_call_ldap'
+        :param OcLdapUserCat ldap_c: connection to use
+        :param func: function taking LDAP connection
+        :return: result of the function
+        """
+        _limiter = self._get_ldap_limiter()
+
+        def _call():
+            if _limiter is None:
+                return func(ldap_c)
+
+            return _limiter.call(lambda: func(ldap_c), is_overload_ldap_error)
+
+        return self._get_retry_policy().call(_call, is_transient_ldap_error,
+                                             on_retry=lambda _e: self._reconnect_ldap(ldap_c))
+
+    def _reconnect_ldap(self, ldap_c):
+        """
+        Re-open LDAP connection if it was closed by the error
+        :param OcLdapUserCat ldap_c: connection of the failed attempt
+        """
+        _connection = getattr(ldap_c, "ldap_c", None)
+
+        if _connection is None or not _connection.closed:
+            return
+
+        logging.info("Reconnecting to LDAP")
+        open_connection(_connection)
+
+    def _check_ldap(self):
+        """
+        Check the connection kept from the previous run: the server may have dropped it while idle
+        It is bound again if so, a new one is made if that fails
+        """
+        _connection = getattr(self._ldap_c, "ldap_c", None)
+
+        if _connection is None or is_alive(_connection):
+            return
+
+        logging.info("LDAP connection was dropped, binding again")
+
+        try:
+            _connection.unbind()
+        except Exception as _e:
+            logging.debug("LDAP connection is not closed: %s" % _e)
+
+        try:
+            self._get_retry_policy().call(lambda: open_connection(_connection), is_transient_ldap_error)
+        except Exception as _e:
+            logging.warning("LDAP connection is not re-opened, connecting again: %s" % _e)
+            self._ldap_c = self._connect_ldap()
+
+    def _get_ldap_limiter(self):
+        """
+        Get controller of the number of LDAP requests in flight, it is re-created if configuration was changed
+        :return AdaptiveLimit: 'None' if the concurrency is not configured
+        """
+        _config = self.config.get("concurrency")
+
+        if _config is self._ldap_limiter_config:
+            return self._ldap_limiter
+
+        self._ldap_limiter_config = _config
+        self._ldap_limiter = None
+        _config = _config or dict()
+
+        if (_config.get("max_requests") or 1) > 1:
+            self._ldap_limiter = AdaptiveLimit(
+                min_limit=_config.get("min_requests") or 1, max_limit=_config.get("max_requests"),
+                target_latency=_config.get("target_latency") or 0.5, backoff=_config.get("backoff") or 0.5)
+
+        return self._ldap_limiter
+
+    def _get_ldap_pool(self, size):
+        """
+        Get pool of connections for reader threads, kept between runs while the main connection is
+        Pooled connections are cloned from the main one, resuming its TLS session
+        :param int size: connections at most
+        :return LdapConnectionPool:
+        """
+        if self._ldap_pool is not None and self._ldap_pool_primary is self._ldap_c and self._ldap_pool.size == size:
+            return self._ldap_pool
+
+        if self._ldap_pool is not None:
+            self._ldap_pool.close()
+
+        _primary = self._ldap_c
+        self._ldap_pool = LdapConnectionPool(
+                lambda: self._get_retry_policy().call(lambda: clone_connection(_primary), is_transient_ldap_error),
+                size, check_interval=self._get_resilience_param("connection_check_seconds"))
+        self._ldap_pool_primary = _primary
+        return self._ldap_pool
+
+    def _open_readers(self):
+        """
+        Start threads reading user records concurrently if the concurrency is configured, LDAP is read directly
+        Every thread has its own connection, the number of requests in flight is set by the controller
+        """
+        self._close_readers()
+        _limiter = self._get_ldap_limiter()
+
+        if _limiter is None or self._snapshot is not None:
+            return
+
+        self._get_ldap_pool(_limiter.max_limit)
+        self._readers = concurrent.futures.ThreadPoolExecutor(
+                max_workers=_limiter.max_limit, thread_name_prefix="ldap-reader",
+                initializer=lambda: setattr(self._reader_local, "reader", True))
+
+    def _close_readers(self):
+        """
+        Stop reader threads, their connections are kept in the pool for the next run
+        """
+        if self._readers is None:
+            return
+
+        self._readers.shutdown(wait=True)
+        self._readers = None
+        _stats = self._ldap_pool.stats
+        logging.info("LDAP requests in flight limit: %d, pooled connections: created %d, reused %d, re-bound %d" % (
+            self._get_ldap_limiter().limit, _stats["created"], _stats["reused"], _stats["rebound"]))
+
+    def _map_readers(self, func, user_dns):
+        """
+        Apply the function to every DN, by reader threads if started
+        :param func: function reading a record by DN
+        :param list user_dns: user records distinct names (DN)
+        :return list: results in the order of DNs
+        """
+        if self._readers is None:
+            return list(func(_dn) for _dn in user_dns)
+
+        return list(self._readers.map(func, user_dns))
+
+    def _connect_ldap(self):
+        """
+        Connect to LDAP, repeating on transient errors, and set timeouts of the connection
+        :return OcLdapUserCat:
+        """
+        _ldap_c = self._get_retry_policy().call(
+            lambda: OcLdapUserCat(**self.config.get("LDAP")), is_transient_ldap_error)
+        _timeout = self._get_resilience_param("ldap_timeout")
+        _connection = getattr(_ldap_c, "ldap_c", None)
+
+        if not _timeout or _connection is None:
+            return _ldap_c
+
+        # the client connects in its constructor, so timeouts apply to operations and reconnects
+        _connection.receive_timeout = _timeout
+        _connection.server.connect_timeout = _timeout
+        _socket = getattr(_connection, "socket", None)
+
+        if _socket is not None:
+            _socket.settimeout(_timeout)
+
+        return _ldap_c
+
+
+    def _get_lock_notification(self, user_rec, conf, days_before_lock):
+        """
+        Find out the notification to send to user
+        :param OcLdapRecord user_rec: user record from LDAP catalogue
+        :param dict conf: configuration to check agianst
+        :param int days_before_lock: days left for the date when account will be locked
+        :return dict: notification configuration, 'None' if nothing to send
+        """
+        if not conf.get("lock_notifications"):
+            logging.debug("Notifications are not configured for '%s'" % user_rec.get_attribute('cn'))
+            return None
+
+        if not user_rec.get_attribute("mail"):
+            logging.debug("User '%s' nas no mail, nothing to do" % user_rec.get_attribute('cn'))
+            return None
+
+        # if 'days_before_lock' is negative - use zero-value notification since account is to be locked now
+        if days_before_lock < 0:
+            days_before_lock = 0
+
+        # if no suitable configuration for 'days_before_lock' - skip
+        _conf = list(filter(lambda x: x.get("days_before") == days_before_lock, conf.get("lock_notifications")))
+
+        if not _conf:
+            # empty list?
+            logging.debug("No notification for '%s' in %d days before lock" %
+                          (user_rec.get_attribute('cn'), days_before_lock))
+            return None
+
+        return _conf.pop()
+
+    def _get_days_before_lock(self, lock_date, now=None):
         """
         Check if user is to be locked or not
         :param datetime.datetime lock_date: the date account should be locked at, without timezone, not None
+        :param datetime.datetime now: current date and time, taken at the moment if not given
         :reurn int: days before lock, negative if 'after' lock
         """
-        _today = datetime.datetime.now()
+        _today = now or datetime.datetime.now()
         _today = _today.replace(tzinfo=None)
         _diff = lock_date - _today
 
@@ -397,16 +1578,498 @@ class OcLdapUserLocker:
 
         return _result
 
+    def _iter_users(self, dns=None):
+        """
+        Iterate over DNs of all non-locked users with paged search, only one page is kept in memory
+        Users of the snapshot are iterated if evaluating from it
+        :param dns: iterable of user DNs found already, to iterate instead of searching
+        :return: generator of user DNs
+        """
+        if dns is not None:
+            _dns = dns
+        elif self._snapshot is not None:
+            _dns = self._snapshot.iter_users()
+        else:
+            _page_size = (self.config.get("evaluation") or dict()).get("page_size") or 100
+            _dns = (_x[0] for _x in iter_search(self._ldap_c, ACTIVE_USERS_FILTER, page_size=_page_size))
+
+        for _dn in _dns:
+            if self._is_stopped():
+                logging.info("Stopped, remaining users are not processed")
+                return
+
+            yield _dn
+
+    def _iter_indexed_users(self, now):
+        """
+        Iterate over the users to process with the action index: all users on full scan,
+        otherwise the users due for today and the ones changed since the previous run
+        :param datetime.datetime now: run start time
+        :return: generator of user DNs
+        """
+        _evaluation = self.config.get("evaluation") or dict()
+        _index = self._action_index
+        _digest = self._get_policy_digest()
+        _tracker = self._get_change_tracker()
+
+        if _index.is_full_scan_due(now, _evaluation.get("full_scan_days") or 7, _digest) or \
+                not _tracker.is_valid_state(_index.change_state):
+            logging.info("Full scan of users, action index is rebuilt")
+            _index.clear()
+
+            _index.last_full_scan = now
+            _index.policy_digest = _digest
+
+            if self._snapshot is not None:
+                # changes made after the snapshot was written are caught by the next runs
+                _index.change_state = self._get_snapshot_change_state(_tracker, None)
+                yield from self._iter_users()
+                return
+
+            # the state is taken with the users themselves, not by another search of the whole content
+            _dns, _index.change_state = _tracker.scan()
+            yield from self._iter_users(_dns)
+            return
+
+        _due = _index.pop_due(now.date())
+        _changed, _state = _tracker.get_changed_users(_index.change_state)
+
+        if self._snapshot is not None:
+            # changes found may be missing in the snapshot, they are found again until it is written anew
+            _state = self._get_snapshot_change_state(_tracker, _index.change_state)
+
+        _index.change_state = _state
+        logging.info("Users due by action index: %d, changed: %d" % (len(_due), len(_changed)))
+
+        for _dn in itertools.chain(_due, sorted(set(_changed) - set(_due))):
+            if self._is_stopped():
+                logging.info("Stopped, remaining users are not processed")
+                return
+
+            _index.discard(_dn)
+            yield _dn
+
+    def _get_change_tracker(self):
+        """
+        :return ChangeTracker: tracker of changes configured for the action index
+        """
+        _evaluation = self.config.get("evaluation") or dict()
+        return ChangeTracker(self._ldap_c, mode=_evaluation.get("change_tracking") or "timestamp",
+                             page_size=_evaluation.get("page_size") or 100)
+
+    def _get_snapshot_change_state(self, tracker, state):
+        """
+        :param ChangeTracker tracker: tracker of changes
+        :param str state: change tracking state to keep if the snapshot has no suitable one
+        :return str: change tracking state the snapshot was written at
+        """
+        if tracker.is_valid_state(self._snapshot.change_state):
+            return self._snapshot.change_state
+
+        logging.warning("Snapshot '%s' has no change tracking state for the mode configured, "
+                        "it is not advanced" % self._snapshot_path)
+        return state
+
+    def _prepare_snapshot(self):
+        """
+        Open directory snapshot to evaluate from, if configured
+        It is written from LDAP before if refresh is requested, or it is expired, or it lacks attributes the policy needs
+        """
+        if not self._snapshot_path:
+            return
+
+        _policy = self._get_policy()
+        _snapshot = DirectorySnapshot(self._snapshot_path)
+        _age = _snapshot.get_age()
+        _write = self._snapshot_refresh
+
+        if self._snapshot_ttl is not None and (_age is None or _age > self._snapshot_ttl):
+            logging.info("Snapshot '%s' is missing or expired" % self._snapshot_path)
+            _write = True
+
+        if not _write:
+            _snapshot.open()
+
+            if _snapshot.covers(_policy.user_projection, _policy.referenced_projection):
+                self._snapshot = _snapshot
+                return
+
+            _snapshot.close()
+
+            if self._snapshot_ttl is None:
+                raise ValueError("Snapshot '%s' lacks attributes required by configuration" % self._snapshot_path)
+
+            logging.info("Snapshot '%s' lacks attributes required by configuration" % self._snapshot_path)
+
+        # the state to find the changes made while the snapshot is written, kept for the action index
+        _change_state = self._get_change_tracker().get_state() if self._get_evaluation_path("action_index") else None
+
+        if not _snapshot.write(self._ldap_c, self._iter_users(), _policy, call_ldap=self._call_ldap,
+                               is_stopped=self._is_stopped, change_state=_change_state):
+            return
+
+        _snapshot.open()
+        self._snapshot = _snapshot
+
+    def _prepare_evaluation(self):
+        """
+        Prepare run-scoped evaluation state: snapshot, referenced records, bitsets and decisions cache
+        """
+        # decisions are cached for the run only since referenced records may change between runs
+        self._decisions = dict()
+        # referenced records (groups mostly) are shared by many users, read each one once per run
+        self._referenced_records = dict()
+
+        # evaluate from snapshot if configured, LDAP is used for writes anyway
+        self._prepare_snapshot()
+        self._prepare_dotted_conditions()
+        self._prepare_bitset_engine()
+
+    def _finish_evaluation(self):
+        """
+        Drop run-scoped evaluation state
+        """
+        if self._decisions is not None:
+            logging.info("Distinct attribute profiles evaluated: %d" % len(self._decisions))
+
+        self._decisions = None
+        self._referenced_dns = None
+        self._referenced_records = None
+        self._bitset = None
+
+        if self._snapshot is not None:
+            self._snapshot.close()
+            self._snapshot = None
+
+    def _run_policy_sets(self, policy_sets):
+        """
+        Evaluate several policy sets in a single pass: every user record is read once
+        with the attributes all sets need, and processed by every set in turn
+        A user locked by a set is not processed by the following ones
+        :param list policy_sets: lockers of policy sets
+        """
+        _evaluation = self.config.get("evaluation") or dict()
+
+        for _key in ["batch_size", "action_index"]:
+            if _evaluation.get(_key):
+                raise NotImplementedError("'%s' is not supported with policy sets" % _key)
+
+        if self._snapshot_path or (self._workers and self._workers > 1):
+            raise NotImplementedError("Snapshot and worker processes are not supported with policy sets")
+
+        _attributes = list()
+
+        for _set in policy_sets:
+            _set._ldap_c = self._ldap_c
+            _set._summary = collections.Counter()
+            _set._checkpoint = self._checkpoint
+            _set._profiler = RuleProfiler() if self._profile else None
+            _set._prepare_evaluation()
+            _attributes.extend(_x for _x in _set._get_policy().user_projection
+                               if _x.lower() not in set(_y.lower() for _y in _attributes))
+
+        logging.info("Policy sets: %s" % ", ".join(_x.config.get("name") for _x in policy_sets))
+
+        for _user_dn in self._skip_processed(self._iter_users()):
+            logging.info("Processing user: DN=%s" % _user_dn)
+            _result = self._read_record(_user_dn, _attributes)
+
+            if _result is None:
+                continue
+
+            _user_rec = OcLdapUserRecord(ldap_record={'dn': _result[0], 'attributes': _result[1]})
+            self._summary["users"] += 1
+
+            for _set in policy_sets:
+                logging.debug("Policy set '%s'" % _set.config.get("name"))
+                _locks = _set._summary["locks"]
+                _set._process_user_record(_user_rec)
+
+                # 'pwdAccountLockedTime' may be set by a temporary lockout also, so locks made are counted
+                if _set._summary["locks"] > _locks:
+                    logging.debug("User '%s' is locked by policy set '%s'" % (
+                        _user_rec.get_attribute('cn'), _set.config.get("name")))
+                    break
+
+            self._set_processed([_user_dn])
+
+        for _set in policy_sets:
+            _set._checkpoint = None
+            _set._finish_evaluation()
+            _set._save_statistics()
+            self._summary.update(dict((_k, _v) for _k, _v in _set._summary.items() if _k != "users"))
+
+            if _set._profiler:
+                logging.info("Rule evaluation profile of policy set '%s'" % _set.config.get("name"))
+                _set._profiler.log_report()
+
+    def _run_directories(self, directories):
+        """
+        Process several LDAP directories concurrently, one thread with its own connection per directory
+        A failed directory does not stop the others, its connection is dropped and the first error is raised at the end
+        :param list directories: lockers of directories
+        """
+        logging.info("Processing %d directories" % len(directories))
+        _errors = list()
+
+        for _locker in directories:
+            _locker._profiler = self._profiler
+            _locker._deadline_at = self._deadline_at
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(directories)) as _executor:
+            _futures = dict((_executor.submit(_x._run_directory), _x) for _x in directories)
+
+            for _future in concurrent.futures.as_completed(_futures):
+                _locker = _futures[_future]
+
+                try:
+                    _future.result()
+                except Exception as _e:
+                    logging.error("Directory '%s' failed" % _locker._get_directory_name())
+                    logging.exception(_e)
+                    _locker._ldap_c = None
+                    _errors.append(_e)
+
+        self._summary = collections.Counter()
+        _policy = self._get_policy()
+
+        for _locker in directories:
+            self._summary.update(_locker._summary)
+
+            if _locker._policy is not None:
+                _policy.add_statistics(_locker._policy.collect_statistics())
+
+        self._log_summary("all directories")
+
+        if _errors:
+            raise _errors[0]
+
+    def _run_directory(self):
+        """
+        Process users of the LDAP directory configured, if the lease is taken
+        """
+        self._summary = collections.Counter()
+        self._incomplete = False
+        _lease = self._get_lease()
+
+        if _lease is not None and not _lease.acquire(wait=(self.config.get("lease") or dict()).get("wait") or 0):
+            logging.warning("Directory '%s' is processed by another instance, run skipped" %
+                            self._get_directory_name())
+            return
+
+        self._lease = _lease
+
+        try:
+            # init LDAP client, the connection is kept between runs
+            if self._ldap_c is None:
+                self._ldap_c = self._connect_ldap()
+            else:
+                self._check_ldap()
+
+            _policy_sets = self._get_policy_sets()
+            self._open_checkpoint()
+            _completed = False
+
+            try:
+                if _policy_sets:
+                    self._run_policy_sets(_policy_sets)
+                else:
+                    self._process_users()
+
+                _completed = not self._is_stopped()
+            finally:
+                self._close_checkpoint(_completed)
+
+            if self._lease is not None and self._lease.lost:
+                logging.error("Lease was lost, the run was stopped")
+        finally:
+            if self._lease is not None:
+                self._lease.release()
+                self._lease = None
+
+        self._log_summary(self._get_directory_name())
+
+    def _get_lease(self):
+        """
+        Get lease of the run if configured: overlapping instances do not process the same directory
+        :return: FileLease or LdapLease, 'None' if not configured
+        """
+        _config = self.config.get("lease")
+
+        if not _config:
+            return None
+
+        _backend = _config.get("backend") or "file"
+
+        if _backend == "file":
+            _path = _config.get("path")
+
+            if not _path:
+                raise ValueError("Lease 'path' is not configured")
+
+            if not os.path.isabs(_path):
+                _path = os.path.join(os.path.dirname(self._config_path), _path)
+
+            return FileLease(_path)
+
+        if _backend == "ldap":
+            if not _config.get("dn"):
+                raise ValueError("Lease 'dn' is not configured")
+
+            # the lease is renewed by a thread, so it has its own connection
+            return LdapLease(self._connect_ldap, _config.get("dn"), ttl=_config.get("ttl") or 600)
+
+        raise NotImplementedError("Lease backend '%s' is not supported" % _backend)
+
+    def _open_checkpoint(self):
+        """
+        Start the checkpoint of the run if configured, or resume the one of the run interrupted if requested
+        """
+        _path = self._get_evaluation_path("checkpoint")
+
+        if not _path:
+            return
+
+        self._checkpoint = RunCheckpoint(_path)
+        _date = datetime.date.today()
+
+        if self._resume and self._checkpoint.resume(_date, self._get_policy_digest()):
+            return
+
+        self._checkpoint.start(_date, self._get_policy_digest())
+
+    def _close_checkpoint(self, completed):
+        """
+        Drop the checkpoint if the run was completed, keep it to resume otherwise
+        :param bool completed: all users were processed, the run was neither stopped nor failed
+        """
+        if self._checkpoint is None:
+            return
+
+        if completed:
+            self._checkpoint.remove()
+        else:
+            logging.info("Run was not completed, checkpoint is kept: %d users processed" % len(self._checkpoint))
+            self._checkpoint.close()
+
+        self._checkpoint = None
+
+    def _skip_processed(self, user_dns):
+        """
+        Skip the users processed by the run resumed
+        They stay due in the action index, if it is used, so the next run processes them as usual
+        :param user_dns: iterable of user DNs
+        :return: generator of user DNs
+        """
+        _skipped = 0
+
+        for _dn in user_dns:
+            if self._checkpoint is None or _dn not in self._checkpoint:
+                yield _dn
+                continue
+
+            _skipped += 1
+
+            if self._action_index is not None:
+                self._action_index.set(_dn, datetime.date.today())
+
+        if _skipped:
+            logging.info("Users processed before the run was resumed: %d" % _skipped)
+
+    def _set_processed(self, user_dns):
+        """
+        Record users processed in the checkpoint, if it is kept
+        :param list user_dns: user DNs
+        """
+        if self._checkpoint is None:
+            return
+
+        for _dn in user_dns:
+            self._checkpoint.add(_dn)
+
+    def _log_summary(self, name):
+        """
+        :param str name: what the summary is for
+        """
+        logging.info("Summary for %s: users processed: %d, notifications: %d, locks: %d, deferred: %d" % (
+            name, self._summary["users"], self._summary["notifications"], self._summary["locks"],
+            self._summary["deferred"]))
+
+    def _process_users(self):
+        """
+        Process users of the directory with the policy configured
+        """
+        # run-scoped state is dropped on failure also, the next run would evaluate an open snapshot otherwise
+        try:
+            self._prepare_evaluation()
+            self._open_readers()
+
+            # iterate over all non-locked users page by page, processing starts after the first page
+            _users = self._iter_users()
+            _index_path = self._get_evaluation_path("action_index")
+
+            if _index_path:
+                # only the users due and the modified ones are processed
+                self._action_index = ActionIndex(_index_path)
+                self._action_index.load()
+                _users = self._iter_indexed_users(datetime.datetime.now())
+
+            _users = self._skip_processed(_users)
+            _batch_size = (self.config.get("evaluation") or dict()).get("batch_size")
+            _ordering = (self.config.get("evaluation") or dict()).get("ordering") or "directory"
+
+            if _ordering not in ["directory", "priority"]:
+                raise NotImplementedError("Ordering '%s' is not supported" % _ordering)
+
+            if _ordering == "priority":
+                if self._workers and self._workers > 1:
+                    logging.warning("Users are evaluated in this process with 'priority' ordering")
+
+                self._process_users_prioritized(_users, _batch_size or 500)
+            elif self._workers and self._workers > 1:
+                # imported here not to slow down the start when evaluated in this process
+                from .workers import EvaluationPool
+
+                if self._profiler:
+                    logging.warning("Rule evaluation profile is not collected by worker processes")
+
+                with EvaluationPool(self, self._workers) as _pool:
+                    self._process_users_pooled(_users, _pool, _batch_size or 500)
+            elif _batch_size:
+                while True:
+                    _batch = list(itertools.islice(_users, _batch_size))
+
+                    if not _batch:
+                        break
+
+                    self._process_users_batch(_batch)
+            else:
+                for _user in _users:
+                    self._process_single_user(_user)
+
+            if self._action_index is not None and not self._is_stopped():
+                # the index is incomplete if the run was stopped or failed, the previous one is kept then
+                self._action_index.save()
+        finally:
+            self._action_index = None
+            self._close_readers()
+            self._finish_evaluation()
+
     def run(self):
         """
         Run the process
         """
         logging.debug("Started")
+        self._profiler = RuleProfiler() if self._profile else None
+        self._deadline_at = time.monotonic() + self._deadline if self._deadline else None
+        _directories = self._get_directories()
+
+        if _directories:
+            self._run_directories(_directories)
+        else:
+            self._run_directory()
 
-        # init LDAP client
-        _ldap_params = self.config.get("LDAP")
-        self._ldap_c = OcLdapUserCat(**_ldap_params)
+        self._save_statistics()
 
-        # list all non-locked users and find the smallest days valid interval
-        for _user in self._ldap_c.list_users(add_filter="(!(pwdAccountLockedTime=000001010000Z))"):
-            self._process_single_user(_user)
+        if self._profiler:
+            self._profiler.log_report()
@@ -1,19 +1,20 @@
-from oc_mailer import Mailer
 import logging
 import os
-import smtplib
 import urllib.parse as urlparse
 import re
 import posixpath
 
+
 class LockMailer:
-    def __init__(self, config, config_path):
+    def __init__(self, config, config_path, timeout=60):
         """
         Basic initialization, configuration checking
         :param dict config: configuration for mailer
         :param str base_path: path to a directory with basic configuration
+        :param float timeout: seconds to wait for SMTP connection and replies
         """
         self._config = config
+        self._timeout = timeout
         self._config_path = os.path.abspath(config_path)
         logging.debug("Base configutaion path: '%s'" % self._config_path)
         self._check_config()
@@ -106,7 +107,8 @@ class LockMailer:
 
         logging.debug("Port: %d" % _port)
 
-        _client = smtplib.SMTP(host=_host, port=_port)
+        import smtplib
+        _client = smtplib.SMTP(host=_host, port=_port, timeout=self._timeout)
 
         # login to SMTP if credentials given
         if all(list(map(lambda x: self._config.get(x), ["user", "password"]))): 
@@ -140,6 +142,7 @@ class LockMailer:
             with open(template_conf.get("signature"), mode='rb') as _sg_in:
                 _signature = _sg_in.read()
 
+        from oc_mailer import Mailer
         _smtp = self._get_smtp_client()
         Mailer.Mailer(_smtp, 
                 self._config.get("from"),
@@ -0,0 +1,99 @@
+import logging
+
+
+class BitsetEngine:
+    def __init__(self, attributes):
+        """
+        Membership test engine: every distinct value of multi-valued attributes (like group DNs in 'memberOf')
+        is interned to a bit, so a list of values becomes an integer mask and a condition test is one bitwise
+        operation regardless of list lengths.
+        Values are compared case-insensitively, as flat comparison does.
+        :param list attributes: names of attributes to test with masks
+        """
+        self.attributes = set(_x.lower() for _x in attributes)
+        self._bits = dict()
+        self._conditions = dict()
+
+    def _get_bit(self, value):
+        """
+        Get (intern if new) the bit for a value
+        :param str value: attribute value
+        :return int:
+        """
+        value = value.lower()
+        _bit = self._bits.get(value)
+
+        if _bit is None:
+            _bit = 1 << len(self._bits)
+            self._bits[value] = _bit
+
+        return _bit
+
+    def get_mask(self, values):
+        """
+        Get mask for attribute values, empty values are skipped
+        :param values: attribute value or list of values
+        :return int: mask, 'None' if values can not be represented as a mask
+        """
+        if not values:
+            return 0
+
+        if not isinstance(values, list):
+            values = [values]
+
+        _mask = 0
+
+        for _value in values:
+            if not _value:
+                continue
+
+            if not isinstance(_value, str):
+                return None
+
+            _mask |= self._get_bit(_value)
+
+        return _mask
+
+    def add_condition(self, signature, values, condition='any'):
+        """
+        Compile condition to a mask
+        :param str signature: condition signature
+        :param values: condition values
+        :param str condition: 'any' - at least one of values is to be present,
+            'all' - every value present is to be equal to every condition value
+        :return bool: condition was compiled, 'False' if it can not be tested with masks
+        """
+        if condition not in ['any', 'all']:
+            return False
+
+        # condition values are validated by regular comparison, leave the wrong ones to it
+        if not values or not all(_x and isinstance(_x, str) for _x in values):
+            return False
+
+        self._conditions[signature] = (self.get_mask(list(values)), condition)
+        return True
+
+    def __contains__(self, signature):
+        return signature in self._conditions
+
+    def match(self, signature, mask):
+        """
+        Test compiled condition
+        :param str signature: condition signature
+        :param int mask: mask of attribute values
+        :return bool:
+        """
+        _condition_mask, _condition = self._conditions[signature]
+
+        if _condition == 'any':
+            return bool(mask & _condition_mask)
+
+        # 'all' for flat comparison: all values are equal to all condition values
+        # so the only value should be given in the condition (may be repeated)
+        return bool(mask) and mask == _condition_mask and not (_condition_mask & (_condition_mask - 1))
+
+    def log_summary(self):
+        """
+        Log the size of the engine
+        """
+        logging.info("Bitset engine: %d conditions, %d distinct values" % (len(self._conditions), len(self._bits)))
@@ -0,0 +1,250 @@
+import json
+import logging
+from .records import UserViewSchema
+
+# relative costs used to order conditions inside a section
+# comparing a local value is cheap, regular expression is a bit more expensive,
+# dereferencing an attribute (like 'memberOf.businessCategory') means reading a record from LDAP
+_FLAT_VALUE_COST = 1.0
+_REGEXP_VALUE_COST = 4.0
+_REMOTE_FETCH_COST = 500.0
+
+# pass rate assumed for conditions never observed before
+_DEFAULT_PASS_RATE = 0.5
+
+# user attributes available as substitutes in mail templates
+SUBSTITUTE_ATTRIBUTES = ['cn', 'givenName', 'sn', 'displayName']
+
+
+class PolicyCondition:
+    def __init__(self, attrib, match_conf, position):
+        """
+        Compiled condition of a 'users' configuration section
+        :param str attrib: attribute to compare, may be dotted to dereference objects
+        :param dict match_conf: match configuration for the attribute
+        :param int position: position of the condition in 'condition_attributes'
+        """
+        self.attrib = attrib
+        self.match_conf = match_conf
+        self.position = position
+        self.head = attrib.split(".", 1)[0]
+        self.depth = attrib.count(".")
+        self.signature = json.dumps([attrib.lower(), match_conf], sort_keys=True, default=str)
+        self.cost = self._estimate_cost()
+        self.evaluations = 0
+        self.matches = 0
+
+    @property
+    def is_dotted(self):
+        """
+        Condition dereferences objects the attribute refers to
+        """
+        return self.depth > 0
+
+    def _estimate_cost(self):
+        """
+        Estimate relative cost of a single evaluation
+        :return float:
+        """
+        _match_conf = self.match_conf or dict()
+        _comparison = _match_conf.get('comparison') or dict()
+        _values = _match_conf.get('values') or list()
+        _value_cost = _REGEXP_VALUE_COST if _comparison.get('type') == 'regexp' else _FLAT_VALUE_COST
+
+        return 1.0 + _value_cost * len(_values) + _REMOTE_FETCH_COST * self.depth
+
+    def get_rank(self, statistics=None):
+        """
+        Ordering rank: the condition which is cheaper and rejects more goes first
+        This is cost divided by probability to reject, which is optimal for independent conditions
+        :param dict statistics: observed statistics by condition signature
+        :return float:
+        """
+        _pass_rate = _DEFAULT_PASS_RATE
+        _observed = (statistics or dict()).get(self.signature)
+
+        if _observed:
+            # smoothed to avoid zero probabilities on small samples
+            _pass_rate = (_observed.get("matches", 0) + 1) / (_observed.get("evaluations", 0) + 2)
+
+        return self.cost / (1.0 - _pass_rate)
+
+    def observe(self, matched):
+        """
+        Count the evaluation result for statistics
+        :param bool matched: evaluation result
+        """
+        self.evaluations += 1
+
+        if matched:
+            self.matches += 1
+
+
+class PolicySection:
+    def __init__(self, index, conf, statistics=None):
+        """
+        Compiled 'users' configuration section
+        :param int index: section index in 'users' configuration
+        :param dict conf: section configuration
+        :param dict statistics: observed statistics by condition signature
+        """
+        self.index = index
+        self.conf = conf
+        _conditions = list(PolicyCondition(_attrib, _match_conf, _position) for _position, (_attrib, _match_conf) in
+                           enumerate((conf.get('condition_attributes') or dict()).items()))
+
+        # cheap and selective conditions first, configuration order on ties
+        self.conditions = sorted(_conditions, key=lambda _x: (_x.get_rank(statistics), _x.position))
+        logging.debug("Section #%d conditions order: %s" % (index, ', '.join(_x.attrib for _x in self.conditions)))
+
+
+class CompiledPolicy:
+    def __init__(self, users_conf, statistics=None):
+        """
+        Policy compiled from 'users' configuration
+        :param list users_conf: 'users' configuration sections
+        :param dict statistics: observed statistics by condition signature, from previous runs
+        """
+        self.users = users_conf
+        self.sections = list(PolicySection(_index, _conf, statistics) for _index, _conf in enumerate(users_conf or list()))
+
+        # the most specific section wins, the first one on ties:
+        # evaluating in this order the first matched section is the result
+        self.ordered_sections = sorted(self.sections, key=lambda _x: (-len(_x.conditions), _x.index))
+
+        # sections by (lowercase) names of attributes tested, dotted ones by the referencing attribute
+        self.sections_by_attribute = dict()
+
+        for _section in self.sections:
+            for _head in set(_x.head.lower() for _x in _section.conditions):
+                self.sections_by_attribute.setdefault(_head, list()).append(_section)
+
+        # attributes the policy decision depends on
+        self.condition_attributes = sorted(self.sections_by_attribute.keys())
+
+        # user attributes read by the job at all
+        self.user_attributes = self._get_user_attributes()
+        self.user_schema = UserViewSchema(self.user_attributes)
+
+        # attributes to request from LDAP: for users, the record class and locking need a few more,
+        # for records referenced by dotted conditions - all the attributes after the first dot
+        self.user_projection = self.user_attributes + list(
+                _x for _x in ['objectClass', 'pwdAccountLockedTime'] if _x.lower() not in
+                set(_y.lower() for _y in self.user_attributes))
+        self.referenced_projection = self._get_referenced_attributes()
+
+    def _get_referenced_attributes(self):
+        """
+        Find out attributes read from the records referenced by dotted conditions
+        :return list: attribute names, unique case-insensitively
+        """
+        _result = dict()
+
+        for _section in self.sections:
+            for _condition in _section.conditions:
+                for _attrib in _condition.attrib.split(".")[1:]:
+                    _result.setdefault(_attrib.lower(), _attrib)
+
+        return list(_result.values())
+
+    def _get_user_attributes(self):
+        """
+        Find out user attributes read to apply the policy: conditions, time attributes,
+        and mail with substitutes for notifications
+        :return list: attribute names, unique case-insensitively
+        """
+        _result = dict()
+
+        def _add(attrib):
+            _result.setdefault(attrib.lower(), attrib)
+
+        _add('cn')
+
+        for _section in self.sections:
+            for _condition in _section.conditions:
+                _add(_condition.head)
+
+            for _attrib in _section.conf.get('time_attributes') or list():
+                _add(_attrib)
+
+            if _section.conf.get('lock_notifications'):
+                for _attrib in ['mail'] + SUBSTITUTE_ATTRIBUTES:
+                    _add(_attrib)
+
+        return list(_result.values())
+
+    def get_fingerprint(self, user_rec):
+        """
+        Canonical representation of user attribute values the policy decision depends on
+        Users with equal fingerprints get the same decision, order and duplicates of values do not matter
+        :param OcLdapRecord user_rec: LDAP record for user account
+        :return tuple:
+        """
+        _result = list()
+
+        for _attrib in self.condition_attributes:
+            _values = user_rec.get_attribute(_attrib)
+
+            if not isinstance(_values, list):
+                _values = [_values]
+
+            # empty values are skipped by comparison, so they do not matter too
+            _result.append(tuple(sorted(set(repr(_x) for _x in _values if _x))))
+
+        return tuple(_result)
+
+    def get_inapplicable_sections(self, user_rec):
+        """
+        Find sections which can not match the user since it has no value for an attribute tested
+        :param OcLdapRecord user_rec: LDAP record for user account
+        :return set: indexes of sections
+        """
+        _result = set()
+
+        for _head, _sections in self.sections_by_attribute.items():
+            if user_rec.get_attribute(_head):
+                continue
+
+            _result.update(_x.index for _x in _sections)
+
+        return _result
+
+    def add_statistics(self, statistics):
+        """
+        Count statistics observed by another copy of the policy (in a worker process) as observed by this one
+        :param dict statistics: statistics by condition signature, as returned by 'collect_statistics'
+        """
+        _pending = dict(statistics or dict())
+
+        for _section in self.sections:
+            for _condition in _section.conditions:
+                # conditions sharing the signature were summed up, so counted once
+                _observed = _pending.pop(_condition.signature, None)
+
+                if not _observed:
+                    continue
+
+                _condition.evaluations += _observed.get("evaluations", 0)
+                _condition.matches += _observed.get("matches", 0)
+
+    def collect_statistics(self, statistics=None):
+        """
+        Merge statistics observed since the previous call with the ones given
+        Observation counters are reset
+        :param dict statistics: statistics from previous runs
+        :return dict: statistics by condition signature
+        """
+        _result = dict((_k, dict(_v)) for _k, _v in (statistics or dict()).items())
+
+        for _section in self.sections:
+            for _condition in _section.conditions:
+                if not _condition.evaluations:
+                    continue
+
+                _observed = _result.setdefault(_condition.signature, {"evaluations": 0, "matches": 0})
+                _observed["evaluations"] += _condition.evaluations
+                _observed["matches"] += _condition.matches
+                _condition.evaluations = 0
+                _condition.matches = 0
+
+        return _result
@@ -0,0 +1,271 @@
+import collections
+import contextlib
+import copy
+import logging
+import ssl
+import threading
+import time
+import ldap3
+from ldap3.core.tls import check_hostname
+
+# server TLS settings are replaced once for all connections cloned
+_TLS_LOCK = threading.Lock()
+
+
+class SessionTls(ldap3.Tls):
+    def __init__(self, tls):
+        """
+        TLS settings sharing SSL context and session between connections to the same server:
+        a new connection resumes the session of the previous one, so neither full handshake
+        nor client certificate exchange is made. The server may refuse to resume, then a full handshake is made.
+        A session belongs to the context it was negotiated with, so only sessions of the connections
+        wrapped by these settings are resumed, not the one of the connection made by the client
+        :param ldap3.Tls tls: settings of the connection made by the client
+        """
+        self.__dict__.update(tls.__dict__)
+        self._context = None
+        self._session = None
+        self._session_lock = threading.Lock()
+        self.resumed = 0
+
+    def _get_context(self):
+        """
+        :return ssl.SSLContext: context made as 'ldap3.Tls' does, once
+        """
+        if self._context is not None:
+            return self._context
+
+        if self.version is None:
+            _context = ssl.create_default_context(
+                    purpose=ssl.Purpose.SERVER_AUTH, cafile=self.ca_certs_file,
+                    capath=self.ca_certs_path, cadata=self.ca_certs_data)
+        else:
+            _context = ssl.SSLContext(self.version)
+
+            if self.ca_certs_file or self.ca_certs_path or self.ca_certs_data:
+                _context.load_verify_locations(self.ca_certs_file, self.ca_certs_path, self.ca_certs_data)
+            elif self.validate != ssl.CERT_NONE:
+                _context.load_default_certs(ssl.Purpose.SERVER_AUTH)
+
+        if self.certificate_file:
+            _context.load_cert_chain(self.certificate_file, keyfile=self.private_key_file,
+                                     password=self.private_key_password)
+
+        _context.check_hostname = False
+        _context.verify_mode = self.validate
+
+        for _option in self.ssl_options:
+            _context.options |= _option
+
+        if self.ciphers:
+            _context.set_ciphers(self.ciphers)
+
+        self._context = _context
+        return _context
+
+    def remember(self, sock):
+        """
+        Keep the session of the connection established to resume it by the next one
+        TLS 1.3 tickets arrive after the handshake, so this is to be called after the first response
+        :param sock: socket of the connection
+        """
+        _session = getattr(sock, "session", None)
+
+        if _session is None or getattr(sock, "context", None) is not self._context:
+            return
+
+        with self._session_lock:
+            self._session = _session
+
+    def wrap_socket(self, connection, do_handshake=False):
+        """
+        Add TLS to the connection socket resuming the session kept, see 'ldap3.Tls.wrap_socket'
+        """
+        with self._session_lock:
+            _context = self._get_context()
+            _session = self._session
+
+        _socket = _context.wrap_socket(connection.socket, server_side=False, do_handshake_on_connect=do_handshake,
+                                       server_hostname=self.sni, session=_session)
+
+        if do_handshake:
+            if _socket.session_reused:
+                self.resumed += 1
+
+            if self.validate in [ssl.CERT_REQUIRED, ssl.CERT_OPTIONAL]:
+                check_hostname(_socket, connection.server.host, self.valid_names)
+
+        connection.socket = _socket
+
+
+def open_connection(connection):
+    """
+    Open LDAP connection the way the client does: connect, start TLS, bind
+    :param ldap3.Connection connection: connection closed
+    """
+    connection.open()
+    connection.start_tls()
+    connection.bind()
+
+    if isinstance(connection.server.tls, SessionTls):
+        connection.server.tls.remember(connection.socket)
+
+
+def is_alive(connection):
+    """
+    Check the connection is bound and the server answers: connections idle for long may be dropped by the server
+    :param ldap3.Connection connection: connection to check
+    :return bool:
+    """
+    if connection.closed or not connection.bound:
+        return False
+
+    try:
+        # root DSE with no attributes is the cheapest request
+        connection.search("", "(objectClass=*)", search_scope=ldap3.BASE, attributes=["1.1"])
+    except Exception as _e:
+        logging.debug("LDAP connection is lost: %s" % _e)
+        return False
+
+    return True
+
+
+def clone_connection(ldap_c):
+    """
+    Open another connection with the settings of the one given, the server and TLS session are shared
+    :param OcLdapUserCat ldap_c: connection made by the client
+    :return OcLdapUserCat: bound connection
+    """
+    _connection = ldap_c.ldap_c
+    _server = _connection.server
+
+    with _TLS_LOCK:
+        if _server.tls is not None and not isinstance(_server.tls, SessionTls):
+            _server.tls = SessionTls(_server.tls)
+
+    _clone = copy.copy(ldap_c)
+    _clone.ldap_c = ldap3.Connection(
+            server=_server, version=_connection.version, authentication=_connection.authentication,
+            user=_connection.user, password=_connection.password, sasl_mechanism=_connection.sasl_mechanism,
+            sasl_credentials=_connection.sasl_credentials, receive_timeout=_connection.receive_timeout)
+    open_connection(_clone.ldap_c)
+    return _clone
+
+
+class LdapConnectionPool:
+    def __init__(self, connect, size, check_interval=60):
+        """
+        Bound LDAP connections shared by threads
+        A connection idle for longer than the check interval is checked before it is given,
+        and opened and bound again if the server has dropped it
+        :param connect: function without arguments returning new bound 'OcLdapUserCat'
+        :param int size: connections at most
+        :param float check_interval: seconds a connection may be idle without check
+        """
+        if not size or size < 1:
+            raise ValueError("Invalid pool size: '%s'" % size)
+
+        self._connect = connect
+        self._size = size
+        self._check_interval = check_interval
+        # tuples (connection, time released), 'None' time if the connection is to be checked anyway
+        self._idle = list()
+        self._created = 0
+        self._condition = threading.Condition()
+        self.stats = collections.Counter()
+
+    @property
+    def size(self):
+        return self._size
+
+    def acquire(self):
+        """
+        Take idle connection or open new one, wait if all are taken
+        :return OcLdapUserCat:
+        """
+        with self._condition:
+            while not self._idle and self._created >= self._size:
+                self._condition.wait()
+
+            if self._idle:
+                # the connection used last is the least likely to be dropped
+                _ldap_c, _released_at = self._idle.pop()
+            else:
+                _ldap_c, _released_at = None, None
+                self._created += 1
+
+        try:
+            if _ldap_c is None:
+                _ldap_c = self._connect()
+                self.stats["created"] += 1
+                return _ldap_c
+
+            if _released_at is not None and time.monotonic() - _released_at < self._check_interval \
+                    and not _ldap_c.ldap_c.closed:
+                self.stats["reused"] += 1
+                return _ldap_c
+
+            if not is_alive(_ldap_c.ldap_c):
+                logging.info("Idle LDAP connection was dropped, binding again")
+                self._reopen(_ldap_c.ldap_c)
+                self.stats["rebound"] += 1
+
+            self.stats["reused"] += 1
+            return _ldap_c
+        except Exception:
+            with self._condition:
+                self._created -= 1
+                self._condition.notify()
+
+            raise
+
+    def _reopen(self, connection):
+        """
+        :param ldap3.Connection connection: connection dropped
+        """
+        try:
+            connection.unbind()
+        except Exception as _e:
+            logging.debug("LDAP connection is not closed: %s" % _e)
+
+        open_connection(connection)
+
+    def release(self, ldap_c, check=False):
+        """
+        Return the connection to the pool
+        :param OcLdapUserCat ldap_c: connection taken
+        :param bool check: check the connection before it is given next time, the operation on it has failed
+        """
+        with self._condition:
+            self._idle.append((ldap_c, None if check else time.monotonic()))
+            self._condition.notify()
+
+    @contextlib.contextmanager
+    def connection(self):
+        """
+        Connection taken for the block
+        """
+        _ldap_c = self.acquire()
+
+        try:
+            yield _ldap_c
+        except Exception:
+            self.release(_ldap_c, check=True)
+            raise
+
+        self.release(_ldap_c)
+
+    def close(self):
+        """
+        Close idle connections, the ones taken are closed by their users
+        """
+        with self._condition:
+            _idle = self._idle
+            self._idle = list()
+            self._created -= len(_idle)
+
+        for _ldap_c, _ in _idle:
+            try:
+                _ldap_c.ldap_c.unbind()
+            except Exception as _e:
+                logging.debug("LDAP connection is not closed: %s" % _e)
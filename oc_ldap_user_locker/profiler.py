@@ -0,0 +1,136 @@
+import logging
+import threading
+import time
+
+
+class RuleStatistics:
+    def __init__(self):
+        """
+        Counters for single configuration section or condition
+        """
+        self.evaluations = 0
+        self.matches = 0
+        self.short_circuits = 0
+        self.fetches = 0
+        self.elapsed = 0.0
+
+
+class RuleProfiler:
+    def __init__(self):
+        """
+        Collects evaluation statistics per 'users' configuration section and per 'condition_attributes' key
+        Section-level statistics are stored with 'None' as condition attribute
+        """
+        self._stats = dict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _get_stats(self, section, attrib):
+        """
+        Get (create if absent) counters for the section and attribute given
+        :param int section: section index in 'users' configuration
+        :param str attrib: condition attribute, 'None' for the section itself
+        :return RuleStatistics:
+        """
+        _key = (section, attrib)
+        _stats = self._stats.get(_key)
+
+        if _stats is None:
+            _stats = RuleStatistics()
+            self._stats[_key] = _stats
+
+        return _stats
+
+    def begin(self, section, attrib=None):
+        """
+        Start measuring section or condition evaluation
+        :param int section: section index in 'users' configuration
+        :param str attrib: condition attribute, 'None' for the section itself
+        :return float: start time, to be passed to 'end'
+        """
+        if attrib is None:
+            self._local.section = section
+
+        self._local.attrib = attrib
+        return time.perf_counter()
+
+    def end(self, started, section, attrib=None, matched=False, short_circuit=False):
+        """
+        Finish measuring section or condition evaluation
+        :param float started: value returned by 'begin'
+        :param int section: section index in 'users' configuration
+        :param str attrib: condition attribute, 'None' for the section itself
+        :param bool matched: evaluation result
+        :param bool short_circuit: failed condition stopped evaluation before all conditions of the section were checked
+        """
+        _elapsed = time.perf_counter() - started
+
+        with self._lock:
+            _stats = self._get_stats(section, attrib)
+            _stats.evaluations += 1
+            _stats.elapsed += _elapsed
+
+            if matched:
+                _stats.matches += 1
+
+            if short_circuit:
+                _stats.short_circuits += 1
+
+                # condition stopped the evaluation of the whole section
+                if attrib is not None:
+                    self._get_stats(section, None).short_circuits += 1
+
+        self._local.attrib = None
+
+    def add_fetch(self):
+        """
+        Count remote record fetch for the section and condition being evaluated now
+        """
+        _section = getattr(self._local, 'section', None)
+
+        if _section is None:
+            return
+
+        _attrib = getattr(self._local, 'attrib', None)
+
+        with self._lock:
+            self._get_stats(_section, None).fetches += 1
+
+            if _attrib is not None:
+                self._get_stats(_section, _attrib).fetches += 1
+
+    def report(self):
+        """
+        Format collected statistics as a table sorted by cumulative time, most expensive first
+        :return str:
+        """
+        _header = ("section", "condition", "evals", "matches", "short", "fetches", "time, ms")
+        _rows = list()
+
+        with self._lock:
+            _items = sorted(self._stats.items(), key=lambda _x: _x[1].elapsed, reverse=True)
+
+        for (_section, _attrib), _stats in _items:
+            _rows.append((
+                "#%d" % _section,
+                _attrib or "*",
+                str(_stats.evaluations),
+                str(_stats.matches),
+                str(_stats.short_circuits),
+                str(_stats.fetches),
+                "%.3f" % (_stats.elapsed * 1000)))
+
+        _widths = list(max(len(_row[_i]) for _row in [_header] + _rows) for _i in range(len(_header)))
+        _lines = list()
+
+        for _row in [_header] + _rows:
+            _lines.append("  ".join(_v.ljust(_w) if _i < 2 else _v.rjust(_w)
+                                    for _i, (_v, _w) in enumerate(zip(_row, _widths))))
+
+        return "\n".join(_lines)
+
+    def log_report(self):
+        """
+        Write statistics table to the log
+        """
+        logging.info("Rule evaluation profile:\n%s" % self.report())
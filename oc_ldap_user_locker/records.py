@@ -0,0 +1,102 @@
+import sys
+
+
+class UserViewSchema:
+    def __init__(self, attributes):
+        """
+        Attributes kept by compact user views, shared by all views made
+        :param list attributes: attribute names
+        """
+        self.attributes = tuple(attributes)
+        self._positions = dict((_x.lower(), _i) for _i, _x in enumerate(self.attributes))
+
+    def get_position(self, attr_name):
+        """
+        Position of attribute value in views
+        :param str attr_name: attribute name, case-insensitive
+        :return int: position, 'None' if the attribute is not kept
+        """
+        return self._positions.get(attr_name.lower())
+
+    def make_view(self, dn, attributes):
+        """
+        Make compact view from attributes dictionary, attributes not in the schema are dropped
+        :param str dn: record DN
+        :param dict attributes: attribute values by name (case-insensitive), single values or lists
+        :return UserView:
+        """
+        _values = [None] * len(self.attributes)
+
+        for _attr_name, _value in attributes.items():
+            _position = self.get_position(_attr_name)
+
+            if _position is None:
+                continue
+
+            _values[_position] = _compact_value(_value)
+
+        return UserView(self, dn, tuple(_values))
+
+    def make_view_from_record(self, user_rec):
+        """
+        Make compact view from full LDAP record
+        :param OcLdapRecord user_rec: LDAP record for user account
+        :return UserView:
+        """
+        return UserView(self, user_rec.dn, tuple(_compact_value(user_rec.get_attribute(_x)) for _x in self.attributes))
+
+
+class UserView:
+    __slots__ = ('_schema', 'dn', '_values')
+
+    def __init__(self, schema, dn, values):
+        """
+        Compact read-only user record holding the attributes of the schema only
+        :param UserViewSchema schema: attributes kept
+        :param str dn: record DN
+        :param tuple values: attribute values in the schema order
+        """
+        self._schema = schema
+        self.dn = dn
+        self._values = values
+
+    def get_attribute(self, attr_name):
+        """
+        Get attribute value the same way OcLdapRecord does
+        :param str attr_name: attribute name
+        :return: single value, list of values in case of multiple ones, 'None' if not set or not kept
+        """
+        if not attr_name:
+            raise ValueError(
+                "Incorrect attribute name: type '%s', value '%s'" % (type(attr_name), attr_name))
+
+        _position = self._schema.get_position(attr_name)
+
+        if _position is None:
+            return None
+
+        _value = self._values[_position]
+
+        if isinstance(_value, tuple):
+            return list(_value)
+
+        return _value
+
+
+def _compact_value(value):
+    """
+    Convert attribute value to compact form: single-element lists are unwrapped, lists become tuples,
+    strings are interned since many users share the same values (group DNs, for instance)
+    :param value: attribute value or list of values
+    :return: compact value
+    """
+    if isinstance(value, list):
+        if len(value) == 1:
+            return _compact_value(value[0])
+
+        return tuple(_compact_value(_x) for _x in value)
+
+    if isinstance(value, str):
+        return sys.intern(value)
+
+    return value
@@ -0,0 +1,146 @@
+import logging
+import random
+import socket
+import threading
+import time
+from ldap3.core.exceptions import LDAPCommunicationError, LDAPResponseTimeoutError, LDAPOperationResult
+
+# busy, unavailable, unwillingToPerform: the server may do it a bit later
+TRANSIENT_LDAP_RESULTS = [51, 52, 53]
+
+
+def is_transient_ldap_error(error):
+    """
+    :param Exception error: error raised by LDAP operation
+    :return bool: the operation may succeed if repeated
+    """
+    if isinstance(error, (LDAPCommunicationError, LDAPResponseTimeoutError, socket.timeout, ConnectionError)):
+        return True
+
+    return isinstance(error, LDAPOperationResult) and error.result in TRANSIENT_LDAP_RESULTS
+
+
+def is_transient_smtp_error(error):
+    """
+    :param Exception error: error raised while sending mail
+    :return bool: the relay is unavailable or refused temporarily, sending may succeed if repeated
+    """
+    # 'smtplib' is imported only when there is something to send, see 'mailer'
+    import smtplib
+
+    if isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError,
+                          socket.timeout, ConnectionError)):
+        return True
+
+    # 4xx replies are temporary failures
+    return isinstance(error, smtplib.SMTPResponseException) and 400 <= error.smtp_code < 500
+
+
+class RetryPolicy:
+    def __init__(self, retries=2, delay=1.0, max_delay=30.0):
+        """
+        Repeat operations failed with transient errors, with exponential backoff and full jitter
+        :param int retries: attempts after the first one
+        :param float delay: base delay, seconds
+        :param float max_delay: delay limit, seconds
+        """
+        if retries is None or retries < 0:
+            raise ValueError("Invalid number of retries: '%s'" % retries)
+
+        self.retries = retries
+        self.delay = delay
+        self.max_delay = max_delay
+
+    def get_delay(self, attempt):
+        """
+        :param int attempt: number of the attempt failed, starting from 1
+        :return float: seconds to wait before the next attempt
+        """
+        return random.uniform(0, min(self.max_delay, self.delay * (2 ** (attempt - 1))))
+
+    def call(self, func, is_transient, on_retry=None):
+        """
+        Call the function, repeat it on transient errors
+        :param func: function without arguments
+        :param is_transient: function telling the error is transient
+        :param on_retry: function called with the error before the next attempt, to reconnect for example
+        :return: result of the function
+        """
+        _attempt = 0
+
+        while True:
+            _attempt += 1
+
+            try:
+                return func()
+            except Exception as _e:
+                if _attempt > self.retries or not is_transient(_e):
+                    raise
+
+                _delay = self.get_delay(_attempt)
+                logging.warning("Transient error, attempt %d of %d is made in %.1f seconds: %s" % (
+                    _attempt + 1, self.retries + 1, _delay, _e))
+                time.sleep(_delay)
+
+                if on_retry:
+                    on_retry(_e)
+
+
+class CircuitBreaker:
+    def __init__(self, name, failures=5, reset_timeout=900):
+        """
+        Stop calling a service after repeated failures, try again after a while
+        Closed - calls are made; open - calls are not made until reset timeout passes;
+        then a single trial call is allowed, its success closes the breaker, its failure opens it again
+        :param str name: service name for logs
+        :param int failures: consecutive failures opening the breaker
+        :param float reset_timeout: seconds to wait before the trial call
+        """
+        if not failures or failures < 1:
+            raise ValueError("Invalid number of failures: '%s'" % failures)
+
+        self._name = name
+        self._threshold = failures
+        self._reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self._opened_at is not None
+
+    def allow(self):
+        """
+        :return bool: the call may be made now
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return True
+
+            if self._trial or time.monotonic() - self._opened_at < self._reset_timeout:
+                return False
+
+            logging.info("Circuit breaker for %s: trying again" % self._name)
+            self._trial = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                logging.info("Circuit breaker for %s is closed" % self._name)
+
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+
+            if self._trial or (self._opened_at is None and self._failures >= self._threshold):
+                logging.warning("Circuit breaker for %s is open after %d failures" % (self._name, self._failures))
+                self._opened_at = time.monotonic()
+
+            self._trial = False
@@ -0,0 +1,200 @@
+import argparse
+import concurrent.futures
+import datetime
+import logging
+import math
+import os
+from .locker import OcLdapUserLocker
+from .snapshot import DirectorySnapshot
+
+# users evaluated by a worker process at once
+_CHUNK_SIZE_MIN = 1000
+
+# label for the users no configuration section applies to
+NO_SECTION = "none"
+
+# worker process state, set by '_init_worker'
+_worker_locker = None
+
+
+def _get_locker(config_path, snapshot_path):
+    """
+    Create locker evaluating from snapshot, the same code as for real runs is used
+    :param str config_path: path to candidate configuration
+    :param str snapshot_path: path to directory snapshot
+    :return OcLdapUserLocker:
+    """
+    _locker = OcLdapUserLocker(config_path, snapshot_path=snapshot_path, offline=True)
+    _locker._prepare_evaluation()
+    return _locker
+
+
+def _init_worker(config_path, snapshot_path, log_level):
+    """
+    Worker process initialization: the locker with compiled policy is created once per process
+    """
+    global _worker_locker
+    logging.getLogger().setLevel(log_level)
+    _worker_locker = _get_locker(config_path, snapshot_path)
+
+
+def _simulate_chunk(offset, limit, now, days):
+    """
+    Worker task: simulate a range of snapshot users
+    :return dict: counters, see 'simulate_users'
+    """
+    return simulate_users(_worker_locker, offset, limit, now, days)
+
+
+def simulate_users(locker, offset, limit, now, days):
+    """
+    Simulate daily runs for a range of snapshot users
+    :param OcLdapUserLocker locker: locker prepared for evaluation from snapshot
+    :param int offset: users to skip
+    :param int limit: users to simulate at most, all the rest if 'None'
+    :param datetime.datetime now: start of simulation
+    :param int days: number of daily runs to simulate, the first one is 'now'
+    :return dict: counters {(section index or NO_SECTION, day or None, event): count},
+                  where event is 'users', 'notifications' or 'locks'; day is 'None' for 'users'
+    """
+    _policy = locker._get_policy()
+    _schema = _policy.user_schema
+    _section_indexes = dict((id(_x.conf), _x.index) for _x in _policy.sections)
+    _result = dict()
+
+    def _count(key):
+        _result[key] = _result.get(key, 0) + 1
+
+    for _dn, _attributes in locker._snapshot.iter_user_records(_policy.user_projection, offset=offset, limit=limit):
+        _user_rec = _schema.make_view(_dn, _attributes)
+        _conf = locker._find_valid_conf(_user_rec)
+
+        if _conf is None:
+            _count((NO_SECTION, None, "users"))
+            continue
+
+        _section = _section_indexes.get(id(_conf))
+        _count((_section, None, "users"))
+        _lock_date = locker._get_account_lock_date(_user_rec, _conf['days_valid'], _conf['time_attributes'])
+
+        if not _lock_date:
+            continue
+
+        for _day in range(0, days):
+            _days_before_lock = locker._get_days_before_lock(_lock_date, now + datetime.timedelta(days=_day))
+
+            if locker._get_lock_notification(_user_rec, _conf, _days_before_lock):
+                _count((_section, _day, "notifications"))
+
+            if _days_before_lock <= 0:
+                # locked, nothing more happens
+                _count((_section, _day, "locks"))
+                break
+
+    return _result
+
+
+def _merge(result, counters):
+    for _key, _value in counters.items():
+        result[_key] = result.get(_key, 0) + _value
+
+
+def simulate(config_path, snapshot_path, days=30, workers=None, now=None):
+    """
+    Simulate daily runs of candidate configuration against directory snapshot
+    :param str config_path: path to candidate configuration
+    :param str snapshot_path: path to directory snapshot
+    :param int days: number of daily runs to simulate
+    :param int workers: number of worker processes, CPU count if not set; '1' to simulate in this process
+    :param datetime.datetime now: start of simulation, current time if not set
+    :return dict: counters, see 'simulate_users'
+    """
+    if not days or days <= 0:
+        raise ValueError("Invalid number of days: '%s'" % days)
+
+    now = now or datetime.datetime.now()
+    workers = workers or os.cpu_count() or 1
+    _snapshot = DirectorySnapshot(snapshot_path)
+    _snapshot.open()
+
+    try:
+        _users = _snapshot.count_users()
+    finally:
+        _snapshot.close()
+
+    logging.info("Simulating %d days for %d users, workers: %d" % (days, _users, workers))
+    _result = dict()
+
+    if workers == 1:
+        _merge(_result, simulate_users(_get_locker(config_path, snapshot_path), 0, None, now, days))
+        return _result
+
+    _chunk_size = max(_CHUNK_SIZE_MIN, math.ceil(_users / (workers * 4)))
+
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker,
+            initargs=(config_path, snapshot_path, logging.getLogger().level)) as _executor:
+        _futures = list(_executor.submit(_simulate_chunk, _offset, _chunk_size, now, days)
+                        for _offset in range(0, _users, _chunk_size))
+
+        for _future in concurrent.futures.as_completed(_futures):
+            _merge(_result, _future.result())
+
+    return _result
+
+
+def format_report(result, days, now):
+    """
+    Format simulation result as text tables: totals per section and events per day
+    :param dict result: counters, see 'simulate_users'
+    :param int days: number of days simulated
+    :param datetime.datetime now: start of simulation
+    :return str:
+    """
+    _sections = sorted(set(_x[0] for _x in result.keys()),
+                       key=lambda _x: (_x == NO_SECTION, _x if _x != NO_SECTION else 0))
+
+    def _sum(section, event):
+        return sum(_v for _k, _v in result.items() if _k[0] == section and _k[2] == event)
+
+    _lines = ["%-10s %10s %14s %10s" % ("section", "users", "notifications", "locks")]
+
+    for _section in _sections:
+        _lines.append("%-10s %10d %14d %10d" % (
+            _section, _sum(_section, "users"), _sum(_section, "notifications"), _sum(_section, "locks")))
+
+    _lines.append("")
+    _lines.append("%-10s %-10s %14s %10s" % ("date", "section", "notifications", "locks"))
+
+    for _day in range(0, days):
+        _date = (now + datetime.timedelta(days=_day)).date().isoformat()
+
+        for _section in _sections:
+            _notifications = result.get((_section, _day, "notifications"), 0)
+            _locks = result.get((_section, _day, "locks"), 0)
+
+            if _notifications or _locks:
+                _lines.append("%-10s %-10s %14d %10d" % (_date, _section, _notifications, _locks))
+
+    return "\n".join(_lines)
+
+
+def main(args=None):
+    _p = argparse.ArgumentParser(description="Simulate LDAP user locker configuration against directory snapshot")
+    _p.add_argument("--config", type=str, required=True, help="Path to candidate JSON configuration")
+    _p.add_argument("--snapshot", type=str, required=True, help="Path to directory snapshot ('--snapshot-write')")
+    _p.add_argument("--days", type=int, default=30, help="Number of daily runs to simulate")
+    _p.add_argument("--workers", type=int, help="Number of worker processes, CPU count by default")
+    _p.add_argument("--log-level", type=int, default=30, help="Logging level (integer)")
+    _args = _p.parse_args(args)
+
+    logging.basicConfig(format="%(pathname)s: %(asctime)-15s: %(levelname)s: %(funcName)s: %(lineno)d: %(message)s",
+                        level=_args.log_level)
+
+    _now = datetime.datetime.now()
+    _result = simulate(_args.config, _args.snapshot, days=_args.days, workers=_args.workers, now=_now)
+    print(format_report(_result, _args.days, _now))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+import base64
+import datetime
+import json
+import logging
+import os
+import sqlite3
+import time
+from .directory import read_record
+
+_SNAPSHOT_FORMAT = 1
+_KIND_USER = "user"
+_KIND_REFERENCED = "referenced"
+
+
+def _encode_value(value):
+    """
+    JSON encoder for attribute values JSON does not support
+    """
+    if isinstance(value, datetime.datetime):
+        return {"$dt": value.isoformat()}
+
+    if isinstance(value, bytes):
+        return {"$b": base64.b64encode(value).decode("ascii")}
+
+    raise TypeError("Type '%s' is not supported by snapshot" % type(value))
+
+
+def _decode_value(value):
+    """
+    JSON decoder hook for attribute values encoded with '_encode_value'
+    """
+    if "$dt" in value:
+        return datetime.datetime.fromisoformat(value["$dt"])
+
+    if "$b" in value:
+        return base64.b64decode(value["$b"])
+
+    return value
+
+
+def _select_attributes(attributes, names):
+    """
+    :param dict attributes: all attributes kept
+    :param list names: attributes requested, case-insensitive
+    :return dict: attributes requested only
+    """
+    _names = set(_x.lower() for _x in names)
+    return dict((_k, _v) for _k, _v in attributes.items() if _k.lower() in _names)
+
+
+class DirectorySnapshot:
+    def __init__(self, path):
+        """
+        Local copy of the user records and the records referenced by dotted conditions,
+        with the attributes of the policy projection only. Kept in SQLite database, one row per record.
+        :param str path: path to the database file
+        """
+        self._path = path
+        self._db = None
+        self.user_attributes = None
+        self.referenced_attributes = None
+        self.created = None
+        self.change_state = None
+
+    def get_age(self):
+        """
+        :return float: seconds since the snapshot file was written, 'None' if it does not exist
+        """
+        if not os.path.exists(self._path):
+            return None
+
+        return time.time() - os.path.getmtime(self._path)
+
+    def covers(self, user_attributes, referenced_attributes):
+        """
+        Check the snapshot keeps all the attributes given
+        :param list user_attributes: user attributes
+        :param list referenced_attributes: referenced records attributes
+        :return bool:
+        """
+        for _kept, _required in [(self.user_attributes, user_attributes),
+                                 (self.referenced_attributes, referenced_attributes)]:
+            if not set(_x.lower() for _x in _required).issubset(set(_x.lower() for _x in _kept or list())):
+                return False
+
+        return True
+
+    def open(self):
+        """
+        Open existing snapshot for reading
+        """
+        if not os.path.exists(self._path):
+            raise FileNotFoundError("Snapshot '%s' does not exist" % self._path)
+
+        self._db = sqlite3.connect("file:%s?mode=ro" % self._path, uri=True)
+        _meta = dict(self._db.execute("SELECT key, value FROM meta").fetchall())
+
+        if int(_meta.get("format") or 0) != _SNAPSHOT_FORMAT:
+            self.close()
+            raise ValueError("Snapshot '%s' format is not supported" % self._path)
+
+        self.user_attributes = json.loads(_meta.get("user_attributes"))
+        self.referenced_attributes = json.loads(_meta.get("referenced_attributes"))
+        self.created = datetime.datetime.fromisoformat(_meta.get("created"))
+        self.change_state = _meta.get("change_state")
+        logging.info("Snapshot '%s' created at %s" % (self._path, self.created.isoformat(sep=" ")))
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def write(self, ldap_c, user_dns, policy, call_ldap=None, is_stopped=None, change_state=None):
+        """
+        Read records from LDAP and write a new snapshot, the previous one is replaced at once
+        :param OcLdapUserCat ldap_c: LDAP catalogue client
+        :param user_dns: iterable of DNs of the users to keep
+        :param CompiledPolicy policy: policy to take attribute projections from
+        :param call_ldap: function calling LDAP operation given as a function of the connection,
+            to repeat and limit reads; the operation is called directly if not set
+        :param is_stopped: function telling the iteration of users was stopped, so the users are not all read
+        :param str change_state: change tracking state taken before the records are read,
+            changes made after it may be missing in the snapshot
+        :return bool: written, 'False' if stopped: the previous snapshot is kept then
+        """
+        if call_ldap is None:
+            call_ldap = lambda _func: _func(ldap_c)
+
+        self.close()
+        _temp_path = self._path + ".tmp"
+
+        if os.path.exists(_temp_path):
+            os.remove(_temp_path)
+
+        _db = sqlite3.connect(_temp_path)
+
+        try:
+            _db.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+            _db.execute("CREATE TABLE records (kind TEXT, dn_key TEXT, dn TEXT, attributes TEXT, "
+                        "PRIMARY KEY (kind, dn_key))")
+            _dotted = self._get_dotted_paths(policy)
+            _referenced = set()
+            _users = 0
+
+            for _dn in user_dns:
+                _result = call_ldap(lambda _ldap_c: read_record(_ldap_c, _dn, policy.user_projection))
+
+                if _result is None:
+                    continue
+
+                self._put(_db, _KIND_USER, _result)
+                _referenced.update(self._get_references(_result[1], list(_x[0] for _x in _dotted)))
+                _users += 1
+
+            if is_stopped is not None and is_stopped():
+                # a partial snapshot would be evaluated as the whole directory by the next runs
+                logging.warning("Stopped, snapshot '%s' is not written" % self._path)
+                _db.close()
+                os.remove(_temp_path)
+                return False
+
+            # records referenced by users, then by referenced records for deeper dotted conditions
+            _written = set()
+
+            while _referenced:
+                _dn = _referenced.pop()
+
+                if _dn.lower() in _written:
+                    continue
+
+                _written.add(_dn.lower())
+                _result = call_ldap(lambda _ldap_c: read_record(_ldap_c, _dn, policy.referenced_projection))
+
+                if _result is None:
+                    continue
+
+                self._put(_db, _KIND_REFERENCED, _result)
+                _referenced.update(_x for _x in self._get_references(
+                    _result[1], list(_y for _x in _dotted for _y in _x[1:-1])) if _x.lower() not in _written)
+
+            for _key, _value in [
+                    ("format", str(_SNAPSHOT_FORMAT)),
+                    ("created", datetime.datetime.now().isoformat()),
+                    ("user_attributes", json.dumps(policy.user_projection)),
+                    ("referenced_attributes", json.dumps(policy.referenced_projection)),
+                    ("change_state", change_state)]:
+                _db.execute("INSERT INTO meta VALUES (?, ?)", (_key, _value))
+
+            _db.commit()
+        finally:
+            _db.close()
+
+        os.replace(_temp_path, self._path)
+        logging.info("Snapshot '%s' written: %d users, %d referenced records" % (self._path, _users, len(_written)))
+        return True
+
+    def _get_dotted_paths(self, policy):
+        """
+        :return list: attribute paths of dotted conditions, as lists of attribute names
+        """
+        return list(_x.attrib.split(".") for _section in policy.sections for _x in _section.conditions if _x.is_dotted)
+
+    def _get_references(self, attributes, names):
+        """
+        :param dict attributes: record attributes
+        :param list names: names of attributes with references
+        :return set: DNs referenced
+        """
+        _names = set(_x.lower() for _x in names)
+        _result = set()
+
+        for _name, _value in attributes.items():
+            if _name.lower() not in _names:
+                continue
+
+            _result.update(_x for _x in (_value if isinstance(_value, list) else [_value]) if isinstance(_x, str) and _x)
+
+        return _result
+
+    def _put(self, db, kind, record):
+        db.execute("INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?)", (
+            kind, record[0].lower(), record[0],
+            json.dumps(record[1], default=_encode_value, separators=(',', ':'))))
+
+    def _load(self, attributes):
+        return json.loads(attributes, object_hook=_decode_value)
+
+    def iter_users(self):
+        """
+        :return: generator of user DNs, in DN order
+        """
+        for _row in self._db.execute("SELECT dn FROM records WHERE kind = ? ORDER BY dn_key", (_KIND_USER,)):
+            yield _row[0]
+
+    def count_users(self):
+        """
+        :return int: number of users kept
+        """
+        return self._db.execute("SELECT COUNT(*) FROM records WHERE kind = ?", (_KIND_USER,)).fetchone()[0]
+
+    def iter_user_records(self, attributes, offset=0, limit=None):
+        """
+        Iterate over user records in DN order, a range of them if requested
+        :param list attributes: attributes to return
+        :param int offset: records to skip
+        :param int limit: records to return at most, all the rest if 'None'
+        :return: generator of tuples (DN, dictionary of attributes)
+        """
+        for _dn, _attributes in self._db.execute(
+                "SELECT dn, attributes FROM records WHERE kind = ? ORDER BY dn_key LIMIT ? OFFSET ?",
+                (_KIND_USER, -1 if limit is None else limit, offset)):
+            yield (_dn, _select_attributes(self._load(_attributes), attributes))
+
+    def read_record(self, dn, attributes, referenced=False):
+        """
+        Read the attributes requested of the record, the same way 'directory.read_record' does
+        :param str dn: record DN
+        :param list attributes: attributes to return
+        :param bool referenced: read the record referenced by dotted conditions, user record otherwise
+        :return tuple: (DN, dictionary of attributes), 'None' if record is not found
+        """
+        if not dn or not isinstance(dn, str):
+            raise ValueError('Invalid DN given')
+
+        _row = self._db.execute("SELECT dn, attributes FROM records WHERE kind = ? AND dn_key = ?", (
+            _KIND_REFERENCED if referenced else _KIND_USER, dn.lower())).fetchone()
+
+        if _row is None:
+            logging.error("Record '%s' was not found in snapshot" % dn)
+            return None
+
+        return (_row[0], _select_attributes(self._load(_row[1]), attributes))
+
+    def iter_referenced(self, attrib):
+        """
+        Iterate over referenced records having the attribute given
+        :param str attrib: attribute name
+        :return: generator of tuples (DN, dictionary with the attribute)
+        """
+        for _dn, _attributes in self._db.execute("SELECT dn, attributes FROM records WHERE kind = ?",
+                                                 (_KIND_REFERENCED,)):
+            _attributes = _select_attributes(self._load(_attributes), [attrib])
+
+            if _attributes:
+                yield (_dn, _attributes)
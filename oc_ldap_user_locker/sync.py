@@ -0,0 +1,284 @@
+import base64
+import datetime
+import logging
+import ldap3
+from ldap3.core.exceptions import LDAPOperationResult
+from ldap3.utils.conv import escape_filter_chars
+from pyasn1.codec.ber import encoder, decoder
+from pyasn1.type import univ, namedtype, namedval
+from .directory import iter_search, ACTIVE_USERS_FILTER, GROUP_OBJECT_CLASS
+
+# LDAP Content Synchronization Operation, RFC 4533
+SYNC_REQUEST_OID = '1.3.6.1.4.1.4203.1.9.1.1'
+SYNC_STATE_OID = '1.3.6.1.4.1.4203.1.9.1.2'
+SYNC_DONE_OID = '1.3.6.1.4.1.4203.1.9.1.3'
+
+SYNC_REFRESH_ONLY = 1
+SYNC_STATE_PRESENT = 0
+SYNC_STATE_ADD = 1
+SYNC_STATE_MODIFY = 2
+SYNC_STATE_DELETE = 3
+
+# e-syncRefreshRequired: the cookie is too old, the content is to be reloaded
+_SYNC_REFRESH_REQUIRED = 4096
+
+
+class _SyncRequestValue(univ.Sequence):
+    componentType = namedtype.NamedTypes(
+        namedtype.NamedType('mode', univ.Enumerated(
+            namedValues=namedval.NamedValues(('refreshOnly', 1), ('refreshAndPersist', 3)))),
+        namedtype.OptionalNamedType('cookie', univ.OctetString()),
+        namedtype.DefaultedNamedType('reloadHint', univ.Boolean(False)))
+
+
+class _SyncStateValue(univ.Sequence):
+    componentType = namedtype.NamedTypes(
+        namedtype.NamedType('state', univ.Enumerated(
+            namedValues=namedval.NamedValues(('present', 0), ('add', 1), ('modify', 2), ('delete', 3)))),
+        namedtype.NamedType('entryUUID', univ.OctetString()),
+        namedtype.OptionalNamedType('cookie', univ.OctetString()))
+
+
+class _SyncDoneValue(univ.Sequence):
+    componentType = namedtype.NamedTypes(
+        namedtype.OptionalNamedType('cookie', univ.OctetString()),
+        namedtype.DefaultedNamedType('refreshDeletes', univ.Boolean(False)))
+
+
+def _get_optional(value, name):
+    """
+    :return: value of an optional ASN.1 component, 'None' if absent
+    """
+    if not value[name].isValue:
+        return None
+
+    return value[name]
+
+
+def encode_sync_request(cookie=None, mode=SYNC_REFRESH_ONLY):
+    """
+    :param bytes cookie: cookie from the previous synchronization, 'None' for the initial content
+    :param int mode: synchronization mode
+    :return bytes: encoded Sync Request Control value
+    """
+    _value = _SyncRequestValue()
+    _value['mode'] = mode
+
+    if cookie is not None:
+        _value['cookie'] = cookie
+
+    return encoder.encode(_value)
+
+
+def decode_sync_request(value):
+    """
+    :param bytes value: encoded Sync Request Control value
+    :return tuple: (mode, cookie)
+    """
+    _value, _ = decoder.decode(value, asn1Spec=_SyncRequestValue())
+    _cookie = _get_optional(_value, 'cookie')
+    return (int(_value['mode']), bytes(_cookie) if _cookie is not None else None)
+
+
+def encode_sync_state(state, entry_uuid, cookie=None):
+    """
+    :param int state: entry state
+    :param bytes entry_uuid: entry UUID
+    :param bytes cookie: cookie, optional
+    :return bytes: encoded Sync State Control value
+    """
+    _value = _SyncStateValue()
+    _value['state'] = state
+    _value['entryUUID'] = entry_uuid
+
+    if cookie is not None:
+        _value['cookie'] = cookie
+
+    return encoder.encode(_value)
+
+
+def decode_sync_state(value):
+    """
+    :param bytes value: encoded Sync State Control value
+    :return tuple: (state, entry UUID)
+    """
+    _value, _ = decoder.decode(value, asn1Spec=_SyncStateValue())
+    return (int(_value['state']), bytes(_value['entryUUID']))
+
+
+def encode_sync_done(cookie, refresh_deletes=False):
+    """
+    :param bytes cookie: cookie for the next synchronization
+    :param bool refresh_deletes: deleted entries were sent as such
+    :return bytes: encoded Sync Done Control value
+    """
+    _value = _SyncDoneValue()
+
+    if cookie is not None:
+        _value['cookie'] = cookie
+
+    _value['refreshDeletes'] = refresh_deletes
+    return encoder.encode(_value)
+
+
+def decode_sync_done(value):
+    """
+    :param bytes value: encoded Sync Done Control value
+    :return bytes: cookie, 'None' if not given
+    """
+    _value, _ = decoder.decode(value, asn1Spec=_SyncDoneValue())
+    _cookie = _get_optional(_value, 'cookie')
+    return bytes(_cookie) if _cookie is not None else None
+
+
+class ChangeTracker:
+    def __init__(self, ldap_c, mode="timestamp", page_size=100):
+        """
+        Find out users changed since the previous run, and members of groups changed
+        States are strings prefixed with the mode, to be kept between runs
+        :param OcLdapUserCat ldap_c: LDAP catalogue client
+        :param str mode: 'timestamp' - compare 'modifyTimestamp' with the previous run start time,
+                         'sync' - LDAP Content Synchronization (RFC 4533) with a cookie
+        :param int page_size: page size for paged searches
+        """
+        if mode not in ["timestamp", "sync"]:
+            raise NotImplementedError("Change tracking '%s' is not supported" % mode)
+
+        self._ldap_c = ldap_c
+        self._mode = mode
+        self._page_size = page_size
+        self._user_filter = ACTIVE_USERS_FILTER
+        self._group_object_class = GROUP_OBJECT_CLASS
+
+    def is_valid_state(self, state):
+        """
+        :param str state: state kept from the previous run
+        :return bool: the state may be used with the mode configured
+        """
+        return bool(state) and state.startswith(self._mode + ":")
+
+    def get_state(self):
+        """
+        Get the state to track changes made from now on
+        :return str:
+        """
+        if self._mode == "timestamp":
+            return self._get_timestamp_state()
+
+        _changed, _state = self._sync(None)
+        return _state
+
+    def scan(self):
+        """
+        Get all users to process on full scan, and the state to track changes made from now on
+        In 'sync' mode both are taken from a single synchronization search, so the content is not loaded twice
+        :return tuple: (iterable of user DNs, state)
+        """
+        if self._mode == "timestamp":
+            # changes made while the users are iterated are caught by the next run
+            _state = self._get_timestamp_state()
+            return ((_x[0] for _x in iter_search(self._ldap_c, self._user_filter, page_size=self._page_size)), _state)
+
+        _content, _state = self._sync(None)
+        return (sorted(_dn for _dn, _attributes in _content if not self._is_group(_attributes)), _state)
+
+    def _is_group(self, attributes):
+        """
+        :param dict attributes: attributes of the entry found, with 'objectClass'
+        :return bool:
+        """
+        return self._group_object_class.lower() in list(_x.lower() for _x in attributes.get("objectClass") or list())
+
+    def get_changed_users(self, state):
+        """
+        Find out users changed since the state given was got
+        :param str state: state kept from the previous run
+        :return tuple: (sorted list of user DNs, new state)
+        """
+        if not self.is_valid_state(state):
+            raise ValueError("Invalid change tracking state: '%s'" % state)
+
+        if self._mode == "timestamp":
+            _new_state = self._get_timestamp_state()
+            _changed = list(iter_search(
+                self._ldap_c,
+                "(&(|%s(objectClass=%s))(modifyTimestamp>=%s))" % (
+                    self._user_filter, self._group_object_class, state.split(":", 1)[1]),
+                attributes=["objectClass"], page_size=self._page_size))
+        else:
+            _changed, _new_state = self._sync(base64.b64decode(state.split(":", 1)[1]))
+
+        _users = set()
+        _groups = list()
+
+        for _dn, _attributes in _changed:
+            if self._is_group(_attributes):
+                _groups.append(_dn)
+            else:
+                _users.add(_dn)
+
+        logging.info("Changed since the previous run: %d users, %d groups" % (len(_users), len(_groups)))
+
+        # group conditions (like 'memberOf.businessCategory') may give another result for the members
+        for _group_dn in _groups:
+            for _dn, _attributes in iter_search(
+                    self._ldap_c, "(&%s(memberOf=%s))" % (self._user_filter, escape_filter_chars(_group_dn)),
+                    page_size=self._page_size):
+                _users.add(_dn)
+
+        return (sorted(_users), _new_state)
+
+    def _get_timestamp_state(self):
+        """
+        :return str: state for the current time
+        """
+        return "timestamp:%s" % datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%d%H%M%SZ")
+
+    def _sync(self, cookie):
+        """
+        Make refresh-only synchronization of users and groups
+        :param bytes cookie: cookie from the previous synchronization, 'None' for the whole content
+        :return tuple: (list of (DN, attributes) for added and modified entries, new state)
+        """
+        _filter = "(|%s(objectClass=%s))" % (self._user_filter, self._group_object_class)
+        self._ldap_c.ldap_c.search(
+                search_base=self._ldap_c.baseDn,
+                search_scope=ldap3.SUBTREE,
+                search_filter=_filter,
+                attributes=["objectClass"],
+                controls=[(SYNC_REQUEST_OID, True, encode_sync_request(cookie))])
+        _result = self._ldap_c.ldap_c.result
+
+        if _result.get("result") == _SYNC_REFRESH_REQUIRED and cookie is not None:
+            # everything is treated as changed
+            logging.warning("Synchronization cookie is expired, reloading")
+            return self._sync(None)
+
+        if _result.get("result") != 0:
+            raise LDAPOperationResult(result=_result.get("result"), description=_result.get("description"),
+                                      message=_result.get("message"))
+
+        _changed = list()
+
+        for _item in self._ldap_c.ldap_c.response or list():
+            if _item.get("type") != "searchResEntry":
+                continue
+
+            _control = (_item.get("controls") or dict()).get(SYNC_STATE_OID)
+
+            if _control and decode_sync_state(_control.get("value"))[0] not in [SYNC_STATE_ADD, SYNC_STATE_MODIFY]:
+                continue
+
+            _changed.append((_item.get("dn"), _item.get("attributes") or dict()))
+
+        _done = ((_result.get("controls") or dict()).get(SYNC_DONE_OID) or dict()).get("value")
+        _cookie = decode_sync_done(_done) if _done else None
+
+        if _cookie is None:
+            # nothing changed, the cookie is still valid
+            _cookie = cookie
+
+        if _cookie is None:
+            raise ValueError("No synchronization cookie returned by server")
+
+        return (_changed, "sync:%s" % base64.b64encode(_cookie).decode("ascii"))
@@ -1,5 +1,8 @@
 import ldap3
 import os
+import uuid
+from ...sync import SYNC_REQUEST_OID, SYNC_STATE_OID, SYNC_DONE_OID, SYNC_STATE_ADD, SYNC_STATE_MODIFY
+from ...sync import decode_sync_request, encode_sync_state, encode_sync_done
 
 class MockLdapConnection(ldap3.Connection):
     def __init__(self, **kwargs):
@@ -29,6 +32,10 @@ class MockLdapConnection(ldap3.Connection):
         # now set our connection with some test data
         self.__init_data()
 
+        # stand-in for LDAP Content Synchronization: change sequence numbers by DN, the cookie is the last one
+        self.__sequence = 0
+        self.__changes = dict()
+
     def __init_data(self):
         # add administrator account
         self.strategy.add_entry(self.user, 
@@ -51,3 +58,59 @@ class MockLdapConnection(ldap3.Connection):
     def start_tls(self):
         self.tls_started = True
         return
+
+    def __record_change(self, dn, added=False):
+        # (the last change, the addition) sequence numbers
+        self.__sequence += 1
+        _dn = dn.lower()
+        _added = self.__sequence if added else self.__changes.get(_dn, (0, 0))[1]
+        self.__changes[_dn] = (self.__sequence, _added)
+
+    def add(self, dn, *args, **kwargs):
+        _result = super().add(dn, *args, **kwargs)
+
+        if _result:
+            self.__record_change(dn, added=True)
+
+        return _result
+
+    def modify(self, dn, *args, **kwargs):
+        _result = super().modify(dn, *args, **kwargs)
+
+        if _result:
+            self.__record_change(dn)
+
+        return _result
+
+    def search(self, *args, **kwargs):
+        _controls = kwargs.pop("controls", None) or list()
+        _sync = list(_x for _x in _controls if _x[0] == SYNC_REQUEST_OID)
+
+        if not _sync:
+            return super().search(*args, controls=_controls or None, **kwargs)
+
+        # refresh-only: entries changed after the cookie sequence number, all entries without a cookie
+        _mode, _cookie = decode_sync_request(_sync[0][2])
+        _since = int(_cookie.decode()) if _cookie else None
+        _result = super().search(*args, **kwargs)
+        _response = list()
+
+        for _item in self.response or list():
+            if _item.get("type") != "searchResEntry":
+                continue
+
+            _sequence, _added = self.__changes.get(_item.get("dn").lower(), (0, 0))
+
+            if _since is not None and _sequence <= _since:
+                continue
+
+            _item["controls"] = {SYNC_STATE_OID: {"description": "", "criticality": False, "value": encode_sync_state(
+                SYNC_STATE_ADD if _since is None or _added > _since else SYNC_STATE_MODIFY,
+                uuid.uuid5(uuid.NAMESPACE_X500, _item.get("dn").lower()).bytes)}}
+            _response.append(_item)
+
+        self.response = _response
+        self._entries = []
+        self.result["controls"] = {SYNC_DONE_OID: {"description": "", "criticality": False, "value": encode_sync_done(
+            str(self.__sequence).encode())}}
+        return _result
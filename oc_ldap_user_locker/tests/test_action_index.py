@@ -0,0 +1,82 @@
+import unittest
+from .mocks.randomizer import Randomizer
+from ..action_index import ActionIndex, get_next_action_date
+import datetime
+import tempfile
+import os
+
+# remove unnecessary log output
+import logging
+logging.getLogger().propagate = False
+logging.getLogger().disabled = True
+
+class ActionIndexTest(unittest.TestCase):
+    def test_next_action_date(self):
+        # nothing is to happen on the runs before the date returned
+        rnd = Randomizer()
+
+        for _i in range(0, 100):
+            _now = datetime.datetime(2024, 3, 10, rnd.random_number(0, 23), rnd.random_number(0, 59))
+            _lock_date = _now + datetime.timedelta(days=rnd.random_number(0, 40), seconds=rnd.random_number(0, 86399))
+            _notification_days = list(rnd.random_number(0, 20) for _x in range(0, rnd.random_number(0, 3)))
+            _days_before_lock = (_lock_date - _now).days
+            _next = get_next_action_date(_lock_date, _days_before_lock, _notification_days)
+
+            if _days_before_lock <= 0:
+                self.assertIsNone(_next)
+                continue
+
+            self.assertGreaterEqual(_next, _now.date())
+
+            # runs once a day at random time
+            _run = _now + datetime.timedelta(days=1)
+
+            while _run < _lock_date:
+                _days = (_lock_date - _run).days
+
+                if _days <= 0 or _days in _notification_days:
+                    self.assertLessEqual(_next, _run.date())
+                    break
+
+                _run += datetime.timedelta(days=1, minutes=rnd.random_number(-60, 60))
+
+    def test_save_load(self):
+        _path = os.path.join(tempfile.mkdtemp(), "index.json")
+        _index = ActionIndex(_path)
+        _index.load()
+        self.assertEqual(0, len(_index))
+        _now = datetime.datetime(2024, 3, 10, 12, 0)
+        _index.change_state = "timestamp:20240310090000Z"
+        _index.last_full_scan = _now
+        _index.policy_digest = "digest"
+        _index.set("cn=a", datetime.date(2024, 3, 12))
+        _index.set("cn=b", datetime.date(2024, 3, 11))
+        _index.set("cn=c", datetime.date(2024, 3, 11))
+        _index.set("cn=d", datetime.date(2024, 4, 1))
+        _index.set("cn=d", None)
+        _index.save()
+
+        _index = ActionIndex(_path)
+        _index.load()
+        self.assertEqual(3, len(_index))
+        self.assertEqual("timestamp:20240310090000Z", _index.change_state)
+        self.assertEqual(_now, _index.last_full_scan)
+        self.assertEqual(datetime.date(2024, 3, 12), _index.get("cn=a"))
+        self.assertIsNone(_index.get("cn=d"))
+
+        self.assertEqual([], _index.pop_due(datetime.date(2024, 3, 10)))
+        self.assertEqual(["cn=b", "cn=c", "cn=a"], _index.pop_due(datetime.date(2024, 3, 12)))
+        self.assertEqual(0, len(_index))
+        os.remove(_path)
+        os.rmdir(os.path.dirname(_path))
+
+    def test_full_scan_due(self):
+        _now = datetime.datetime(2024, 3, 10, 12, 0)
+        _index = ActionIndex("index.json")
+        self.assertTrue(_index.is_full_scan_due(_now, 7, "digest"))
+        _index.change_state = "timestamp:20240310090000Z"
+        _index.last_full_scan = _now - datetime.timedelta(days=3)
+        _index.policy_digest = "digest"
+        self.assertFalse(_index.is_full_scan_due(_now, 7, "digest"))
+        self.assertTrue(_index.is_full_scan_due(_now, 7, "another"))
+        self.assertTrue(_index.is_full_scan_due(_now, 3, "digest"))
@@ -0,0 +1,66 @@
+import unittest
+from ..checkpoint import RunCheckpoint, ACTION_DONE, ACTION_NOTIFIED, ACTION_LOCKED
+import datetime
+import tempfile
+import os
+
+# remove unnecessary log output
+import logging
+logging.getLogger().propagate = False
+logging.getLogger().disabled = True
+
+class RunCheckpointTest(unittest.TestCase):
+    def setUp(self):
+        _fd, self._path = tempfile.mkstemp(suffix=".checkpoint")
+        os.close(_fd)
+        os.remove(self._path)
+        self._date = datetime.date(2024, 3, 10)
+
+    def tearDown(self):
+        if os.path.exists(self._path):
+            os.remove(self._path)
+
+    def test_resume(self):
+        _checkpoint = RunCheckpoint(self._path)
+        self.assertFalse(_checkpoint.resume(self._date, "digest"))
+
+        _checkpoint.start(self._date, "digest")
+        _checkpoint.add("cn=first,dc=local", ACTION_NOTIFIED)
+        _checkpoint.add("cn=first,dc=local")
+        _checkpoint.add("cn=second,dc=local", ACTION_LOCKED)
+        self.assertIn("cn=second,dc=local", _checkpoint)
+
+        # the process is killed while writing a line
+        with open(self._path, mode='at') as _fl_out:
+            _fl_out.write("done\tcn=thi")
+
+        _checkpoint = RunCheckpoint(self._path)
+        self.assertTrue(_checkpoint.resume(self._date, "digest"))
+        self.assertEqual(2, len(_checkpoint))
+        self.assertIn("cn=first,dc=local", _checkpoint)
+        self.assertNotIn("cn=thi", _checkpoint)
+        self.assertEqual({ACTION_DONE: 1, ACTION_NOTIFIED: 1, ACTION_LOCKED: 1}, _checkpoint.actions)
+        _checkpoint.close()
+
+        # decisions of another day or policy differ
+        self.assertFalse(RunCheckpoint(self._path).resume(self._date + datetime.timedelta(days=1), "digest"))
+        self.assertFalse(RunCheckpoint(self._path).resume(self._date, "another"))
+
+        _checkpoint.remove()
+        self.assertFalse(os.path.exists(self._path))
+
+    def test_start(self):
+        # the previous checkpoint is dropped
+        _checkpoint = RunCheckpoint(self._path)
+        _checkpoint.start(self._date, "digest")
+        _checkpoint.add("cn=first,dc=local")
+        _checkpoint.close()
+
+        _checkpoint = RunCheckpoint(self._path)
+        _checkpoint.start(self._date, "digest")
+        _checkpoint.close()
+
+        _checkpoint = RunCheckpoint(self._path)
+        self.assertTrue(_checkpoint.resume(self._date, "digest"))
+        self.assertEqual(0, len(_checkpoint))
+        _checkpoint.close()
@@ -0,0 +1,82 @@
+import unittest
+import unittest.mock
+from ..concurrency import AdaptiveLimit, is_overload_ldap_error
+from ldap3.core.exceptions import LDAPOperationResult
+import threading
+
+# remove unnecessary log output
+import logging
+logging.getLogger().propagate = False
+logging.getLogger().disabled = True
+
+class AdaptiveLimitTest(unittest.TestCase):
+    def test_is_overload(self):
+        self.assertTrue(is_overload_ldap_error(LDAPOperationResult(result=51)))
+        self.assertTrue(is_overload_ldap_error(LDAPOperationResult(result=53)))
+        self.assertFalse(is_overload_ldap_error(LDAPOperationResult(result=32)))
+        self.assertFalse(is_overload_ldap_error(ValueError()))
+
+    def test_bounds(self):
+        for _min, _max in [(0, 4), (3, 2), (None, None)]:
+            with self.assertRaises(ValueError):
+                AdaptiveLimit(min_limit=_min, max_limit=_max)
+
+        with self.assertRaises(ValueError):
+            AdaptiveLimit(backoff=1)
+
+    def test_increase(self):
+        # one more request in flight per window of requests completed in time
+        _limit = AdaptiveLimit(min_limit=1, max_limit=4, target_latency=1)
+
+        for _expected in [2, 3, 4, 4]:
+            for _ in range(0, _limit.limit):
+                _limit.release(_limit.acquire(), 0.1)
+
+            self.assertEqual(_expected, _limit.limit)
+
+        for _ in range(0, 100):
+            _limit.release(_limit.acquire(), 0.1)
+
+        self.assertEqual(4, _limit.limit)
+        self.assertEqual(0, _limit.in_flight)
+
+    def test_decrease(self):
+        _limit = AdaptiveLimit(min_limit=1, max_limit=8, target_latency=1)
+        _limit._limit = 8.0
+        _sequences = list(_limit.acquire() for _ in range(0, 8))
+        self.assertEqual(8, _limit.in_flight)
+
+        # a burst of slow responses started before the decrease counts once
+        for _sequence in _sequences:
+            _limit.release(_sequence, 2)
+
+        self.assertEqual(4, _limit.limit)
+
+        # the server refused: decreased again, not below the minimum
+        for _ in range(0, 5):
+            _limit.release(_limit.acquire(), 0.1, overloaded=True)
+
+        self.assertEqual(1, _limit.limit)
+
+    def test_call(self):
+        _limit = AdaptiveLimit(min_limit=1, max_limit=2, target_latency=1)
+        _limit._limit = 2.0
+        self.assertEqual("result", _limit.call(lambda: "result", is_overload_ldap_error))
+
+        with self.assertRaises(LDAPOperationResult):
+            _limit.call(unittest.mock.MagicMock(side_effect=LDAPOperationResult(result=51)), is_overload_ldap_error)
+
+        self.assertEqual(1, _limit.limit)
+        self.assertEqual(0, _limit.in_flight)
+
+    def test_acquire__wait(self):
+        # requests over the limit wait for the ones in flight
+        _limit = AdaptiveLimit(min_limit=1, max_limit=1)
+        _sequence = _limit.acquire()
+        _acquired = threading.Event()
+        _thread = threading.Thread(target=lambda: (_limit.acquire(), _acquired.set()))
+        _thread.start()
+        self.assertFalse(_acquired.wait(0.1))
+        _limit.release(_sequence, 0)
+        self.assertTrue(_acquired.wait(5))
+        _thread.join()
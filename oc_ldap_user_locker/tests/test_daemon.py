@@ -0,0 +1,42 @@
+import unittest
+import unittest.mock
+from ..daemon import LockerDaemon
+
+# remove unnecessary log output
+import logging
+logging.getLogger().propagate = False
+logging.getLogger().disabled = True
+
+class LockerDaemonTest(unittest.TestCase):
+    def test_interval(self):
+        for _interval in [None, 0, -1]:
+            with self.assertRaises(ValueError):
+                LockerDaemon(unittest.mock.MagicMock(), _interval)
+
+    def test_run_once__error(self):
+        # the run fails: the error is not raised, connection is dropped to reconnect next time
+        _locker = unittest.mock.MagicMock()
+        _locker.run.side_effect = RuntimeError("connection lost")
+        _daemon = LockerDaemon(_locker, 10)
+        _daemon.run_once()
+        _locker.reload_config.assert_called_once()
+        self.assertIsNone(_locker._ldap_c)
+
+    def test_run__stop(self):
+        # runs are repeated until stopped, the locker is the same one
+        _locker = unittest.mock.MagicMock()
+        _daemon = LockerDaemon(_locker, 0.01)
+
+        def _run():
+            if _locker.run.call_count >= 3:
+                _daemon.stop()
+
+        _locker.run.side_effect = _run
+
+        with unittest.mock.patch('oc_ldap_user_locker.daemon.signal.signal') as _signal:
+            _daemon.run()
+
+        self.assertEqual(3, _locker.run.call_count)
+        self.assertEqual(3, _locker.reload_config.call_count)
+        _locker.stop.assert_called_once()
+        self.assertEqual(2, _signal.call_count)
@@ -0,0 +1,88 @@
+import unittest
+import unittest.mock
+from .mocks.ldap3 import MockLdapConnection
+from .mocks.randomizer import Randomizer
+import os
+from oc_ldap_client.oc_ldap_objects import OcLdapUserCat, OcLdapGroupRecord, OcLdapUserRecord
+from ..directory import iter_search, read_record, get_record
+
+# remove unnecessary log output
+import logging
+logging.getLogger().propagate = False
+logging.getLogger().disabled = True
+
+class DirectoryTest(unittest.TestCase):
+    def _get_ldap_user_cat(self):
+        # return patched OcLdapUserCat
+        self_dir = os.path.dirname(os.path.abspath(__file__))
+        key_path = os.path.join(self_dir, 'ssl_keys')
+
+        with unittest.mock.patch('ldap3.Connection', new=MockLdapConnection):
+            ldap_t = OcLdapUserCat(url='ldap://localhost:389',
+                user_cert=os.path.join(key_path, 'user.pem'),
+                user_key=os.path.join(key_path, 'user.priv.key'),
+                ca_chain=os.path.join(key_path, 'ca_chain.pem'),
+                baseDn='dc=some,dc=test,dc=domain,dc=local')
+
+        return ldap_t
+
+    def test_iter_search__paged(self):
+        rnd = Randomizer()
+        _ldap_c = self._get_ldap_user_cat()
+        _expected = dict()
+
+        for _idx in range(0, 11):
+            _group = OcLdapGroupRecord()
+            _group.set_attribute('cn', rnd.random_letters(rnd.random_number(7, 17)))
+            _group.set_attribute('businessCategory', rnd.random_letters(5))
+            _group = _ldap_c.put_record(_group)
+            _expected[_group.dn] = [_group.get_attribute('businessCategory')]
+
+        _result = dict()
+
+        for _dn, _attributes in iter_search(_ldap_c, "(businessCategory=*)", attributes=["businessCategory"],
+                                            page_size=3):
+            # another operation between pages should not break the search
+            _ldap_c.get_record(_dn)
+            _result[_dn] = _attributes
+
+        self.assertEqual(_expected, dict((_k, _v["businessCategory"]) for _k, _v in _result.items()))
+        self.assertEqual({("businessCategory",)}, set(tuple(_v.keys()) for _v in _result.values()))
+
+    def test_iter_search__dn_only(self):
+        rnd = Randomizer()
+        _ldap_c = self._get_ldap_user_cat()
+
+        for _idx in range(0, 5):
+            _usr = OcLdapUserRecord()
+            _usr.set_attribute('cn', rnd.random_letters(rnd.random_number(7, 17)))
+            _ldap_c.put_record(_usr)
+
+        _result = list(iter_search(_ldap_c, "(objectClass=inetOrgPerson)", page_size=2))
+        self.assertEqual(sorted(_ldap_c.list_users()), sorted(_x[0] for _x in _result))
+        self.assertEqual([dict()] * 5, list(_x[1] for _x in _result))
+
+    def test_get_record__projection(self):
+        rnd = Randomizer()
+        _ldap_c = self._get_ldap_user_cat()
+        _usr = OcLdapUserRecord()
+        _usr.set_attribute('cn', rnd.random_letters(rnd.random_number(7, 17)))
+        _usr.set_attribute('mail', "test@example.local")
+        _usr.set_attribute('description', rnd.random_letters(300))
+        _usr = _ldap_c.put_record(_usr)
+
+        _dn, _attributes = read_record(_ldap_c, _usr.dn, ["cn", "mail"])
+        self.assertEqual(_usr.dn, _dn)
+        self.assertEqual({"cn", "mail"}, set(_attributes.keys()))
+
+        _result = get_record(_ldap_c, _usr.dn, OcLdapUserRecord, ["cn", "objectClass"])
+        self.assertIsInstance(_result, OcLdapUserRecord)
+        self.assertEqual(_usr.get_attribute("cn"), _result.get_attribute("cn"))
+        self.assertIsNone(_result.get_attribute("description"))
+
+        _absent = "cn=absent,dc=some,dc=test,dc=domain,dc=local"
+        self.assertIsNone(read_record(_ldap_c, _absent, ["cn"]))
+        self.assertIsNone(get_record(_ldap_c, _absent, OcLdapUserRecord, ["cn"]).dn)
+
+        with self.assertRaises(ValueError):
+            read_record(_ldap_c, None, ["cn"])
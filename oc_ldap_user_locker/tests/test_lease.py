@@ -0,0 +1,111 @@
+import unittest
+import unittest.mock
+from .mocks.ldap3 import MockLdapConnection
+from ..lease import FileLease, LdapLease
+from oc_ldap_client.oc_ldap_objects import OcLdapUserCat
+import datetime
+import json
+import os
+import tempfile
+
+# remove unnecessary log output
+import logging
+logging.getLogger().propagate = False
+logging.getLogger().disabled = True
+
+class FileLeaseTest(unittest.TestCase):
+    def setUp(self):
+        _fd, self._path = tempfile.mkstemp(suffix=".lease")
+        os.close(_fd)
+
+    def tearDown(self):
+        os.remove(self._path)
+
+    def test_acquire(self):
+        _lease = FileLease(self._path)
+        _another = FileLease(self._path)
+        self.assertTrue(_lease.acquire())
+
+        # the holder is kept for logs
+        with open(self._path, mode='rt') as _fl_in:
+            self.assertEqual(_lease.holder, json.load(_fl_in).get("holder"))
+
+        self.assertFalse(_another.acquire())
+
+        with unittest.mock.patch("time.sleep") as _sleep:
+            _sleep.side_effect = lambda _x: _lease.release()
+            self.assertTrue(_another.acquire(wait=60, poll_interval=1))
+
+        _sleep.assert_called_once_with(1)
+        self.assertFalse(_another.lost)
+        _another.release()
+        self.assertTrue(_lease.acquire())
+        _lease.release()
+
+
+class LdapLeaseTest(unittest.TestCase):
+    def setUp(self):
+        self_dir = os.path.dirname(os.path.abspath(__file__))
+        key_path = os.path.join(self_dir, 'ssl_keys')
+
+        with unittest.mock.patch('ldap3.Connection', new=MockLdapConnection):
+            self._ldap_c = OcLdapUserCat(url='ldap://localhost:389',
+                user_cert=os.path.join(key_path, 'user.pem'),
+                user_key=os.path.join(key_path, 'user.priv.key'),
+                ca_chain=os.path.join(key_path, 'ca_chain.pem'),
+                baseDn='dc=some,dc=test,dc=domain,dc=local')
+
+        # every lease has its own connection to the same mocked directory
+        self._ldap_c.ldap_c.unbind = unittest.mock.MagicMock()
+        self._dn = "cn=user-locker,dc=some,dc=test,dc=domain,dc=local"
+
+    def _get_lease(self, ttl=600):
+        _lease = LdapLease(lambda: self._ldap_c, self._dn, ttl=ttl)
+        # renewal is tested explicitly
+        _lease._renew_loop = lambda: None
+        return _lease
+
+    def test_acquire(self):
+        _lease = self._get_lease()
+        _another = self._get_lease()
+        _another.holder = "another:1"
+        self.assertTrue(_lease.acquire())
+        self.assertFalse(_another.acquire())
+
+        # renewed by the holder only
+        self.assertTrue(_lease.renew())
+        self.assertFalse(_lease.lost)
+
+        # released lease is taken at once
+        _lease.release()
+        self.assertTrue(_another.acquire())
+        self.assertFalse(_lease.acquire())
+        _another.release()
+
+        with self.assertRaises(ValueError):
+            LdapLease(lambda: self._ldap_c, self._dn, ttl=0)
+
+    def test_acquire__expired(self):
+        # the holder died: the lease is taken when expired
+        _lease = self._get_lease()
+        self.assertTrue(_lease.acquire())
+        _another = self._get_lease()
+        _another.holder = "another:1"
+        _now = datetime.datetime.now(datetime.timezone.utc)
+
+        with unittest.mock.patch.object(LdapLease, "_now", return_value=_now + datetime.timedelta(seconds=601)):
+            self.assertTrue(_another.acquire())
+
+        # the previous holder can not renew the lease taken
+        self.assertFalse(_lease.renew())
+
+    def test_renew_loop(self):
+        _lease = self._get_lease()
+        self.assertTrue(_lease.acquire())
+        _lease._stop_event.wait = unittest.mock.MagicMock(side_effect=[False, False])
+
+        # taken by another instance
+        _lease._value = "changed"
+        LdapLease._renew_loop(_lease)
+        self.assertTrue(_lease.lost)
+        _lease.release()
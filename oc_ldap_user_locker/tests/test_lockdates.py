@@ -0,0 +1,78 @@
+import unittest
+from .mocks.randomizer import Randomizer
+from oc_ldap_client.oc_ldap_objects import OcLdapUserRecord
+from ..lockdates import get_lock_dates
+import datetime
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# remove unnecessary log output
+import logging
+logging.getLogger().propagate = False
+logging.getLogger().disabled = True
+
+@unittest.skipIf(numpy is None, "'numpy' is not installed")
+class LockDatesTest(unittest.TestCase):
+    def _get_expected(self, user_rec, days_valid, time_attributes, now):
+        # one-by-one calculation
+        _values = list(user_rec.get_attribute(_x) for _x in time_attributes)
+        _values = list(_x.replace(tzinfo=None) for _x in _values if _x)
+
+        if not _values:
+            return (None, None)
+
+        _lock_date = max(_values) + datetime.timedelta(days=days_valid)
+        return (_lock_date, (_lock_date - now).days)
+
+    def test_empty(self):
+        self.assertEqual([], get_lock_dates([], 10, ["authTimestamp"]))
+        self.assertEqual([(None, None)] * 2, get_lock_dates([OcLdapUserRecord(), OcLdapUserRecord()], 10, []))
+
+    def test_random(self):
+        rnd = Randomizer()
+        _now = datetime.datetime.now()
+        _time_attributes = ["authTimestamp", "modifyTimestamp", "createTimestamp"]
+        _timezone = datetime.timezone(datetime.timedelta(hours=3))
+        # at least one user without time attributes
+        _users = [OcLdapUserRecord()]
+
+        for _i in range(0, 200):
+            _user_rec = OcLdapUserRecord()
+
+            for _time_attrib in _time_attributes:
+                if not rnd.random_number(0, 3):
+                    continue
+
+                _value = _now - datetime.timedelta(
+                        days=rnd.random_number(0, 60), seconds=rnd.random_number(0, 86399),
+                        microseconds=rnd.random_number(0, 999999))
+
+                if rnd.random_number(0, 1):
+                    _value = _value.replace(tzinfo=_timezone)
+
+                _user_rec.set_attribute(_time_attrib, _value)
+
+            _users.append(_user_rec)
+
+        for _days_valid in [0, 1, 30, 90]:
+            _expected = list(self._get_expected(_x, _days_valid, _time_attributes, _now) for _x in _users)
+            _result = get_lock_dates(_users, _days_valid, _time_attributes, now=_now)
+            self.assertEqual(_expected, _result)
+            self.assertEqual({type(None), datetime.datetime}, set(type(_x[0]) for _x in _result))
+            self.assertEqual({type(None), int}, set(type(_x[1]) for _x in _result))
+
+    def test_day_boundary(self):
+        # days are floored as 'timedelta.days' does
+        _now = datetime.datetime(2024, 3, 10, 12, 0, 0)
+        _users = list()
+
+        for _delta in [datetime.timedelta(hours=1), datetime.timedelta(hours=-1), datetime.timedelta(days=-1),
+                       datetime.timedelta(days=-1, microseconds=1), datetime.timedelta(0)]:
+            _user_rec = OcLdapUserRecord()
+            _user_rec.set_attribute("authTimestamp", _now + _delta)
+            _users.append(_user_rec)
+
+        self.assertEqual([0, -1, -1, -1, 0], list(_x[1] for _x in get_lock_dates(_users, 0, ["authTimestamp"], _now)))
@@ -7,9 +7,16 @@ import ldap3
 from oc_ldap_client.oc_ldap_objects import OcLdapUserCat, OcLdapGroupRecord
 from oc_ldap_client.oc_ldap_objects import OcLdapUserRecord
 from ..locker import OcLdapUserLocker
+from ..profiler import RuleProfiler
+from ..lockdates import get_lock_dates
+from ..action_index import ActionIndex
+from ..directory import read_record
+from ..lease import FileLease
 import tempfile
 import json
 import datetime
+import time
+import smtplib
 
 # remove unnecessary log output
 import logging
@@ -161,6 +168,869 @@ class OcLdapUserLockerTest(unittest.TestCase):
         _usr_modified = _locker._ldap_c.get_record(usr.dn, OcLdapUserRecord)
         self.assertIsNone(_usr_modified.is_locked)
 
+    def test_process_user_record__notification_deferred(self):
+        # the relay is unavailable: the notification is left for the next run, the user is not locked
+        rnd = Randomizer()
+        _locker = self._get_locker()
+        _locker.config["resilience"] = {"retries": 1, "retry_delay": 0, "smtp_failures": 2}
+        _locker._mailer.send_notification.side_effect = smtplib.SMTPServerDisconnected()
+
+        usr = OcLdapUserRecord()
+        usr.set_attribute('cn', rnd.random_letters(rnd.random_number(10, 17)))
+        usr.set_attribute('mail', "test@example.local")
+        usr = _locker._ldap_c.put_record(usr)
+
+        _conf = {'days_valid': 30, 'time_attributes': ['modifyTimeStamp'],
+                 'lock_notifications': [{'days_before': _x, 'template': 'notify.html'} for _x in [2, 3]]}
+        _locker._find_valid_conf = unittest.mock.MagicMock(return_value=_conf)
+        _locker._get_account_lock_date = unittest.mock.MagicMock(
+                return_value=datetime.datetime.now() + datetime.timedelta(days=3))
+
+        for _ in range(0, 3):
+            _locker._process_user_record(_locker._ldap_c.get_record(usr.dn, OcLdapUserRecord))
+
+        # two attempts per notification until the breaker opens
+        self.assertEqual(4, _locker._mailer.send_notification.call_count)
+        self.assertEqual(3, _locker._summary["deferred"])
+        self.assertEqual(0, _locker._summary["notifications"])
+        self.assertTrue(_locker._get_smtp_breaker().is_open)
+        self.assertIsNone(_locker._ldap_c.get_record(usr.dn, OcLdapUserRecord).is_locked)
+
+    def test_process_user_record__lock_held(self):
+        # the lock waits for the lock day notification deferred, so it is not lost
+        rnd = Randomizer()
+        _locker = self._get_locker()
+        _locker.config["resilience"] = {"retries": 0, "retry_delay": 0}
+        _locker._mailer.send_notification.side_effect = smtplib.SMTPServerDisconnected()
+
+        usr = OcLdapUserRecord()
+        usr.set_attribute('cn', rnd.random_letters(rnd.random_number(10, 17)))
+        usr.set_attribute('mail', "test@example.local")
+        usr = _locker._ldap_c.put_record(usr)
+
+        _conf = {'days_valid': 30, 'time_attributes': ['modifyTimeStamp'],
+                 'lock_notifications': [{'days_before': 0, 'template': 'notify.html'}]}
+        _locker._find_valid_conf = unittest.mock.MagicMock(return_value=_conf)
+        _locker._get_account_lock_date = unittest.mock.MagicMock(
+                return_value=datetime.datetime.now() - datetime.timedelta(days=1))
+
+        _locker._process_user_record(_locker._ldap_c.get_record(usr.dn, OcLdapUserRecord))
+        self.assertEqual(1, _locker._summary["deferred"])
+        self.assertIsNone(_locker._ldap_c.get_record(usr.dn, OcLdapUserRecord).is_locked)
+
+        # the relay is back: notified and locked
+        _locker._mailer.send_notification.side_effect = None
+        _locker._process_user_record(_locker._ldap_c.get_record(usr.dn, OcLdapUserRecord))
+        self.assertEqual(1, _locker._summary["notifications"])
+        self.assertIsNotNone(_locker._ldap_c.get_record(usr.dn, OcLdapUserRecord).is_locked)
+
+    ## process_users_batch
+    def test_process_users_batch(self):
+        # results are to be the same as for one-by-one processing
+        rnd = Randomizer()
+        _locker = self._get_locker()
+        _now_t = datetime.datetime.now()
+        _locker.config = {
+            "users": [
+                {"days_valid": 10, "time_attributes": ["authTimestamp", "modifyTimestamp"]},
+                {"days_valid": 20, "time_attributes": ["authTimestamp"], "condition_attributes": {
+                    "mail": {"comparison": {"type": "regexp"}, "values": [".*@example\\.local"]}}},
+                {"days_valid": 30, "time_attributes": ["authTimestamp"], "condition_attributes": {
+                    "mail": {"values": ["nobody@another.local"]}}}]}
+
+        _users = list()
+
+        for _idx in range(0, 30):
+            usr = OcLdapUserRecord()
+            usr.set_attribute('cn', rnd.random_letters(rnd.random_number(10, 17)))
+            usr.set_attribute('mail', rnd.random_letters(7) + rnd.random_number(0, 1) * "@example.local")
+
+            if _idx % 2:
+                usr.set_attribute('authTimestamp', _now_t - datetime.timedelta(days=rnd.random_number(0, 40)))
+
+            _users.append(usr)
+
+        _locker._get_user_record = unittest.mock.MagicMock(side_effect=lambda _dn: _users[_dn])
+        _locker._get_user_view = unittest.mock.MagicMock(
+                side_effect=lambda _dn, _schema: _schema.make_view_from_record(_users[_dn]))
+        _locker._apply_lock_date = unittest.mock.MagicMock()
+
+        for _idx in range(0, len(_users)):
+            _locker._process_single_user(_idx)
+
+        _expected = sorted((_x[0][0].get_attribute('cn'), _x[0][2], _x[0][3])
+                           for _x in _locker._apply_lock_date.call_args_list)
+        self.assertEqual(15, len(_expected))
+
+        for _numpy_error in [False, True]:
+            _locker._apply_lock_date.reset_mock()
+
+            with unittest.mock.patch('oc_ldap_user_locker.locker.get_lock_dates',
+                                     side_effect=ImportError if _numpy_error else get_lock_dates) as _get_lock_dates:
+                _locker._process_users_batch(list(range(0, len(_users))))
+
+            self.assertEqual(_expected, sorted((_x[0][0].get_attribute('cn'), _x[0][2], _x[0][3])
+                                               for _x in _locker._apply_lock_date.call_args_list))
+
+            if _numpy_error:
+                # not tried again for the following groups
+                self.assertEqual(1, _get_lock_dates.call_count)
+                self.assertTrue(_locker._numpy_missing)
+
+    def test_run__batch(self):
+        # users are to be processed in batches if configured
+        rnd = Randomizer()
+        _locker = self._get_locker()
+        _locker.config["evaluation"] = {"batch_size": 7}
+        _locker._process_users_batch = unittest.mock.MagicMock()
+        _locker._process_single_user = unittest.mock.MagicMock()
+
+        for idx in range(0, 17):
+            usr = OcLdapUserRecord()
+            usr.set_attribute('cn', rnd.random_letters(idx + 10))
+            _locker._ldap_c.put_record(usr)
+
+        with unittest.mock.patch('oc_ldap_user_locker.locker.OcLdapUserCat', new=lambda **_x: _locker._ldap_c):
+            _locker.run()
+
+        _locker._process_single_user.assert_not_called()
+        self.assertEqual([7, 7, 3], list(len(_x[0][0]) for _x in _locker._process_users_batch.call_args_list))
+
+    def test_run__concurrency(self):
+        # user records of a batch are read by reader threads with pooled connections, kept between runs
+        rnd = Randomizer()
+        _locker = self._get_locker()
+        _locker.config["evaluation"] = {"batch_size": 7}
+        _locker.config["concurrency"] = {"max_requests": 4}
+        _locker.config["users"] = [{"days_valid": 10, "time_attributes": ["modifyTimestamp"]}]
+        _users = list()
+
+        for idx in range(0, 17):
+            usr = OcLdapUserRecord()
+            usr.set_attribute('cn', rnd.random_letters(idx + 10))
+            _users.append(_locker._ldap_c.put_record(usr).dn)
+
+        _read = list()
+        _read_record = read_record
+        _locker._apply_lock_dates = unittest.mock.MagicMock()
+        _connections = list()
+
+        def _clone(ldap_c):
+            self.assertIs(_locker._ldap_c, ldap_c)
+            _connections.append(self._get_ldap_user_cat())
+            # the same mocked directory is to be seen by every connection
+            _connections[-1].ldap_c = _locker._ldap_c.ldap_c
+            return _connections[-1]
+
+        with unittest.mock.patch('oc_ldap_user_locker.locker.clone_connection', new=_clone), \
+                unittest.mock.patch('oc_ldap_user_locker.locker.read_record', side_effect=lambda _ldap_c, *args: (
+                    _read.append(any(_ldap_c is _x for _x in _connections)), _read_record(_ldap_c, *args))[1]):
+            _locker.run()
+            self.assertEqual(len(_users), len(_read))
+            self.assertTrue(all(_read))
+            self.assertTrue(1 <= len(_connections) <= 4)
+            self.assertIsNone(_locker._readers)
+            self.assertEqual(sorted(_users), sorted(
+                _x[0].dn for _call in _locker._apply_lock_dates.call_args_list
+                for _users_by_conf in _call[0][0].values() for _x in _users_by_conf))
+
+            _locker.run()
+            self.assertEqual(len(_users) * 2, len(_read))
+            self.assertTrue(all(_read))
+            self.assertTrue(1 <= len(_connections) <= 4)
+            self.assertEqual(len(_connections), _locker._ldap_pool.stats["created"])
+
+    def test_run__paged(self):
+        # processing starts after the first page, locked users are skipped
+        rnd = Randomizer()
+        _locker = self._get_locker()
+        _locker.config["evaluation"] = {"page_size": 4}
+        _expected = list()
+
+        for idx in range(0, 11):
+            usr = OcLdapUserRecord()
+            usr.set_attribute('cn', rnd.random_letters(idx + 10))
+
+            if idx == 5:
+                usr.set_attribute('pwdAccountLockedTime', '000001010000Z')
+                _locker._ldap_c.put_record(usr)
+                continue
+
+            _expected.append(_locker._ldap_c.put_record(usr).dn)
+
+        _searches = list()
+        _search = _locker._ldap_c.ldap_c.search
+
+        def _count_search(*args, **kwargs):
+            # the connection check before the run is not paged
+            if kwargs.get("paged_size"):
+                _searches.append(kwargs.get("paged_size"))
+
+            return _search(*args, **kwargs)
+
+        _locker._ldap_c.ldap_c.search = _count_search
+
+        # number of searches made before each user is processed
+        _processed = list()
+        _locker._process_single_user = unittest.mock.MagicMock(side_effect=lambda _dn: _processed.append(len(_searches)))
+
+        with unittest.mock.patch('oc_ldap_user_locker.locker.OcLdapUserCat', new=lambda **_x: _locker._ldap_c):
+            _locker.run()
+
+        self.assertEqual(sorted(_expected), sorted(_x[0][0] for _x in _locker._process_single_user.call_args_list))
+        self.assertEqual([1] * 4 + [2] * 4 + [3] * 2, _processed)
+        self.assertEqual([4] * 3, _searches)
+
+    def test_run__stop(self):
+        # users are not processed after stop is requested, the connection is kept between runs
+        rnd = Randomizer()
+        _locker = self._get_locker()
+        _ldap_c = _locker._ldap_c
+
+        for idx in range(0, 5):
+            usr = OcLdapUserRecord()
+            usr.set_attribute('cn', rnd.random_letters(idx + 10))
+            _locker._ldap_c.put_record(usr)
+
+        _locker._process_single_user = unittest.mock.MagicMock(
+                side_effect=lambda _dn: _locker.stop() if _locker._process_single_user.call_count == 2 else None)
+
+        with unittest.mock.patch('oc_ldap_user_locker.locker.OcLdapUserCat') as _cat:
+            _locker.run()
+
+        _cat.assert_not_called()
+        self.assertIs(_ldap_c, _locker._ldap_c)
+        self.assertEqual(2, _locker._process_single_user.call_count)
+
+    def test_reload_config(self):
+        _locker = self._get_locker()
+        _ldap_c = _locker._ldap_c
+        _locker._config_path = self._close_tempfile(tempfile.mkstemp(suffix=".json"), delete=False)
+
+        def _write_config(config):
+            with open(_locker._config_path, mode='wt') as _fl_out:
+                json.dump(config, _fl_out)
+
+            # modification time resolution may be coarse
+            _locker._config_mtime = None
+
+        try:
+            _write_config(dict(_locker.config, users=[{"days_valid": 10, "time_attributes": ["authTimestamp"]}]))
+            self.assertTrue(_locker.reload_config())
+            self.assertFalse(_locker.reload_config())
+            self.assertIs(_ldap_c, _locker._ldap_c)
+            self.assertEqual(10, _locker.config["users"][0]["days_valid"])
+            _policy = _locker._get_policy()
+
+            # the same configuration: compiled policy is kept
+            _write_config(_locker.config)
+            self.assertTrue(_locker.reload_config())
+            self.assertIs(_policy, _locker._get_policy())
+            self.assertIs(_ldap_c, _locker._ldap_c)
+
+            # invalid configuration is not applied
+            _config = _locker.config
+            _write_config(dict(_locker.config, LDAP=dict(_locker.config["LDAP"], url=None),
+                               users=[{"days_valid": 20, "time_attributes": ["authTimestamp"]}]))
+
+            with unittest.mock.patch.dict(os.environ, {"LDAP_URL": ""}):
+                with self.assertRaises(ValueError):
+                    _locker.reload_config()
+
+            self.assertIs(_config, _locker.config)
+            self.assertIs(_ldap_c, _locker._ldap_c)
+
+            # LDAP changed: the connection is closed, reconnect
+            _ldap_c.ldap_c.unbind = unittest.mock.MagicMock()
+            _write_config(dict(_locker.config, LDAP=dict(_locker.config["LDAP"], baseDn="dc=another")))
+            self.assertTrue(_locker.reload_config())
+            self.assertIsNone(_locker._ldap_c)
+            _ldap_c.ldap_c.unbind.assert_called_once_with()
+            self.assertIs(_policy, _locker._get_policy())
+        finally:
+            self._close_tempfile(_locker._config_path, delete=True)
+
+    def test_run__action_index(self):
+        # full scan builds the index, then only due and modified users are processed
+        rnd = Randomizer()
+        _locker = self._get_locker()
+        _index_path = self._close_tempfile(tempfile.mkstemp(suffix=".json"), delete=True)
+        _locker.config["evaluation"] = {"action_index": _index_path, "full_scan_days": 7}
+        _locker.config["users"] = [{"days_valid": 30, "time_attributes": ["authTimestamp"], "lock_notifications": [
+            {"days_before": 5, "template": {"file": "template"}},
+            {"days_before": 1, "template": {"file": "template"}}]}]
+        _now_t = datetime.datetime.now()
+        _users = dict()
+        _lock_dates = dict()
+
+        for _name, _days in [("fresh", 2), ("expired", 40), ("another", 10)]:
+            usr = OcLdapUserRecord()
+            usr.set_attribute('cn', _name + rnd.random_letters(10))
+            _users[_name] = _locker._ldap_c.put_record(usr).dn
+            _lock_dates[_users[_name]] = _now_t + datetime.timedelta(days=30 - _days)
+
+        # mocked LDAP does not keep time values
+        _locker._get_account_lock_date = unittest.mock.MagicMock(side_effect=lambda _rec, *args: _lock_dates[_rec.dn])
+
+        _process_single_user = _locker._process_single_user
+        _locker._process_single_user = unittest.mock.MagicMock(side_effect=_process_single_user)
+
+        def _processed():
+            _result = sorted(_x[0][0] for _x in _locker._process_single_user.call_args_list)
+            _locker._process_single_user.reset_mock()
+            return _result
+
+        try:
+            _locker.run()
+            self.assertEqual(sorted(_users.values()), _processed())
+            self.assertIsNotNone(_locker._ldap_c.get_record(_users["expired"], OcLdapUserRecord).is_locked)
+
+            _index = ActionIndex(_index_path)
+            _index.load()
+            self.assertEqual(2, len(_index))
+            self.assertEqual((_now_t + datetime.timedelta(days=22)).date(), _index.get(_users["fresh"]))
+
+            # nobody is due
+            _locker.run()
+            self.assertEqual([], _processed())
+
+            # modified one is processed
+            usr = _locker._ldap_c.get_record(_users["another"], OcLdapUserRecord)
+            usr.set_attribute('modifyTimestamp', "29991231000000Z")
+            _locker._ldap_c.put_record(usr)
+            _locker.run()
+            self.assertEqual([_users["another"]], _processed())
+
+            # due one is processed
+            _index.load()
+            _index.set(_users["fresh"], _now_t.date())
+            _index.save()
+            _locker.run()
+            self.assertEqual(sorted([_users["fresh"], _users["another"]]), _processed())
+
+            # full scan by cadence and on configuration change
+            _index.load()
+            _index.last_full_scan = _now_t - datetime.timedelta(days=7)
+            _index.save()
+            _locker.run()
+            self.assertEqual(sorted([_users["fresh"], _users["another"]]), _processed())
+            _locker.config["users"][0]["days_valid"] = 31
+            _locker.run()
+            self.assertEqual(sorted([_users["fresh"], _users["another"]]), _processed())
+        finally:
+            self._close_tempfile(_index_path, delete=True)
+
+    def test_run__change_tracking(self):
+        # changed users are found with content synchronization, mode change causes full scan
+        rnd = Randomizer()
+        _locker = self._get_locker()
+        _index_path = self._close_tempfile(tempfile.mkstemp(suffix=".json"), delete=True)
+        _locker.config["evaluation"] = {"action_index": _index_path, "change_tracking": "sync"}
+        _locker.config["users"] = [{"days_valid": 30, "time_attributes": ["authTimestamp"]}]
+        _users = list()
+
+        for idx in range(0, 3):
+            usr = OcLdapUserRecord()
+            usr.set_attribute('cn', rnd.random_letters(idx + 10))
+            _users.append(_locker._ldap_c.put_record(usr))
+
+        # mocked LDAP does not keep time values
+        _locker._get_account_lock_date = unittest.mock.MagicMock(
+                return_value=datetime.datetime.now() + datetime.timedelta(days=20))
+        _locker._process_single_user = unittest.mock.MagicMock(side_effect=_locker._process_single_user)
+
+        def _processed():
+            _result = sorted(_x[0][0] for _x in _locker._process_single_user.call_args_list)
+            _locker._process_single_user.reset_mock()
+            return _result
+
+        try:
+            _locker.run()
+            self.assertEqual(sorted(_x.dn for _x in _users), _processed())
+            _locker.run()
+            self.assertEqual([], _processed())
+
+            _users[1].set_attribute('mail', "test@example.local")
+            _locker._ldap_c.put_record(_users[1])
+            _locker.run()
+            self.assertEqual([_users[1].dn], _processed())
+            _locker.run()
+            self.assertEqual([], _processed())
+
+            _locker.config["evaluation"]["change_tracking"] = "timestamp"
+            _locker.run()
+            self.assertEqual(sorted(_x.dn for _x in _users), _processed())
+        finally:
+            self._close_tempfile(_index_path, delete=True)
+
+    def test_run__change_tracking_snapshot(self):
+        # with a snapshot the change state is the one it was written at, changes missing in it are found again
+        rnd = Randomizer()
+        _locker = self._get_locker()
+        _index_path = self._close_tempfile(tempfile.mkstemp(suffix=".json"), delete=True)
+        _locker.config["evaluation"] = {"action_index": _index_path, "change_tracking": "sync"}
+        _locker.config["users"] = [{"days_valid": 30, "time_attributes": ["authTimestamp"]}]
+        _locker._snapshot_path = self._close_tempfile(tempfile.mkstemp(suffix=".db"), delete=True)
+        _locker._snapshot_refresh = True
+        _users = list()
+
+        for idx in range(0, 3):
+            usr = OcLdapUserRecord()
+            usr.set_attribute('cn', rnd.random_letters(idx + 10))
+            _users.append(_locker._ldap_c.put_record(usr))
+
+        # mocked LDAP does not keep time values
+        _locker._get_account_lock_date = unittest.mock.MagicMock(
+                return_value=datetime.datetime.now() + datetime.timedelta(days=20))
+        _locker._process_single_user = unittest.mock.MagicMock(side_effect=_locker._process_single_user)
+
+        def _processed():
+            _result = sorted(_x[0][0] for _x in _locker._process_single_user.call_args_list)
+            _locker._process_single_user.reset_mock()
+            return _result
+
+        try:
+            _locker.run()
+            self.assertEqual(sorted(_x.dn for _x in _users), _processed())
+
+            # the change is not in the snapshot: found again by the run with the snapshot written anew
+            _locker._snapshot_refresh = False
+            _users[1].set_attribute('mail', "test@example.local")
+            _locker._ldap_c.put_record(_users[1])
+            _locker.run()
+            self.assertEqual([_users[1].dn], _processed())
+
+            _locker._snapshot_refresh = True
+            _locker.run()
+            self.assertEqual([_users[1].dn], _processed())
+            _locker.run()
+            self.assertEqual([], _processed())
+        finally:
+            self._close_tempfile(_index_path, delete=True)
+            self._close_tempfile(_locker._snapshot_path, delete=True)
+
+    def test_run__snapshot(self):
+        # evaluation goes from snapshot, locks go to LDAP
+        rnd = Randomizer()
+        _locker = self._get_locker()
+        _locker.config["users"] = [
+            {"days_valid": 10, "time_attributes": ["authTimestamp"], "condition_attributes": {
+                "mail": {"values": ["expired@example.local"]}}},
+            {"days_valid": 30, "time_attributes": ["authTimestamp"]}]
+        _users = list()
+
+        for idx in range(0, 3):
+            usr = OcLdapUserRecord()
+            usr.set_attribute('cn', rnd.random_letters(idx + 10))
+            usr.set_attribute('mail', "user%d@example.local" % idx)
+            _users.append(_locker._ldap_c.put_record(usr).dn)
+
+        # mocked LDAP does not keep time values
+        _now_t = datetime.datetime.now()
+        _locker._get_account_lock_date = unittest.mock.MagicMock(
+                side_effect=lambda _rec, _days, *args: _now_t + datetime.timedelta(days=_days - 20))
+        _locker._snapshot_path = self._close_tempfile(tempfile.mkstemp(suffix=".db"), delete=True)
+
+        def _is_locked(dn):
+            return _locker._ldap_c.get_record(dn, OcLdapUserRecord).is_locked is not None
+
+        try:
+            with self.assertRaises(FileNotFoundError):
+                _locker.run()
+
+            _locker._snapshot_refresh = True
+            _locker.run()
+            self.assertIsNone(_locker._snapshot)
+            self.assertFalse(any(_is_locked(_x) for _x in _users))
+
+            # the change is not seen with the snapshot
+            _locker._snapshot_refresh = False
+            usr = _locker._ldap_c.get_record(_users[1], OcLdapUserRecord)
+            usr.set_attribute('mail', "expired@example.local")
+            _locker._ldap_c.put_record(usr)
+            _locker.run()
+            self.assertFalse(any(_is_locked(_x) for _x in _users))
+
+            # expired snapshot is re-written
+            _locker._snapshot_ttl = 3600
+            _locker.run()
+            self.assertFalse(any(_is_locked(_x) for _x in _users))
+            os.utime(_locker._snapshot_path, (0, 0))
+            _locker.run()
+            self.assertEqual([False, True, False], list(_is_locked(_x) for _x in _users))
+
+            # failed run does not leave the snapshot open for the next one
+            with unittest.mock.patch.object(_locker, "_process_single_user", side_effect=ValueError("failed")):
+                with self.assertRaises(ValueError):
+                    _locker.run()
+
+            self.assertIsNone(_locker._snapshot)
+
+            # snapshot without attributes required
+            _locker._snapshot_ttl = None
+            _locker.config["users"] = [{"days_valid": 10, "time_attributes": ["authTimestamp"],
+                                        "condition_attributes": {"sn": {"values": ["expired"]}}}]
+
+            with self.assertRaises(ValueError):
+                _locker.run()
+        finally:
+            self._close_tempfile(_locker._snapshot_path, delete=True)
+
+    def test_run__snapshot_live_lock_date(self):
+        # a user logged in after the snapshot was written is not locked by the snapshot decision
+        rnd = Randomizer()
+        _locker = self._get_locker()
+        _locker.config["users"] = [{"days_valid": 10, "time_attributes": ["authTimestamp"]}]
+        _users = list()
+
+        for idx in range(0, 2):
+            usr = OcLdapUserRecord()
+            usr.set_attribute('cn', rnd.random_letters(idx + 10))
+            _users.append(_locker._ldap_c.put_record(usr).dn)
+
+        # mocked LDAP does not keep time values: the login is marked by any value, the one without it is expired
+        _now_t = datetime.datetime.now()
+        _locker._get_account_lock_date = unittest.mock.MagicMock(
+                side_effect=lambda _rec, _days, *args: _now_t + datetime.timedelta(
+                    days=_days if _rec.get_attribute("authTimestamp") else -1))
+        _locker._snapshot_path = self._close_tempfile(tempfile.mkstemp(suffix=".db"), delete=True)
+        _locker._snapshot_ttl = 3600
+
+        try:
+            _locker._prepare_snapshot()
+            _locker._snapshot.close()
+            _locker._snapshot = None
+
+            usr = _locker._ldap_c.get_record(_users[1], OcLdapUserRecord)
+            usr.set_attribute('authTimestamp', "20990101000000Z")
+            _locker._ldap_c.put_record(usr)
+            _locker.run()
+
+            self.assertEqual([True, False], list(
+                _locker._ldap_c.get_record(_x, OcLdapUserRecord).is_locked is not None for _x in _users))
+            self.assertEqual(1, _locker._summary["locks"])
+        finally:
+            self._close_tempfile(_locker._snapshot_path, delete=True)
+
+    def test_run__policy_sets(self):
+        # every user is read once and processed by every set, a user locked is not processed further
+        rnd = Randomizer()
+        _locker = self._get_locker()
+        _locker.config["SMTP"] = {"from": "locker@example.local"}
+        _locker.config["policy_sets"] = [
+            {"name": "contractors", "SMTP": {"from": "contractors@example.local"}, "users": [
+                {"days_valid": 10, "time_attributes": ["authTimestamp"], "condition_attributes": {
+                    "mail": {"comparison": {"type": "regexp"}, "values": [".*@contractor\\.local"]}}}]},
+            {"users": [{"days_valid": 30, "time_attributes": ["authTimestamp"]}]}]
+        _users = list()
+
+        for idx in range(0, 5):
+            usr = OcLdapUserRecord()
+            usr.set_attribute('cn', rnd.random_letters(idx + 10))
+            usr.set_attribute('mail', "user%d@%s.local" % (idx, "contractor" if idx % 2 else "example"))
+
+            if idx == 4:
+                # temporary lockout by password policy, processed as the rest
+                usr.set_attribute('pwdAccountLockedTime', '20240101000000Z')
+
+            _users.append(_locker._ldap_c.put_record(usr).dn)
+
+        _sets = _locker._get_policy_sets()
+        self.assertEqual(["contractors", "#1"], list(_x.config.get("name") for _x in _sets))
+        self.assertEqual({"from": "contractors@example.local"}, _sets[0].config.get("SMTP"))
+        self.assertEqual({"from": "locker@example.local"}, _sets[1].config.get("SMTP"))
+        self.assertIs(_sets, _locker._get_policy_sets())
+
+        # mocked LDAP does not keep time values
+        _now_t = datetime.datetime.now()
+
+        with unittest.mock.patch.object(OcLdapUserLocker, "_get_account_lock_date",
+                                        side_effect=lambda _rec, _days, *args: _now_t + datetime.timedelta(days=_days - 20)), \
+                unittest.mock.patch.object(OcLdapUserLocker, "_check_lock_notifications") as _notify, \
+                unittest.mock.patch("oc_ldap_user_locker.locker.read_record", wraps=read_record) as _read:
+            _locker.run()
+
+        self.assertEqual(len(_users), _read.call_count)
+        self.assertEqual(sorted([(_users[0], 30), (_users[1], 10), (_users[2], 30), (_users[3], 10), (_users[4], 30)]),
+                         sorted((_x[0][0].dn, _x[0][1]['days_valid']) for _x in _notify.call_args_list))
+        self.assertEqual([False, True, False, True], list(
+                _locker._ldap_c.get_record(_x, OcLdapUserRecord).is_locked is not None for _x in _users[:4]))
+
+        _locker.config = dict(_locker.config)
+        _locker.config["users"] = [{"days_valid": 30, "time_attributes": ["authTimestamp"]}]
+
+        with self.assertRaises(ValueError):
+            _locker.run()
+
+    def test_run__directories(self):
+        # every directory is processed with its own connection and policy, mailer is shared
+        rnd = Randomizer()
+        _locker = self._get_locker()
+        _locker.config["LDAP"] = [dict(_locker.config["LDAP"], baseDn="dc=first"),
+                                  dict(_locker.config["LDAP"], baseDn="dc=second")]
+        _locker.config["users"] = [{"days_valid": 10, "time_attributes": ["authTimestamp"],
+                                    "condition_attributes": {"mail": {"values": ["^user"], "comparison": {
+                                        "type": "regexp"}}},
+                                    "lock_notifications": [{"days_before": 0, "template": {"file": "template"}}]}]
+        _catalogs = {"dc=first": self._get_ldap_user_cat(), "dc=second": self._get_ldap_user_cat()}
+        _users = dict()
+
+        for _base_dn, _count in [("dc=first", 2), ("dc=second", 3)]:
+            _users[_base_dn] = list()
+
+            for idx in range(0, _count):
+                usr = OcLdapUserRecord()
+                usr.set_attribute('cn', rnd.random_letters(idx + 10))
+                usr.set_attribute('mail', "user%d@example.local" % idx)
+                _users[_base_dn].append(_catalogs[_base_dn].put_record(usr).dn)
+
+        _directories = _locker._get_directories()
+        self.assertEqual(2, len(_directories))
+        self.assertFalse(any(_x._get_policy() is _locker._get_policy() for _x in _directories))
+        self.assertIs(_directories, _locker._get_directories())
+
+        # mocked LDAP does not keep time values
+        _now_t = datetime.datetime.now()
+
+        with unittest.mock.patch.object(OcLdapUserLocker, "_get_account_lock_date",
+                                        side_effect=lambda _rec, _days, *args: _now_t + datetime.timedelta(days=_days - 20)), \
+                unittest.mock.patch('oc_ldap_user_locker.locker.OcLdapUserCat',
+                                    side_effect=lambda **_x: _catalogs[_x["baseDn"]]) as _cat:
+            _locker.run()
+
+        self.assertEqual(2, _cat.call_count)
+        self.assertEqual(5, _locker._mailer.send_notification.call_count)
+        self.assertEqual({"users": 5, "notifications": 5, "locks": 5}, dict(_locker._summary))
+
+        # condition statistics of the directories are merged
+        self.assertEqual(5, _locker._get_policy().sections[0].conditions[0].evaluations)
+        self.assertEqual([0, 0], list(_x._get_policy().sections[0].conditions[0].evaluations for _x in _directories))
+
+        for _base_dn, _dns in _users.items():
+            self.assertTrue(all(_catalogs[_base_dn].get_record(_x, OcLdapUserRecord).is_locked is not None
+                                for _x in _dns))
+
+        # a failed directory does not stop the other one, its connection is dropped
+        _directories[0]._process_users = unittest.mock.MagicMock()
+        _directories[1]._process_users = unittest.mock.MagicMock(side_effect=ValueError("failed"))
+
+        with self.assertRaises(ValueError):
+            _locker.run()
+
+        _directories[0]._process_users.assert_called_once_with()
+        self.assertIsNotNone(_directories[0]._ldap_c)
+        self.assertIsNone(_directories[1]._ldap_c)
+
+    def test_run__priority(self):
+        # users to lock go first, then users to notify, the nearest lock first; the rest are processed last
+        rnd = Randomizer()
+        _locker = self._get_locker()
+        _locker.config["evaluation"] = {"ordering": "priority", "batch_size": 4}
+        _locker.config["users"] = [{"days_valid": 10, "time_attributes": ["authTimestamp"], "lock_notifications": [
+            {"days_before": 5, "template": {"file": "template"}},
+            {"days_before": 3, "template": {"file": "template"}}]}]
+        _days = dict()
+
+        for idx, _days_before_lock in enumerate([20, -1, 5, 30, 3, 7]):
+            usr = OcLdapUserRecord()
+            usr.set_attribute('cn', rnd.random_letters(idx + 10))
+            usr.set_attribute('mail', "user%d@example.local" % idx)
+            _days[_locker._ldap_c.put_record(usr).dn] = _days_before_lock
+
+        # mocked LDAP does not keep time values
+        _locker._get_lock_dates = unittest.mock.MagicMock(side_effect=lambda _recs, _days_valid, _attrs, _now: list(
+                (_now + datetime.timedelta(days=_days[_x.dn]), _days[_x.dn]) for _x in _recs))
+        _locker._apply_lock_date = unittest.mock.MagicMock()
+
+        with unittest.mock.patch('oc_ldap_user_locker.locker.OcLdapUserCat', new=lambda **_x: _locker._ldap_c):
+            _locker.run()
+
+        self.assertEqual([-1, 3, 5, 7, 20, 30], list(_days[_x[0][0].dn] for _x in _locker._apply_lock_date.call_args_list))
+
+        # the rest is not processed when the deadline has passed
+        _locker._apply_lock_date = unittest.mock.MagicMock(side_effect=lambda *args: setattr(
+                _locker, "_deadline_at", 0 if _locker._apply_lock_date.call_count == 2 else None))
+
+        with unittest.mock.patch('oc_ldap_user_locker.locker.OcLdapUserCat', new=lambda **_x: _locker._ldap_c):
+            _locker.run()
+
+        self.assertEqual([-1, 3], list(_days[_x[0][0].dn] for _x in _locker._apply_lock_date.call_args_list))
+
+        _locker.config["evaluation"] = {"ordering": "unknown"}
+
+        with self.assertRaises(NotImplementedError):
+            _locker.run()
+
+    def test_run__priority_deadline(self):
+        # the deadline limits both evaluation and actions, the most urgent users are processed first
+        rnd = Randomizer()
+        _locker = self._get_locker()
+        _locker.config["evaluation"] = {"ordering": "priority", "batch_size": 5}
+        _locker.config["users"] = [{"days_valid": 10, "time_attributes": ["authTimestamp"]}]
+        _locker._deadline = 3600
+        _days = dict()
+
+        for idx, _days_before_lock in enumerate([0, -1, 20, -3, -2, -5, -4]):
+            usr = OcLdapUserRecord()
+            usr.set_attribute('cn', rnd.random_letters(idx + 10))
+            _days[_locker._ldap_c.put_record(usr).dn] = _days_before_lock
+
+        # mocked LDAP does not keep time values
+        _locker._get_lock_dates = unittest.mock.MagicMock(side_effect=lambda _recs, _days_valid, _attrs, _now: list(
+                (_now + datetime.timedelta(days=_days[_x.dn]), _days[_x.dn]) for _x in _recs))
+        _locker._apply_lock_date = unittest.mock.MagicMock()
+        _get_users_by_conf = _locker._get_users_by_conf
+
+        def _evaluate(user_dns):
+            _result = _get_users_by_conf(user_dns)
+            _locker._deadline_at = time.monotonic() - 1
+            return _result
+
+        # the deadline passes during evaluation: the rest are not evaluated, no actions are taken
+        _locker._get_users_by_conf = unittest.mock.MagicMock(side_effect=_evaluate)
+
+        with unittest.mock.patch('oc_ldap_user_locker.locker.OcLdapUserCat', new=lambda **_x: _locker._ldap_c):
+            _locker.run()
+
+        _locker._get_users_by_conf.assert_called_once()
+        self.assertEqual(5, len(_locker._get_users_by_conf.call_args[0][0]))
+        _locker._apply_lock_date.assert_not_called()
+
+        # the deadline passes during actions: the nearest lock dates go first
+        _locker._get_users_by_conf = _get_users_by_conf
+
+        def _apply(*args):
+            if _locker._apply_lock_date.call_count > 1:
+                _locker._deadline_at = time.monotonic() - 1
+
+        _locker._apply_lock_date.side_effect = _apply
+
+        with unittest.mock.patch('oc_ldap_user_locker.locker.OcLdapUserCat', new=lambda **_x: _locker._ldap_c):
+            _locker.run()
+
+        self.assertEqual([-5, -4], list(_days[_x[0][0].dn] for _x in _locker._apply_lock_date.call_args_list))
+
+    def test_run__resume(self):
+        # the run interrupted is continued without the users processed already
+        rnd = Randomizer()
+        _locker = self._get_locker()
+        _path = self._close_tempfile(tempfile.mkstemp(suffix=".checkpoint"), delete=True)
+        _locker.config["evaluation"] = {"checkpoint": _path}
+        _users = list()
+
+        for idx in range(0, 5):
+            usr = OcLdapUserRecord()
+            usr.set_attribute('cn', rnd.random_letters(idx + 10))
+            _users.append(_locker._ldap_c.put_record(usr).dn)
+
+        _processed = list()
+        _locker._process_user_record = unittest.mock.MagicMock(side_effect=lambda _rec: (
+                _processed.append(_rec.dn), _locker.stop() if len(_processed) == 2 else None))
+
+        try:
+            _locker.run()
+            self.assertEqual(2, len(_processed))
+            self.assertTrue(os.path.exists(_path))
+
+            _locker._stop_event.clear()
+            _locker._resume = True
+            _locker.run()
+            self.assertEqual(sorted(_users), sorted(_processed))
+            self.assertFalse(os.path.exists(_path))
+
+            # nothing to resume after the run completed
+            _locker.run()
+            self.assertEqual(len(_users) * 2, len(_processed))
+        finally:
+            if os.path.exists(_path):
+                os.remove(_path)
+
+    def test_run__resume_failed(self):
+        # the checkpoint of the run failed is kept to resume
+        rnd = Randomizer()
+        _locker = self._get_locker()
+        _path = self._close_tempfile(tempfile.mkstemp(suffix=".checkpoint"), delete=True)
+        _locker.config["evaluation"] = {"checkpoint": _path}
+        _users = list()
+
+        for idx in range(0, 5):
+            usr = OcLdapUserRecord()
+            usr.set_attribute('cn', rnd.random_letters(idx + 10))
+            _users.append(_locker._ldap_c.put_record(usr).dn)
+
+        _processed = list()
+
+        def _process_user_record(user_rec):
+            if len(_processed) == 2:
+                raise ConnectionResetError("reset")
+
+            _processed.append(user_rec.dn)
+
+        _locker._process_user_record = unittest.mock.MagicMock(side_effect=_process_user_record)
+
+        try:
+            with self.assertRaises(ConnectionResetError):
+                _locker.run()
+
+            self.assertTrue(os.path.exists(_path))
+
+            _locker._process_user_record.side_effect = lambda _rec: _processed.append(_rec.dn)
+            _locker._resume = True
+            _locker.run()
+            self.assertEqual(sorted(_users), sorted(_processed))
+            self.assertFalse(os.path.exists(_path))
+        finally:
+            if os.path.exists(_path):
+                os.remove(_path)
+
+    def test_run__lease(self):
+        # the run is skipped while another instance holds the lease
+        _locker = self._get_locker()
+        _path = self._close_tempfile(tempfile.mkstemp(suffix=".lease"))
+        _locker.config["lease"] = {"path": _path}
+        _locker._process_users = unittest.mock.MagicMock()
+        _another = FileLease(_path)
+
+        try:
+            self.assertTrue(_another.acquire())
+            _locker.run()
+            _locker._process_users.assert_not_called()
+
+            _another.release()
+            _locker._process_users.side_effect = lambda: self.assertFalse(_another.acquire())
+            _locker.run()
+            _locker._process_users.assert_called_once()
+
+            # released after the run
+            self.assertTrue(_another.acquire())
+            _another.release()
+
+            _locker.config["lease"] = {"backend": "etcd"}
+
+            with self.assertRaises(NotImplementedError):
+                _locker.run()
+        finally:
+            os.remove(_path)
+
+    def test_run__lease_directories(self):
+        # directories on the same server have their own lease entries
+        _locker = self._get_locker()
+        _locker.config["LDAP"] = [dict(_locker.config["LDAP"], baseDn="dc=first"),
+                                  dict(_locker.config["LDAP"], baseDn="dc=second")]
+        _locker.config["lease"] = {"backend": "ldap", "dn": "cn=user-locker,dc=some,dc=test,dc=domain,dc=local"}
+        _catalog = self._get_ldap_user_cat()
+        _catalog.ldap_c.unbind = unittest.mock.MagicMock()
+        _leases = list(_x._get_lease() for _x in _locker._get_directories())
+        self.assertEqual(["cn=user-locker.0,dc=some,dc=test,dc=domain,dc=local",
+                          "cn=user-locker.1,dc=some,dc=test,dc=domain,dc=local"], list(_x._dn for _x in _leases))
+
+        with unittest.mock.patch('oc_ldap_user_locker.locker.OcLdapUserCat', return_value=_catalog):
+            try:
+                self.assertEqual([True, True], list(_x.acquire() for _x in _leases))
+            finally:
+                for _lease in _leases:
+                    _lease.release()
+
     ## get_account_lock_date
     ## accuracy is 'days', so it is possible to assert with 'get_days_before_lock'
     ## which is unit-tested separately
@@ -593,6 +1463,263 @@ class OcLdapUserLockerTest(unittest.TestCase):
         }
         self.assertEqual(_locker._find_valid_conf(usr).get("days_valid"), 70)
 
+    def test_find_valid_conf__profiler(self):
+        # profiler should count sections, conditions and remote fetches
+        rnd = Randomizer()
+        _locker = self._get_locker()
+        _locker._profiler = RuleProfiler()
+        _locker.config = {
+            "users": [
+                {
+                    "days_valid": 90,
+                    "time_attributes": ["authTimestamp"],
+                    "condition_attributes": {
+                        "memberOf.businessCategory": {"values": ["Client"]},
+                        "mail": {"values": ["test@example.local"]}
+                    }
+                },
+                {
+                    "days_valid": 30,
+                    "time_attributes": ["authTimestamp"]
+                }
+            ]
+        }
+
+        group = OcLdapGroupRecord()
+        group.set_attribute('cn', rnd.random_letters(rnd.random_number(7, 17)))
+        group.set_attribute('businessCategory', 'Vendor')
+        group = _locker._ldap_c.put_record(group)
+
+        usr = OcLdapUserRecord()
+        usr.set_attribute('cn', rnd.random_letters(rnd.random_number(7, 17)))
+        usr.set_attribute('memberOf', group.dn)
+        usr.set_attribute('mail', "test@example.local")
+        self.assertEqual(_locker._find_valid_conf(usr).get("days_valid"), 30)
+
+        # cheap local 'mail' is checked first, then the dotted one which reads the group
+        _stats = _locker._profiler._stats
+        self.assertEqual(1, _stats[(0, None)].evaluations)
+        self.assertEqual(0, _stats[(0, None)].matches)
+        self.assertEqual(0, _stats[(0, None)].short_circuits)
+        self.assertEqual(1, _stats[(0, None)].fetches)
+        self.assertEqual(1, _stats[(0, "mail")].matches)
+        self.assertEqual(0, _stats[(0, "mail")].fetches)
+        self.assertEqual(0, _stats[(0, "memberOf.businessCategory")].matches)
+        self.assertEqual(1, _stats[(0, "memberOf.businessCategory")].fetches)
+        self.assertEqual(1, _stats[(1, None)].matches)
+
+        # failed 'mail' stops the section before the group is read
+        usr.set_attribute('mail', "another@example.local")
+        self.assertEqual(_locker._find_valid_conf(usr).get("days_valid"), 30)
+        self.assertEqual(1, _stats[(0, None)].short_circuits)
+        self.assertEqual(1, _stats[(0, "mail")].short_circuits)
+        self.assertEqual(1, _stats[(0, "memberOf.businessCategory")].evaluations)
+        self.assertEqual(1, _stats[(0, None)].fetches)
+
+    def test_find_valid_conf__statistics(self):
+        # statistics of condition evaluation should be saved and used for ordering in the next run
+        _locker = self._get_locker()
+        _statistics = tempfile.NamedTemporaryFile(suffix=".json")
+        _locker.config = {
+            "evaluation": {"statistics": _statistics.name},
+            "users": [
+                {
+                    "days_valid": 90,
+                    "time_attributes": ["authTimestamp"],
+                    "condition_attributes": {
+                        "mail": {"values": ["test@example.local"]},
+                        "sn": {"values": ["test"]}
+                    }
+                }
+            ]
+        }
+        _statistics.close()
+
+        usr = OcLdapUserRecord()
+        usr.set_attribute('mail', "test@example.local")
+        usr.set_attribute('sn', "another")
+
+        for _i in range(0, 10):
+            self.assertIsNone(_locker._find_valid_conf(usr))
+
+        self.assertEqual(["mail", "sn"], list(_x.attrib for _x in _locker._get_policy().sections[0].conditions))
+        _locker._save_statistics()
+        self.assertTrue(os.path.exists(_statistics.name))
+
+        # 'sn' rejects more, so it is to be checked first now
+        _locker.config["users"] = list(_locker.config["users"])
+        self.assertEqual(["sn", "mail"], list(_x.attrib for _x in _locker._get_policy().sections[0].conditions))
+        os.remove(_statistics.name)
+
+    def test_find_valid_conf__pruning(self):
+        # the most specific section wins, the first one on ties
+        # conditions shared by sections are checked once, sections for missing attributes are not checked
+        _locker = self._get_locker()
+        _locker.config = {
+            "users": [
+                {"days_valid": 10, "time_attributes": ["authTimestamp"]},
+                {"days_valid": 20, "time_attributes": ["authTimestamp"], "condition_attributes": {
+                    "mail": {"values": ["test@example.local"]}}},
+                {"days_valid": 30, "time_attributes": ["authTimestamp"], "condition_attributes": {
+                    "mail": {"values": ["test@example.local"]},
+                    "sn": {"values": ["test"]}}},
+                {"days_valid": 40, "time_attributes": ["authTimestamp"], "condition_attributes": {
+                    "mail": {"values": ["test@example.local"]}}},
+                {"days_valid": 50, "time_attributes": ["authTimestamp"], "condition_attributes": {
+                    "givenName": {"values": ["test"]}}}]}
+
+        _locker._compare_attribute = unittest.mock.MagicMock(wraps=_locker._compare_attribute)
+        usr = OcLdapUserRecord()
+        usr.set_attribute('mail', "test@example.local")
+        usr.set_attribute('sn', "test")
+        self.assertEqual(_locker._find_valid_conf(usr).get("days_valid"), 30)
+
+        _locker._compare_attribute.reset_mock()
+        usr.set_attribute('sn', "another")
+        self.assertEqual(_locker._find_valid_conf(usr).get("days_valid"), 20)
+        # 'mail' and 'sn' for the third section, 'mail' result is reused for the second one
+        # the fourth is not checked since the second one wins on tie, 'givenName' is missing at all
+        self.assertEqual(2, _locker._compare_attribute.call_count)
+
+        usr.set_attribute('mail', "another@example.local")
+        self.assertEqual(_locker._find_valid_conf(usr).get("days_valid"), 10)
+
+    def test_find_valid_conf__decisions_cache(self):
+        # users with the same tested attributes are evaluated once within the run
+        _locker = self._get_locker()
+        _locker.config = {
+            "users": [
+                {"days_valid": 10, "time_attributes": ["authTimestamp"]},
+                {"days_valid": 20, "time_attributes": ["authTimestamp"], "condition_attributes": {
+                    "mail": {"comparison": {"type": "regexp"}, "values": [".*@example\\.local"]}}}]}
+        _locker._decisions = dict()
+        _locker._evaluate_sections = unittest.mock.MagicMock(wraps=_locker._evaluate_sections)
+
+        for _cn in ["first", "second", "third"]:
+            usr = OcLdapUserRecord()
+            usr.set_attribute('cn', _cn)
+            usr.set_attribute('mail', "test@example.local")
+            self.assertEqual(_locker._find_valid_conf(usr).get("days_valid"), 20)
+
+        usr.set_attribute('mail', "test@another.local")
+        self.assertEqual(_locker._find_valid_conf(usr).get("days_valid"), 10)
+        self.assertEqual(2, _locker._evaluate_sections.call_count)
+        self.assertEqual(2, len(_locker._decisions))
+
+    def test_find_valid_conf__dotted_inverted(self):
+        # referenced records are matched once, users are checked without reading them
+        rnd = Randomizer()
+        _locker = self._get_locker()
+        _locker.config = {
+            "evaluation": {"dotted_conditions": "inverted"},
+            "users": [
+                {"days_valid": 10, "time_attributes": ["authTimestamp"]},
+                {"days_valid": 20, "time_attributes": ["authTimestamp"], "condition_attributes": {
+                    "memberOf.businessCategory": {"values": ["Vendor"]}}},
+                {"days_valid": 30, "time_attributes": ["authTimestamp"], "condition_attributes": {
+                    "memberOf.businessCategory": {
+                        "comparison": {"type": "regexp", "condition": "any"},
+                        "values": ["cli.*"]}}}]}
+
+        _groups = dict()
+
+        for _category in ["Vendor", "Client", "Other"]:
+            group = OcLdapGroupRecord()
+            group.set_attribute('cn', rnd.random_letters(rnd.random_number(7, 17)))
+            group.set_attribute('businessCategory', _category)
+            _groups[_category] = _locker._ldap_c.put_record(group).dn
+
+        _locker._prepare_dotted_conditions()
+        self.assertEqual(2, len(_locker._referenced_dns))
+        _locker._get_referenced_record = unittest.mock.MagicMock()
+
+        usr = OcLdapUserRecord()
+        usr.set_attribute('cn', rnd.random_letters(rnd.random_number(7, 17)))
+        usr.set_attribute('memberOf', [_groups["Other"], _groups["Vendor"].upper()])
+        self.assertEqual(_locker._find_valid_conf(usr).get("days_valid"), 20)
+
+        usr.set_attribute('memberOf', [_groups["Client"]])
+        self.assertEqual(_locker._find_valid_conf(usr).get("days_valid"), 30)
+
+        usr.set_attribute('memberOf', [_groups["Other"], "cn=unknown,dc=some,dc=test,dc=domain,dc=local"])
+        self.assertEqual(_locker._find_valid_conf(usr).get("days_valid"), 10)
+        _locker._get_referenced_record.assert_not_called()
+
+    def test_prepare_dotted_conditions__strategy(self):
+        _locker = self._get_locker()
+        _locker.config = {"users": []}
+        _locker._prepare_dotted_conditions()
+        self.assertIsNone(_locker._referenced_dns)
+
+        _locker.config = {"users": [], "evaluation": {"dotted_conditions": "unknown"}}
+
+        with self.assertRaises(NotImplementedError):
+            _locker._prepare_dotted_conditions()
+
+    def test_find_valid_conf__bitset(self):
+        # bitset engine gives the same results as regular comparison
+        rnd = Randomizer()
+        _locker = self._get_locker()
+        _groups = list("cn=%s,dc=some,dc=test,dc=domain,dc=local" % rnd.random_letters(7) for _i in range(0, 6))
+        _users_conf = list()
+
+        for _i in range(0, 20):
+            _users_conf.append({"days_valid": _i, "time_attributes": ["authTimestamp"], "condition_attributes": {
+                "memberOf": {
+                    "comparison": {"condition": ["any", "all"][_i % 2]},
+                    "values": list(rnd.random_number(0, 1) and _x.upper() or _x
+                                   for _x in _groups[rnd.random_number(0, 5):][:rnd.random_number(1, 2)])}}})
+
+        _locker.config = {"users": _users_conf}
+        _users = list()
+
+        for _i in range(0, 100):
+            usr = OcLdapUserRecord()
+            usr.set_attribute('cn', rnd.random_letters(7))
+            usr.set_attribute('memberOf', list(_x for _x in _groups if rnd.random_number(0, 2) == 0))
+            _users.append(usr)
+
+        _expected = list(_locker._find_valid_conf(_x) for _x in _users)
+
+        _locker.config = {"users": _users_conf, "evaluation": {"engine": "bitset"}}
+        _locker._prepare_bitset_engine()
+        self.assertIsNotNone(_locker._bitset)
+        _locker._compare_attribute = unittest.mock.MagicMock()
+        self.assertEqual(_expected, list(_locker._find_valid_conf(_x) for _x in _users))
+        _locker._compare_attribute.assert_not_called()
+
+        _locker.config = {"users": [], "evaluation": {"engine": "unknown"}}
+
+        with self.assertRaises(NotImplementedError):
+            _locker._prepare_bitset_engine()
+
+    def test_find_valid_conf__bitset_dotted(self):
+        # dotted conditions evaluated with 'inverted' strategy are compiled to masks
+        rnd = Randomizer()
+        _locker = self._get_locker()
+        _locker.config = {
+            "evaluation": {"dotted_conditions": "inverted", "engine": "bitset"},
+            "users": [
+                {"days_valid": 10, "time_attributes": ["authTimestamp"]},
+                {"days_valid": 20, "time_attributes": ["authTimestamp"], "condition_attributes": {
+                    "memberOf.businessCategory": {"values": ["Vendor"]}}}]}
+
+        group = OcLdapGroupRecord()
+        group.set_attribute('cn', rnd.random_letters(rnd.random_number(7, 17)))
+        group.set_attribute('businessCategory', "Vendor")
+        group = _locker._ldap_c.put_record(group)
+
+        _locker._prepare_dotted_conditions()
+        _locker._prepare_bitset_engine()
+        _locker._compare_referenced_dns = unittest.mock.MagicMock()
+
+        usr = OcLdapUserRecord()
+        usr.set_attribute('memberOf', ["cn=another,dc=some,dc=test,dc=domain,dc=local", group.dn])
+        self.assertEqual(_locker._find_valid_conf(usr).get("days_valid"), 20)
+        usr.set_attribute('memberOf', ["cn=another,dc=some,dc=test,dc=domain,dc=local"])
+        self.assertEqual(_locker._find_valid_conf(usr).get("days_valid"), 10)
+        _locker._compare_referenced_dns.assert_not_called()
+
     def _close_tempfile(self, tf, delete=False):
         if not isinstance(tf, str):
             _fd, _pth = tf
@@ -165,9 +165,9 @@ class MailerTestCase(unittest.TestCase):
         _smtp = unittest.mock.MagicMock()
         _smtp.login = unittest.mock.MagicMock()
 
-        with unittest.mock.patch("oc_ldap_user_locker.mailer.smtplib.SMTP", return_value=_smtp) as _smtp_i:
+        with unittest.mock.patch("smtplib.SMTP", return_value=_smtp) as _smtp_i:
             self.assertIsNotNone(_mailer._get_smtp_client())
-            _smtp_i.assert_called_once_with(host="another.smtp.example.com", port=25)
+            _smtp_i.assert_called_once_with(host="another.smtp.example.com", port=25, timeout=60)
             _smtp.login.assert_called_once_with("another_test_user", "test_user_password")
 
     def test_get_smtp_client__ok(self):
@@ -177,13 +177,13 @@ class MailerTestCase(unittest.TestCase):
                 "password": "test_user_password",
                 "from": "another_test@example.com"}
         _config_pth = "/tmp"
-        _mailer = LockMailer(_config, _config_pth)
+        _mailer = LockMailer(_config, _config_pth, timeout=15)
         _smtp = unittest.mock.MagicMock()
         _smtp.login = unittest.mock.MagicMock()
 
-        with unittest.mock.patch("oc_ldap_user_locker.mailer.smtplib.SMTP", return_value=_smtp) as _smtp_i:
+        with unittest.mock.patch("smtplib.SMTP", return_value=_smtp) as _smtp_i:
             self.assertIsNotNone(_mailer._get_smtp_client())
-            _smtp_i.assert_called_once_with(host="another.smtp.example.com", port=625)
+            _smtp_i.assert_called_once_with(host="another.smtp.example.com", port=625, timeout=15)
             _smtp.login.assert_called_once_with("another_test_user", "test_user_password")
 
     def test_send_notif__invalid_mail(self):
@@ -275,7 +275,7 @@ class MailerTestCase(unittest.TestCase):
         _sub_mailer = unittest.mock.MagicMock()
         _mailer._get_smtp_client = unittest.mock.MagicMock(return_value=_smtp)
 
-        with unittest.mock.patch("oc_ldap_user_locker.mailer.Mailer.Mailer", return_value=_sub_mailer) as _smmock:
+        with unittest.mock.patch("oc_mailer.Mailer.Mailer", return_value=_sub_mailer) as _smmock:
             _mailer.send_notification(_email, _template_conf, {"html": "real"})
             _smmock.assert_called_once_with(_smtp, 
                     'another_test@example.com', 'html', template='<p>the ${html} template</p>', signature_image=b'\x05')
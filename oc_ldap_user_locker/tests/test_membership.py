@@ -0,0 +1,46 @@
+import unittest
+from ..membership import BitsetEngine
+
+# remove unnecessary log output
+import logging
+logging.getLogger().propagate = False
+logging.getLogger().disabled = True
+
+class BitsetEngineTest(unittest.TestCase):
+    def test_mask(self):
+        _engine = BitsetEngine(["memberOf"])
+        self.assertEqual({"memberof"}, _engine.attributes)
+        self.assertEqual(0, _engine.get_mask(None))
+        self.assertEqual(0, _engine.get_mask([]))
+        self.assertEqual(0, _engine.get_mask(["", None]))
+        self.assertEqual(1, _engine.get_mask("cn=a,dc=local"))
+        self.assertEqual(3, _engine.get_mask(["CN=A,DC=LOCAL", "cn=b,dc=local"]))
+        self.assertEqual(6, _engine.get_mask(["cn=b,dc=local", "cn=c,dc=local", "cn=c,dc=local"]))
+        self.assertIsNone(_engine.get_mask(["cn=b,dc=local", b"cn=c,dc=local"]))
+
+    def test_add_condition(self):
+        _engine = BitsetEngine(["memberOf"])
+        self.assertTrue(_engine.add_condition("a", ["cn=a,dc=local"]))
+        self.assertFalse(_engine.add_condition("b", ["cn=a,dc=local", ""]))
+        self.assertFalse(_engine.add_condition("c", ["cn=a,dc=local", 1]))
+        self.assertFalse(_engine.add_condition("d", []))
+        self.assertFalse(_engine.add_condition("e", ["cn=a,dc=local"], "none"))
+        self.assertIn("a", _engine)
+        self.assertNotIn("b", _engine)
+
+    def test_match_any(self):
+        _engine = BitsetEngine(["memberOf"])
+        _engine.add_condition("any", ["cn=a,dc=local", "cn=b,dc=local"], "any")
+        self.assertTrue(_engine.match("any", _engine.get_mask(["cn=x,dc=local", "cn=B,dc=local"])))
+        self.assertFalse(_engine.match("any", _engine.get_mask(["cn=x,dc=local", "cn=y,dc=local"])))
+        self.assertFalse(_engine.match("any", _engine.get_mask([])))
+
+    def test_match_all(self):
+        _engine = BitsetEngine(["memberOf"])
+        _engine.add_condition("one", ["cn=a,dc=local", "CN=A,dc=local"], "all")
+        _engine.add_condition("two", ["cn=a,dc=local", "cn=b,dc=local"], "all")
+        self.assertTrue(_engine.match("one", _engine.get_mask(["cn=a,dc=local"])))
+        self.assertTrue(_engine.match("one", _engine.get_mask(["cn=a,dc=local", "cn=A,dc=local", ""])))
+        self.assertFalse(_engine.match("one", _engine.get_mask(["cn=a,dc=local", "cn=b,dc=local"])))
+        self.assertFalse(_engine.match("one", _engine.get_mask([])))
+        self.assertFalse(_engine.match("two", _engine.get_mask(["cn=a,dc=local", "cn=b,dc=local"])))
@@ -0,0 +1,146 @@
+import unittest
+from ..policy import CompiledPolicy, PolicyCondition
+from oc_ldap_client.oc_ldap_objects import OcLdapUserRecord
+
+# remove unnecessary log output
+import logging
+logging.getLogger().propagate = False
+logging.getLogger().disabled = True
+
+class CompiledPolicyTest(unittest.TestCase):
+    def _get_users_conf(self):
+        return [
+            {
+                "days_valid": 90,
+                "time_attributes": ["authTimestamp"],
+                "condition_attributes": {
+                    "memberOf.businessCategory": {"values": ["Vendor"]},
+                    "displayName": {
+                        "comparison": {"type": "regexp", "condition": "any"},
+                        "values": [".*test.*", ".*another.*"]
+                    },
+                    "mail": {"values": ["test@example.local"]}
+                }
+            },
+            {
+                "days_valid": 30,
+                "time_attributes": ["authTimestamp"]
+            }
+        ]
+
+    def test_condition_cost(self):
+        _flat = PolicyCondition("mail", {"values": ["a", "b"]}, 0)
+        _regexp = PolicyCondition("mail", {"comparison": {"type": "regexp"}, "values": ["a", "b"]}, 0)
+        _dotted = PolicyCondition("memberOf.businessCategory", {"values": ["a"]}, 0)
+        self.assertFalse(_flat.is_dotted)
+        self.assertTrue(_dotted.is_dotted)
+        self.assertEqual("memberOf", _dotted.head)
+        self.assertLess(_flat.cost, _regexp.cost)
+        self.assertLess(_regexp.cost, _dotted.cost)
+
+    def test_condition_no_values(self):
+        # wrong configuration is to be reported while evaluating, not while compiling
+        _condition = PolicyCondition("mail", None, 0)
+        self.assertGreater(_condition.cost, 0)
+
+    def test_order_by_cost(self):
+        _policy = CompiledPolicy(self._get_users_conf())
+        self.assertEqual(2, len(_policy.sections))
+        self.assertEqual(["mail", "displayName", "memberOf.businessCategory"],
+                         list(_x.attrib for _x in _policy.sections[0].conditions))
+        self.assertEqual([], _policy.sections[1].conditions)
+        self.assertEqual([0, 1], list(_x.index for _x in _policy.sections))
+
+    def test_order_by_statistics(self):
+        _users_conf = self._get_users_conf()
+        _policy = CompiledPolicy(_users_conf)
+        _mail, _display_name, _member_of = _policy.sections[0].conditions
+
+        # 'mail' almost always passes, 'displayName' almost always rejects
+        for _i in range(0, 100):
+            _mail.observe(True)
+            _display_name.observe(_i == 0)
+
+        _statistics = _policy.collect_statistics()
+        self.assertEqual({"evaluations": 100, "matches": 100}, _statistics[_mail.signature])
+        self.assertEqual({"evaluations": 100, "matches": 1}, _statistics[_display_name.signature])
+        self.assertNotIn(_member_of.signature, _statistics)
+        self.assertEqual(0, _mail.evaluations)
+
+        _policy = CompiledPolicy(_users_conf, statistics=_statistics)
+        self.assertEqual(["displayName", "mail", "memberOf.businessCategory"],
+                         list(_x.attrib for _x in _policy.sections[0].conditions))
+
+    def test_collect_statistics_merge(self):
+        _policy = CompiledPolicy(self._get_users_conf())
+        _mail = _policy.sections[0].conditions[0]
+        _mail.observe(False)
+        _mail.observe(True)
+        _previous = {_mail.signature: {"evaluations": 10, "matches": 3}}
+        _statistics = _policy.collect_statistics(_previous)
+        self.assertEqual({"evaluations": 12, "matches": 4}, _statistics[_mail.signature])
+        self.assertEqual({"evaluations": 10, "matches": 3}, _previous[_mail.signature])
+
+    def test_ordered_sections(self):
+        _users_conf = [
+            {"days_valid": 1, "time_attributes": []},
+            {"days_valid": 2, "time_attributes": [], "condition_attributes": {"mail": {"values": ["a"]}}},
+            {"days_valid": 3, "time_attributes": [], "condition_attributes": {
+                "mail": {"values": ["a"]}, "memberOf.businessCategory": {"values": ["b"]}}},
+            {"days_valid": 4, "time_attributes": [], "condition_attributes": {"sn": {"values": ["a"]}}}]
+        _policy = CompiledPolicy(_users_conf)
+        self.assertEqual([2, 1, 3, 0], list(_x.index for _x in _policy.ordered_sections))
+        self.assertEqual([1, 2], list(_x.index for _x in _policy.sections_by_attribute["mail"]))
+        self.assertEqual([2], list(_x.index for _x in _policy.sections_by_attribute["memberof"]))
+        self.assertEqual([3], list(_x.index for _x in _policy.sections_by_attribute["sn"]))
+
+        _usr = OcLdapUserRecord()
+        _usr.set_attribute("mail", "a")
+        self.assertEqual({2, 3}, _policy.get_inapplicable_sections(_usr))
+        _usr.set_attribute("memberOf", "cn=group,dc=example,dc=local")
+        self.assertEqual({3}, _policy.get_inapplicable_sections(_usr))
+
+    def test_fingerprint(self):
+        _policy = CompiledPolicy(self._get_users_conf())
+        self.assertEqual(["displayname", "mail", "memberof"], _policy.condition_attributes)
+
+        _usr_1 = OcLdapUserRecord()
+        _usr_1.set_attribute("cn", "first")
+        _usr_1.set_attribute("mail", "test@example.local")
+        _usr_1.set_attribute("memberOf", ["cn=a,dc=local", "cn=b,dc=local"])
+
+        _usr_2 = OcLdapUserRecord()
+        _usr_2.set_attribute("cn", "second")
+        _usr_2.set_attribute("mail", "test@example.local")
+        _usr_2.set_attribute("memberOf", ["cn=b,dc=local", "cn=a,dc=local", "cn=a,dc=local", ""])
+        self.assertEqual(_policy.get_fingerprint(_usr_1), _policy.get_fingerprint(_usr_2))
+
+        _usr_2.set_attribute("displayName", "Test")
+        self.assertNotEqual(_policy.get_fingerprint(_usr_1), _policy.get_fingerprint(_usr_2))
+
+    def test_user_attributes(self):
+        _users_conf = self._get_users_conf()
+        self.assertEqual(["cn", "mail", "displayName", "memberOf", "authTimestamp"],
+                         CompiledPolicy(_users_conf).user_attributes)
+
+        _users_conf[1]["time_attributes"] = ["AuthTimestamp", "createTimestamp"]
+        _users_conf[1]["lock_notifications"] = [{"days_before": 1, "template": {"file": "template"}}]
+        _policy = CompiledPolicy(_users_conf)
+        self.assertEqual(["cn", "mail", "displayName", "memberOf", "authTimestamp", "createTimestamp",
+                          "givenName", "sn"], _policy.user_attributes)
+        self.assertEqual(tuple(_policy.user_attributes), _policy.user_schema.attributes)
+
+    def test_projection(self):
+        _users_conf = self._get_users_conf()
+        _users_conf[1]["condition_attributes"] = {
+            "manager.memberOf.BusinessCategory": {"values": ["Vendor"]},
+            "ObjectClass": {"values": ["inetOrgPerson"]}}
+        _policy = CompiledPolicy(_users_conf)
+        self.assertEqual(_policy.user_attributes + ["pwdAccountLockedTime"], _policy.user_projection)
+        self.assertIn("ObjectClass", _policy.user_projection)
+        self.assertNotIn("objectClass", _policy.user_projection)
+        self.assertEqual(["businessCategory", "memberOf"], sorted(_policy.referenced_projection))
+
+        _policy = CompiledPolicy([{"days_valid": 30, "time_attributes": ["modifyTimestamp"]}])
+        self.assertEqual(["cn", "modifyTimestamp", "objectClass", "pwdAccountLockedTime"], _policy.user_projection)
+        self.assertEqual([], _policy.referenced_projection)
@@ -0,0 +1,197 @@
+import unittest
+import unittest.mock
+from ..pool import LdapConnectionPool, SessionTls, clone_connection, is_alive
+import ldap3
+import os
+import socket
+import ssl
+import threading
+import time
+import types
+
+# remove unnecessary log output
+import logging
+logging.getLogger().propagate = False
+logging.getLogger().disabled = True
+
+_KEY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ssl_keys')
+
+class LdapConnectionPoolTest(unittest.TestCase):
+    def _connect(self):
+        _ldap_c = unittest.mock.MagicMock()
+        _ldap_c.ldap_c.closed = False
+        _ldap_c.ldap_c.bound = True
+        self._created.append(_ldap_c)
+        return _ldap_c
+
+    def setUp(self):
+        self._created = list()
+
+    def test_acquire(self):
+        _pool = LdapConnectionPool(self._connect, 2)
+
+        with _pool.connection() as _first:
+            with _pool.connection() as _second:
+                self.assertIsNot(_first, _second)
+
+        # idle connections are reused, the last one released first
+        with _pool.connection() as _ldap_c:
+            self.assertIs(_first, _ldap_c)
+
+        self.assertEqual(2, len(self._created))
+        self.assertEqual({"created": 2, "reused": 1}, dict(_pool.stats))
+
+        with self.assertRaises(ValueError):
+            LdapConnectionPool(self._connect, 0)
+
+    def test_acquire__wait(self):
+        # all connections are taken: wait for one released
+        _pool = LdapConnectionPool(self._connect, 1)
+        _ldap_c = _pool.acquire()
+        _acquired = list()
+        _thread = threading.Thread(target=lambda: _acquired.append(_pool.acquire()))
+        _thread.start()
+        _thread.join(0.1)
+        self.assertEqual(list(), _acquired)
+        _pool.release(_ldap_c)
+        _thread.join(5)
+        self.assertEqual([_ldap_c], _acquired)
+        self.assertEqual(1, len(self._created))
+
+    def test_acquire__check(self):
+        # connection idle for long, or failed, is checked and bound again if dropped
+        _pool = LdapConnectionPool(self._connect, 1, check_interval=60)
+
+        with _pool.connection() as _ldap_c:
+            pass
+
+        with _pool.connection():
+            _ldap_c.ldap_c.search.assert_not_called()
+
+        with unittest.mock.patch("time.monotonic", return_value=time.monotonic() + 61):
+            _ldap_c.ldap_c.search.side_effect = ldap3.core.exceptions.LDAPSocketReceiveError("reset")
+
+            with _pool.connection():
+                _ldap_c.ldap_c.search.assert_called_once()
+                _ldap_c.ldap_c.open.assert_called_once()
+                _ldap_c.ldap_c.start_tls.assert_called_once()
+                _ldap_c.ldap_c.bind.assert_called_once()
+
+        _ldap_c.ldap_c.search.side_effect = None
+
+        with self.assertRaises(ValueError):
+            with _pool.connection():
+                raise ValueError("failed")
+
+        with _pool.connection():
+            self.assertEqual(2, _ldap_c.ldap_c.search.call_count)
+
+        self.assertEqual(1, len(self._created))
+        self.assertEqual(1, _pool.stats["rebound"])
+
+    def test_acquire__connect_failed(self):
+        # the place of the connection failed is free
+        _pool = LdapConnectionPool(unittest.mock.MagicMock(side_effect=ldap3.core.exceptions.LDAPSocketOpenError()), 1)
+
+        for _ in range(0, 2):
+            with self.assertRaises(ldap3.core.exceptions.LDAPSocketOpenError):
+                _pool.acquire()
+
+    def test_close(self):
+        _pool = LdapConnectionPool(self._connect, 2)
+
+        with _pool.connection() as _ldap_c:
+            pass
+
+        _pool.close()
+        _ldap_c.ldap_c.unbind.assert_called_once()
+
+        with _pool.connection() as _another:
+            self.assertIsNot(_ldap_c, _another)
+
+    def test_is_alive(self):
+        _connection = unittest.mock.MagicMock(closed=False, bound=True)
+        self.assertTrue(is_alive(_connection))
+        _connection.search.assert_called_once_with("", "(objectClass=*)", search_scope=ldap3.BASE, attributes=["1.1"])
+
+        _connection.bound = False
+        self.assertFalse(is_alive(_connection))
+
+
+class CloneConnectionTest(unittest.TestCase):
+    def test_clone_connection(self):
+        # the clone shares server and TLS settings of the connection given
+        _primary = unittest.mock.MagicMock()
+        _primary.ldap_c.server = ldap3.Server("localhost", tls=ldap3.Tls())
+
+        with unittest.mock.patch("ldap3.Connection") as _connection:
+            _clone = clone_connection(_primary)
+
+        self.assertIs(_primary.baseDn, _clone.baseDn)
+        self.assertIsInstance(_primary.ldap_c.server.tls, SessionTls)
+        self.assertIs(_primary.ldap_c.server, _connection.call_args[1]["server"])
+        self.assertEqual(_primary.ldap_c.sasl_mechanism, _connection.call_args[1]["sasl_mechanism"])
+        _clone.ldap_c.open.assert_called_once()
+        _clone.ldap_c.start_tls.assert_called_once()
+        _clone.ldap_c.bind.assert_called_once()
+
+    def _serve_tls(self, connections):
+        """
+        Start TLS server on a local port answering a single byte to every connection
+        :param int connections: connections to accept
+        :return tuple: server address
+        """
+        _context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        _context.load_cert_chain(os.path.join(_KEY_PATH, "server.pem"), os.path.join(_KEY_PATH, "server.priv.key"))
+        _listener = socket.socket()
+        _listener.bind(("127.0.0.1", 0))
+        _listener.listen(connections)
+
+        def _serve():
+            with _listener:
+                for _ in range(0, connections):
+                    _socket, _address = _listener.accept()
+
+                    with _context.wrap_socket(_socket, server_side=True) as _tls_socket:
+                        _tls_socket.sendall(b"x")
+                        _tls_socket.recv(1)
+
+        threading.Thread(target=_serve, daemon=True).start()
+        return _listener.getsockname()
+
+    def _connect_tls(self, tls, address):
+        """
+        :return: connection stand-in with the socket wrapped by the TLS settings given, the first byte read
+        """
+        _connection = types.SimpleNamespace(socket=socket.create_connection(address, timeout=10),
+                                            server=types.SimpleNamespace(host="localhost"))
+        tls.wrap_socket(_connection, do_handshake=True)
+        # TLS 1.3 tickets arrive with the data after the handshake
+        self.assertEqual(b"x", _connection.socket.recv(1))
+        return _connection
+
+    def test_session_tls__resume(self):
+        # the session of the client connection belongs to another context and is not resumed,
+        # sessions of the connections wrapped by the settings are
+        _address = self._serve_tls(3)
+        _client_tls = ldap3.Tls(validate=ssl.CERT_NONE)
+        _primary = self._connect_tls(_client_tls, _address)
+        _tls = SessionTls(_client_tls)
+        _tls.remember(_primary.socket)
+        _primary.socket.close()
+
+        _first = self._connect_tls(_tls, _address)
+        self.assertFalse(_first.socket.session_reused)
+        _tls.remember(_first.socket)
+        _first.socket.close()
+
+        _second = self._connect_tls(_tls, _address)
+        self.assertTrue(_second.socket.session_reused)
+        self.assertEqual(1, _tls.resumed)
+        _second.socket.close()
+
+    def test_session_tls(self):
+        # settings are kept, the context is made once
+        _tls = SessionTls(ldap3.Tls(ca_certs_file=None, version=None))
+        self.assertIsNone(_tls.ca_certs_file)
+        self.assertIs(_tls._get_context(), _tls._get_context())
@@ -0,0 +1,51 @@
+import unittest
+from ..profiler import RuleProfiler
+
+# remove unnecessary log output
+import logging
+logging.getLogger().propagate = False
+logging.getLogger().disabled = True
+
+class RuleProfilerTest(unittest.TestCase):
+    def test_counters(self):
+        _profiler = RuleProfiler()
+
+        _started = _profiler.begin(0)
+        _started_c = _profiler.begin(0, "memberOf.businessCategory")
+        _profiler.add_fetch()
+        _profiler.add_fetch()
+        _profiler.end(_started_c, 0, "memberOf.businessCategory", matched=False, short_circuit=True)
+        _profiler.end(_started, 0, matched=False)
+
+        _started = _profiler.begin(1)
+        _started_c = _profiler.begin(1, "mail")
+        _profiler.end(_started_c, 1, "mail", matched=True)
+        _profiler.end(_started, 1, matched=True)
+
+        _stats = _profiler._stats
+        self.assertEqual(4, len(_stats))
+        self.assertEqual(1, _stats[(0, None)].evaluations)
+        self.assertEqual(0, _stats[(0, None)].matches)
+        self.assertEqual(1, _stats[(0, None)].short_circuits)
+        self.assertEqual(2, _stats[(0, None)].fetches)
+        self.assertEqual(2, _stats[(0, "memberOf.businessCategory")].fetches)
+        self.assertEqual(1, _stats[(1, "mail")].matches)
+        self.assertEqual(0, _stats[(1, "mail")].fetches)
+
+    def test_fetch_outside_section(self):
+        _profiler = RuleProfiler()
+        _profiler.add_fetch()
+        self.assertEqual(0, len(_profiler._stats))
+
+    def test_report_sorted(self):
+        _profiler = RuleProfiler()
+        _profiler.end(_profiler.begin(0, "mail") - 0.5, 0, "mail")
+        _profiler.end(_profiler.begin(1, "memberOf.businessCategory") - 2.0, 1, "memberOf.businessCategory")
+        _profiler.end(_profiler.begin(2, "sn") - 1.0, 2, "sn")
+
+        _lines = _profiler.report().splitlines()
+        self.assertEqual(4, len(_lines))
+        self.assertTrue(_lines[0].startswith("section"))
+        self.assertEqual(["#1", "memberOf.businessCategory"], _lines[1].split()[:2])
+        self.assertEqual(["#2", "sn"], _lines[2].split()[:2])
+        self.assertEqual(["#0", "mail"], _lines[3].split()[:2])
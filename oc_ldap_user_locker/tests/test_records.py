@@ -0,0 +1,74 @@
+import unittest
+from oc_ldap_client.oc_ldap_objects import OcLdapUserRecord
+from ..records import UserViewSchema, UserView
+import datetime
+import tracemalloc
+
+# remove unnecessary log output
+import logging
+logging.getLogger().propagate = False
+logging.getLogger().disabled = True
+
+class UserViewTest(unittest.TestCase):
+    def _get_ldap_record(self, idx):
+        # as returned from LDAP: every value is a distinct object
+        _groups = list(("cn=group%03d,ou=groups,dc=some,dc=test,dc=domain,dc=local" % _x).encode().decode()
+                       for _x in range(idx % 50, idx % 50 + 100))
+
+        return {
+            "dn": "cn=user%d,dc=some,dc=test,dc=domain,dc=local" % idx,
+            "attributes": {
+                "objectClass": ["inetOrgPerson"],
+                "cn": ["user%d" % idx],
+                "mail": ["user%d@example.local" % idx],
+                "memberOf": _groups,
+                "authTimestamp": [datetime.datetime.now()],
+                "description": ["x" * 300],
+                "jpegPhoto": [b"x" * 3000]}}
+
+    def test_get_attribute(self):
+        _schema = UserViewSchema(["cn", "mail", "memberOf", "authTimestamp", "sn"])
+        _ldap_rec = self._get_ldap_record(1)
+        _view = _schema.make_view(_ldap_rec["dn"], _ldap_rec["attributes"])
+        _user_rec = OcLdapUserRecord(_ldap_rec)
+
+        self.assertIsInstance(_view, UserView)
+        self.assertEqual(_user_rec.dn, _view.dn)
+
+        for _attrib in ["cn", "CN", "mail", "memberOf", "memberof", "authTimestamp", "sn", "description"]:
+            _expected = _user_rec.get_attribute(_attrib) if _attrib != "description" else None
+            self.assertEqual(_expected, _view.get_attribute(_attrib))
+
+        self.assertIsInstance(_view.get_attribute("memberOf"), list)
+
+        with self.assertRaises(ValueError):
+            _view.get_attribute(None)
+
+        with self.assertRaises(AttributeError):
+            _view.another = 1
+
+        _view = _schema.make_view_from_record(_user_rec)
+        self.assertEqual(_user_rec.dn, _view.dn)
+        self.assertEqual(_user_rec.get_attribute("memberOf"), _view.get_attribute("memberOf"))
+        self.assertEqual(_user_rec.get_attribute("cn"), _view.get_attribute("cn"))
+
+    def test_memory(self):
+        _schema = UserViewSchema(["cn", "mail", "memberOf", "authTimestamp"])
+        _ldap_recs = list(self._get_ldap_record(_x) for _x in range(0, 200))
+
+        tracemalloc.start()
+        _records = list(OcLdapUserRecord(_x) for _x in _ldap_recs)
+        _records_size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del _records
+
+        _ldap_recs = list(self._get_ldap_record(_x) for _x in range(0, 200))
+
+        tracemalloc.start()
+        _views = list(_schema.make_view(_x["dn"], _x["attributes"]) for _x in _ldap_recs)
+        _views_size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        # source records are dropped after conversion, and group DNs are shared by views
+        del _ldap_recs
+        self.assertGreater(_records_size, _views_size * 4)
@@ -0,0 +1,93 @@
+import unittest
+import unittest.mock
+from ..resilience import RetryPolicy, CircuitBreaker, is_transient_ldap_error, is_transient_smtp_error
+from ldap3.core.exceptions import LDAPCommunicationError, LDAPOperationResult
+import smtplib
+import socket
+
+# remove unnecessary log output
+import logging
+logging.getLogger().propagate = False
+logging.getLogger().disabled = True
+
+class RetryPolicyTest(unittest.TestCase):
+    def test_is_transient(self):
+        self.assertTrue(is_transient_ldap_error(LDAPCommunicationError("lost")))
+        self.assertTrue(is_transient_ldap_error(socket.timeout()))
+        self.assertTrue(is_transient_ldap_error(LDAPOperationResult(result=51)))
+        self.assertFalse(is_transient_ldap_error(LDAPOperationResult(result=50)))
+        self.assertFalse(is_transient_ldap_error(ValueError()))
+
+        self.assertTrue(is_transient_smtp_error(smtplib.SMTPServerDisconnected()))
+        self.assertTrue(is_transient_smtp_error(smtplib.SMTPResponseException(421, "busy")))
+        self.assertFalse(is_transient_smtp_error(smtplib.SMTPResponseException(550, "no such user")))
+        self.assertFalse(is_transient_smtp_error(ValueError()))
+
+    def test_get_delay(self):
+        _policy = RetryPolicy(retries=5, delay=2, max_delay=5)
+
+        for _attempt, _limit in [(1, 2), (2, 4), (3, 5), (10, 5)]:
+            for _ in range(0, 20):
+                self.assertTrue(0 <= _policy.get_delay(_attempt) <= _limit)
+
+        with self.assertRaises(ValueError):
+            RetryPolicy(retries=-1)
+
+    def test_call(self):
+        _policy = RetryPolicy(retries=2, delay=0)
+        _func = unittest.mock.MagicMock(side_effect=[ConnectionError(), ConnectionError(), "result"])
+        _on_retry = unittest.mock.MagicMock()
+        self.assertEqual("result", _policy.call(_func, lambda _e: isinstance(_e, ConnectionError), _on_retry))
+        self.assertEqual(3, _func.call_count)
+        self.assertEqual(2, _on_retry.call_count)
+
+        # retries exhausted
+        _func = unittest.mock.MagicMock(side_effect=ConnectionError())
+
+        with self.assertRaises(ConnectionError):
+            _policy.call(_func, lambda _e: isinstance(_e, ConnectionError))
+
+        self.assertEqual(3, _func.call_count)
+
+        # permanent error is not repeated
+        _func = unittest.mock.MagicMock(side_effect=ValueError())
+
+        with self.assertRaises(ValueError):
+            _policy.call(_func, lambda _e: isinstance(_e, ConnectionError))
+
+        self.assertEqual(1, _func.call_count)
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def test_states(self):
+        _breaker = CircuitBreaker("test", failures=2, reset_timeout=10)
+
+        with unittest.mock.patch("time.monotonic", return_value=100):
+            self.assertTrue(_breaker.allow())
+            _breaker.record_failure()
+            self.assertFalse(_breaker.is_open)
+            _breaker.record_failure()
+            self.assertTrue(_breaker.is_open)
+            self.assertFalse(_breaker.allow())
+
+        # a single trial after reset timeout, its failure opens the breaker again
+        with unittest.mock.patch("time.monotonic", return_value=111):
+            self.assertTrue(_breaker.allow())
+            self.assertFalse(_breaker.allow())
+            _breaker.record_failure()
+            self.assertFalse(_breaker.allow())
+
+        with unittest.mock.patch("time.monotonic", return_value=122):
+            self.assertTrue(_breaker.allow())
+            _breaker.record_success()
+            self.assertFalse(_breaker.is_open)
+            self.assertTrue(_breaker.allow())
+
+        # success resets the failure count
+        _breaker.record_failure()
+        _breaker.record_success()
+        _breaker.record_failure()
+        self.assertFalse(_breaker.is_open)
+
+        with self.assertRaises(ValueError):
+            CircuitBreaker("test", failures=0)
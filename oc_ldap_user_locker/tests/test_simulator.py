@@ -0,0 +1,109 @@
+import unittest
+import unittest.mock
+from .mocks.randomizer import Randomizer
+import os
+import tempfile
+import datetime
+import json
+from ..policy import CompiledPolicy
+from ..snapshot import DirectorySnapshot
+from ..simulator import simulate, format_report, NO_SECTION
+
+# remove unnecessary log output
+import logging
+logging.getLogger().propagate = False
+logging.getLogger().disabled = True
+
+class SimulatorTest(unittest.TestCase):
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self._now = datetime.datetime(2024, 3, 10, 12, 0)
+        self._config = {"users": [
+            {"days_valid": 10, "time_attributes": ["authTimestamp"], "condition_attributes": {
+                "memberOf.businessCategory": {"values": ["Vendor"]}},
+             "lock_notifications": [{"days_before": 3, "template": {"file": "template"}}]},
+            {"days_valid": 30, "time_attributes": ["authTimestamp", "createTimestamp"]}]}
+
+    def tearDown(self):
+        for _name in os.listdir(self._dir):
+            os.remove(os.path.join(self._dir, _name))
+
+        os.rmdir(self._dir)
+
+    def _write_snapshot(self, count):
+        # records as read from LDAP, with time values
+        rnd = Randomizer()
+        _records = {
+            "cn=vendor,dc=local": {"businessCategory": ["Vendor"]},
+            "cn=other,dc=local": {"businessCategory": ["Other"]}}
+        _users = list()
+
+        for _idx in range(0, count):
+            _dn = "cn=user%05d,dc=local" % _idx
+            _users.append(_dn)
+            _records[_dn] = {
+                "cn": ["user%05d" % _idx],
+                "mail": ["user%05d@example.local" % _idx] if _idx % 3 else [],
+                "memberOf": ["cn=vendor,dc=local"] if _idx % 2 else ["cn=other,dc=local"],
+                "authTimestamp": [self._now - datetime.timedelta(days=rnd.random_number(0, 40), hours=rnd.random_number(0, 23))]}
+
+        _path = os.path.join(self._dir, "snapshot.db")
+
+        with unittest.mock.patch("oc_ldap_user_locker.snapshot.read_record",
+                                 side_effect=lambda _c, _dn, _attrs: (_dn, _records[_dn])):
+            DirectorySnapshot(_path).write(None, _users, CompiledPolicy(self._config["users"]))
+
+        return (_path, _records)
+
+    def _write_config(self):
+        _path = os.path.join(self._dir, "config.json")
+
+        with open(_path, mode='wt') as _fl_out:
+            json.dump(self._config, _fl_out)
+
+        return _path
+
+    def _get_expected(self, records, days):
+        # straightforward calculation for the configuration above
+        _result = dict()
+
+        for _dn, _attributes in records.items():
+            if "cn" not in _attributes:
+                continue
+
+            _vendor = _attributes["memberOf"] == ["cn=vendor,dc=local"]
+            _section = 0 if _vendor else 1
+            _result[(_section, None, "users")] = _result.get((_section, None, "users"), 0) + 1
+            _lock_date = _attributes["authTimestamp"][0] + datetime.timedelta(days=10 if _vendor else 30)
+
+            for _day in range(0, days):
+                _days = (_lock_date - self._now - datetime.timedelta(days=_day)).days
+
+                if _vendor and _attributes["mail"] and max(_days, 0) == 3:
+                    _result[(_section, _day, "notifications")] = _result.get((_section, _day, "notifications"), 0) + 1
+
+                if _days <= 0:
+                    _result[(_section, _day, "locks")] = _result.get((_section, _day, "locks"), 0) + 1
+                    break
+
+        return _result
+
+    def test_simulate(self):
+        _snapshot_path, _records = self._write_snapshot(300)
+        _config_path = self._write_config()
+        _expected = self._get_expected(_records, 14)
+        self.assertEqual(_expected, simulate(_config_path, _snapshot_path, days=14, workers=1, now=self._now))
+
+        with self.assertRaises(ValueError):
+            simulate(_config_path, _snapshot_path, days=0, workers=1)
+
+        _report = format_report(_expected, 14, self._now)
+        self.assertIn("2024-03-10", _report)
+        self.assertNotIn(NO_SECTION, _report)
+
+    def test_simulate__workers(self):
+        # the same result with process pool
+        _snapshot_path, _records = self._write_snapshot(2500)
+        _config_path = self._write_config()
+        self.assertEqual(self._get_expected(_records, 5),
+                         simulate(_config_path, _snapshot_path, days=5, workers=2, now=self._now))
@@ -0,0 +1,116 @@
+import unittest
+import unittest.mock
+from .mocks.ldap3 import MockLdapConnection
+from .mocks.randomizer import Randomizer
+import os
+import tempfile
+import datetime
+from oc_ldap_client.oc_ldap_objects import OcLdapUserCat, OcLdapGroupRecord, OcLdapUserRecord
+from ..policy import CompiledPolicy
+from ..snapshot import DirectorySnapshot, _encode_value, _decode_value
+import json
+
+# remove unnecessary log output
+import logging
+logging.getLogger().propagate = False
+logging.getLogger().disabled = True
+
+class DirectorySnapshotTest(unittest.TestCase):
+    def _get_ldap_user_cat(self):
+        # return patched OcLdapUserCat
+        self_dir = os.path.dirname(os.path.abspath(__file__))
+        key_path = os.path.join(self_dir, 'ssl_keys')
+
+        with unittest.mock.patch('ldap3.Connection', new=MockLdapConnection):
+            ldap_t = OcLdapUserCat(url='ldap://localhost:389',
+                user_cert=os.path.join(key_path, 'user.pem'),
+                user_key=os.path.join(key_path, 'user.priv.key'),
+                ca_chain=os.path.join(key_path, 'ca_chain.pem'),
+                baseDn='dc=some,dc=test,dc=domain,dc=local')
+
+        return ldap_t
+
+    def test_encode_values(self):
+        _values = {"authTimestamp": datetime.datetime(2024, 3, 10, 12, 0, tzinfo=datetime.timezone.utc),
+                   "jpegPhoto": b"\x00\x01", "cn": "user", "memberOf": ["a", "b"]}
+        self.assertEqual(_values, json.loads(json.dumps(_values, default=_encode_value), object_hook=_decode_value))
+
+        with self.assertRaises(TypeError):
+            json.dumps({"a": object()}, default=_encode_value)
+
+    def test_write_read(self):
+        rnd = Randomizer()
+        _ldap_c = self._get_ldap_user_cat()
+        _policy = CompiledPolicy([{"days_valid": 10, "time_attributes": ["authTimestamp"], "condition_attributes": {
+            "memberOf.businessCategory": {"values": ["Vendor"]},
+            "mail": {"values": ["test@example.local"]}}}])
+
+        _groups = list()
+
+        for _category in ["Vendor", "Client", "Other"]:
+            _group = OcLdapGroupRecord()
+            _group.set_attribute('cn', rnd.random_letters(10))
+            _group.set_attribute('businessCategory', _category)
+            _group.set_attribute('description', rnd.random_letters(100))
+            _groups.append(_ldap_c.put_record(_group).dn)
+
+        _users = list()
+
+        for _idx in range(0, 5):
+            usr = OcLdapUserRecord()
+            usr.set_attribute('cn', rnd.random_letters(10 + _idx))
+            usr.set_attribute('mail', "test@example.local")
+            usr.set_attribute('description', rnd.random_letters(100))
+            usr.set_attribute('memberOf', _groups[:_idx % 2 + 1])
+            _users.append(_ldap_c.put_record(usr).dn)
+
+        _path = os.path.join(tempfile.mkdtemp(), "snapshot.db")
+        _snapshot = DirectorySnapshot(_path)
+        self.assertIsNone(_snapshot.get_age())
+
+        with self.assertRaises(FileNotFoundError):
+            _snapshot.open()
+
+        try:
+            _snapshot.write(_ldap_c, _users + ["cn=absent,dc=some,dc=test,dc=domain,dc=local"], _policy,
+                            change_state="timestamp:20240101000000Z")
+            self.assertLess(_snapshot.get_age(), 60)
+            _snapshot.open()
+            self.assertEqual("timestamp:20240101000000Z", _snapshot.change_state)
+            self.assertEqual(sorted(_users, key=lambda _x: _x.lower()), list(_snapshot.iter_users()))
+            self.assertTrue(_snapshot.covers(_policy.user_projection, _policy.referenced_projection))
+            self.assertFalse(_snapshot.covers(_policy.user_projection + ["sn"], _policy.referenced_projection))
+
+            _dn, _attributes = _snapshot.read_record(_users[1].upper(), _policy.user_projection)
+            self.assertEqual(_users[1], _dn)
+            self.assertEqual(set(_policy.user_projection), set(_attributes.keys()))
+            self.assertEqual(_groups[:2], _attributes["memberOf"])
+            self.assertEqual(["mail"], list(_snapshot.read_record(_users[1], ["MAIL"])[1].keys()))
+            self.assertIsNone(_snapshot.read_record(_users[1], ["cn"], referenced=True))
+
+            # groups referenced only, projected attributes only
+            self.assertEqual({_groups[0]: {"businessCategory": ["Vendor"]}, _groups[1]: {"businessCategory": ["Client"]}},
+                             dict(_snapshot.iter_referenced("businessCategory")))
+            self.assertEqual({}, dict(_snapshot.iter_referenced("description")))
+            self.assertIsNone(_snapshot.read_record(_groups[2], ["businessCategory"], referenced=True))
+
+            with self.assertRaises(ValueError):
+                _snapshot.read_record(None, ["cn"])
+
+            # stopped: the users are not all given, the previous snapshot is kept
+            _snapshot.close()
+            _calls = list()
+
+            def _call_ldap(func):
+                _calls.append(func)
+                return func(_ldap_c)
+
+            self.assertFalse(_snapshot.write(None, _users[:1], _policy, call_ldap=_call_ldap, is_stopped=lambda: True))
+            self.assertEqual(1, len(_calls))
+            self.assertFalse(os.path.exists(_path + ".tmp"))
+            _snapshot.open()
+            self.assertEqual(len(_users), len(list(_snapshot.iter_users())))
+        finally:
+            _snapshot.close()
+            os.remove(_path)
+            os.rmdir(os.path.dirname(_path))
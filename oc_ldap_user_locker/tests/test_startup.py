@@ -0,0 +1,54 @@
+import unittest
+import subprocess
+import sys
+
+# remove unnecessary log output
+import logging
+logging.getLogger().propagate = False
+logging.getLogger().disabled = True
+
+# modules not needed until the first notification is sent or the first batch is processed
+_DEFERRED_MODULES = ["oc_mailer", "smtplib", "email.mime", "numpy"]
+
+# heavy modules of the package itself, imported on demand as well
+_DEFERRED_OWN_MODULES = ["oc_ldap_user_locker.mailer", "oc_ldap_user_locker.workers"]
+
+class StartupTest(unittest.TestCase):
+    def _get_import_times(self, module):
+        # 'python -X importtime' report: {module: (self time, cumulative time)}
+        _result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import %s" % module],
+                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+        _times = dict()
+
+        for _line in _result.stderr.splitlines():
+            if not _line.startswith("import time:"):
+                continue
+
+            _self, _cumulative, _name = _line[len("import time:"):].split("|")
+
+            if not _self.strip().isdigit():
+                # header
+                continue
+
+            _times[_name.strip()] = (int(_self), int(_cumulative))
+
+        return _times
+
+    def test_deferred_imports(self):
+        for _module in ["oc_ldap_user_locker.locker", "oc_ldap_user_locker.daemon"]:
+            _times = self._get_import_times(_module)
+            self.assertIn(_module, _times)
+
+            for _deferred in _DEFERRED_MODULES:
+                self.assertNotIn(_deferred, _times, "'%s' imported by '%s'" % (_deferred, _module))
+
+    def test_loaded_modules(self):
+        # checked by loaded modules, not by time which depends on the host load
+        _result = subprocess.run(
+                [sys.executable, "-c", "import sys, oc_ldap_user_locker.locker; print('\\n'.join(sys.modules))"],
+                stdout=subprocess.PIPE, universal_newlines=True, check=True)
+        _loaded = set(_result.stdout.splitlines())
+        self.assertIn("oc_ldap_user_locker.locker", _loaded)
+
+        for _deferred in _DEFERRED_MODULES + _DEFERRED_OWN_MODULES:
+            self.assertNotIn(_deferred, _loaded)
@@ -0,0 +1,142 @@
+import unittest
+import unittest.mock
+from .mocks.ldap3 import MockLdapConnection
+from .mocks.randomizer import Randomizer
+import os
+from oc_ldap_client.oc_ldap_objects import OcLdapUserCat, OcLdapGroupRecord, OcLdapUserRecord
+from ..sync import ChangeTracker, SYNC_REFRESH_ONLY, SYNC_STATE_MODIFY, SYNC_DONE_OID
+from ..sync import encode_sync_request, decode_sync_request, encode_sync_state, decode_sync_state
+from ..sync import encode_sync_done, decode_sync_done
+
+# remove unnecessary log output
+import logging
+logging.getLogger().propagate = False
+logging.getLogger().disabled = True
+
+class ChangeTrackerTest(unittest.TestCase):
+    def _get_ldap_user_cat(self):
+        # return patched OcLdapUserCat
+        self_dir = os.path.dirname(os.path.abspath(__file__))
+        key_path = os.path.join(self_dir, 'ssl_keys')
+
+        with unittest.mock.patch('ldap3.Connection', new=MockLdapConnection):
+            ldap_t = OcLdapUserCat(url='ldap://localhost:389',
+                user_cert=os.path.join(key_path, 'user.pem'),
+                user_key=os.path.join(key_path, 'user.priv.key'),
+                ca_chain=os.path.join(key_path, 'ca_chain.pem'),
+                baseDn='dc=some,dc=test,dc=domain,dc=local')
+
+        return ldap_t
+
+    def _put_user(self, ldap_c, **attributes):
+        rnd = Randomizer()
+        usr = OcLdapUserRecord()
+        usr.set_attribute('cn', rnd.random_letters(rnd.random_number(7, 17)))
+
+        for _name, _value in attributes.items():
+            usr.set_attribute(_name, _value)
+
+        return ldap_c.put_record(usr)
+
+    def test_codec(self):
+        self.assertEqual((SYNC_REFRESH_ONLY, None), decode_sync_request(encode_sync_request()))
+        self.assertEqual((SYNC_REFRESH_ONLY, b"cookie"), decode_sync_request(encode_sync_request(b"cookie")))
+        self.assertEqual((SYNC_STATE_MODIFY, b"u" * 16), decode_sync_state(encode_sync_state(SYNC_STATE_MODIFY, b"u" * 16)))
+        self.assertEqual(b"cookie", decode_sync_done(encode_sync_done(b"cookie")))
+        self.assertIsNone(decode_sync_done(encode_sync_done(None, refresh_deletes=True)))
+
+    def test_mode(self):
+        _ldap_c = self._get_ldap_user_cat()
+
+        with self.assertRaises(NotImplementedError):
+            ChangeTracker(_ldap_c, mode="unknown")
+
+        _tracker = ChangeTracker(_ldap_c, mode="sync")
+        self.assertFalse(_tracker.is_valid_state(None))
+        self.assertFalse(_tracker.is_valid_state("timestamp:20240101000000Z"))
+        self.assertTrue(_tracker.is_valid_state(_tracker.get_state()))
+
+        with self.assertRaises(ValueError):
+            _tracker.get_changed_users("timestamp:20240101000000Z")
+
+    def test_sync(self):
+        rnd = Randomizer()
+        _ldap_c = self._get_ldap_user_cat()
+        _group = OcLdapGroupRecord()
+        _group.set_attribute('cn', rnd.random_letters(10))
+        _group = _ldap_c.put_record(_group)
+        _member = self._put_user(_ldap_c, memberOf=[_group.dn])
+        _another = self._put_user(_ldap_c)
+        _locked = self._put_user(_ldap_c, pwdAccountLockedTime="000001010000Z")
+
+        _tracker = ChangeTracker(_ldap_c, mode="sync", page_size=2)
+        _state = _tracker.get_state()
+        self.assertEqual(([], _state), _tracker.get_changed_users(_state))
+
+        # changed users and members of changed groups
+        _another.set_attribute('mail', "test@example.local")
+        _ldap_c.put_record(_another)
+        _added = self._put_user(_ldap_c)
+        _changed, _state = _tracker.get_changed_users(_state)
+        self.assertEqual(sorted([_another.dn, _added.dn]), _changed)
+
+        _group.set_attribute('businessCategory', "Vendor")
+        _ldap_c.put_record(_group)
+        _locked.set_attribute('mail', "locked@example.local")
+        _ldap_c.put_record(_locked)
+        _changed, _state = _tracker.get_changed_users(_state)
+        self.assertEqual([_member.dn], _changed)
+        self.assertEqual([], _tracker.get_changed_users(_state)[0])
+
+    def test_scan(self):
+        # all users and the state by a single search
+        rnd = Randomizer()
+        _ldap_c = self._get_ldap_user_cat()
+        _group = OcLdapGroupRecord()
+        _group.set_attribute('cn', rnd.random_letters(10))
+        _ldap_c.put_record(_group)
+        _users = sorted(self._put_user(_ldap_c).dn for _idx in range(0, 3))
+        self._put_user(_ldap_c, pwdAccountLockedTime="000001010000Z")
+
+        _tracker = ChangeTracker(_ldap_c, mode="sync", page_size=2)
+
+        with unittest.mock.patch.object(_ldap_c.ldap_c, "search", side_effect=_ldap_c.ldap_c.search) as _search:
+            _found, _state = _tracker.scan()
+
+        self.assertEqual(1, _search.call_count)
+        self.assertEqual(_users, list(_found))
+        self.assertEqual([], _tracker.get_changed_users(_state)[0])
+
+        _found, _state = ChangeTracker(_ldap_c, page_size=2).scan()
+        self.assertTrue(_state.startswith("timestamp:"))
+        self.assertEqual(_users, sorted(_found))
+
+    def test_sync__refresh_required(self):
+        # expired cookie: everything is reloaded
+        _ldap_c = unittest.mock.MagicMock()
+        _results = [{"result": 4096}, {"result": 0, "controls": {SYNC_DONE_OID: {"value": encode_sync_done(b"new")}}}]
+        _ldap_c.ldap_c.search.side_effect = lambda **_x: setattr(_ldap_c.ldap_c, "result", _results.pop(0))
+        _ldap_c.ldap_c.response = [{"type": "searchResEntry", "dn": "cn=user,dc=local",
+                                    "attributes": {"objectClass": ["inetOrgPerson"]}}]
+
+        _tracker = ChangeTracker(_ldap_c, mode="sync")
+        self.assertEqual((["cn=user,dc=local"], "sync:bmV3"), _tracker.get_changed_users("sync:b2xk"))
+        self.assertEqual(2, _ldap_c.ldap_c.search.call_count)
+
+    def test_timestamp(self):
+        rnd = Randomizer()
+        _ldap_c = self._get_ldap_user_cat()
+        _group = OcLdapGroupRecord()
+        _group.set_attribute('cn', rnd.random_letters(10))
+        _group.set_attribute('modifyTimestamp', "20240301000000Z")
+        _group = _ldap_c.put_record(_group)
+        _member = self._put_user(_ldap_c, memberOf=[_group.dn], modifyTimestamp="20240101000000Z")
+        _changed = self._put_user(_ldap_c, modifyTimestamp="20240201000000Z")
+        self._put_user(_ldap_c, modifyTimestamp="20230101000000Z")
+
+        _tracker = ChangeTracker(_ldap_c)
+        self.assertTrue(_tracker.get_state().startswith("timestamp:"))
+        _users, _state = _tracker.get_changed_users("timestamp:20240115000000Z")
+        self.assertEqual(sorted([_member.dn, _changed.dn]), _users)
+        self.assertTrue(_tracker.is_valid_state(_state))
+        self.assertEqual([], _tracker.get_changed_users("timestamp:20240401000000Z")[0])
@@ -0,0 +1,113 @@
+import unittest
+import unittest.mock
+from .mocks.randomizer import Randomizer
+import os
+import tempfile
+import datetime
+import json
+from ..locker import OcLdapUserLocker
+from ..workers import EvaluationPool, _init_worker
+from .. import workers
+
+# remove unnecessary log output
+import logging
+logging.getLogger().propagate = False
+logging.getLogger().disabled = True
+
+class EvaluationPoolTest(unittest.TestCase):
+    def setUp(self):
+        _fd, self._config_path = tempfile.mkstemp(suffix=".json")
+        os.close(_fd)
+
+        with open(self._config_path, mode='wt') as _fl_out:
+            json.dump({"users": [
+                {"days_valid": 10, "time_attributes": ["authTimestamp", "modifyTimestamp"]},
+                {"days_valid": 20, "time_attributes": ["authTimestamp"], "condition_attributes": {
+                    "mail": {"comparison": {"type": "regexp"}, "values": [".*@example\\.local"]}}},
+                {"days_valid": 30, "time_attributes": ["authTimestamp"], "condition_attributes": {
+                    "mail": {"values": ["nobody@another.local"]}}}]}, _fl_out)
+
+        rnd = Randomizer()
+        _now_t = datetime.datetime.now()
+        self._records = list()
+
+        for _idx in range(0, 30):
+            _attributes = {
+                "cn": [rnd.random_letters(rnd.random_number(10, 17))],
+                "mail": [rnd.random_letters(7) + rnd.random_number(0, 1) * "@example.local"],
+                "authTimestamp": []}
+
+            if _idx % 2:
+                _attributes["authTimestamp"] = [_now_t - datetime.timedelta(days=rnd.random_number(0, 40))]
+
+            self._records.append(("cn=user%d,dc=local" % _idx, _attributes))
+
+    def tearDown(self):
+        os.remove(self._config_path)
+
+    def _get_locker(self, workers=None):
+        _locker = OcLdapUserLocker(self._config_path, offline=True, workers=workers)
+        _locker._read_record = unittest.mock.MagicMock(side_effect=lambda _dn, _attrs: self._records[_dn])
+        _locker._get_user_view = unittest.mock.MagicMock(
+                side_effect=lambda _dn, _schema: _schema.make_view(*self._records[_dn]))
+        _locker._apply_lock_date = unittest.mock.MagicMock()
+        return _locker
+
+    def _get_applied(self, locker):
+        return sorted((_x[0][0].dn, _x[0][1]['days_valid'], _x[0][2], _x[0][3])
+                      for _x in locker._apply_lock_date.call_args_list)
+
+    def test_init_worker(self):
+        # the connection for referenced records is made as the locker makes it
+        _config = {"LDAP": {"url": "ldap://localhost:389"}, "users": [
+            {"days_valid": 10, "time_attributes": ["authTimestamp"], "condition_attributes": {
+                "memberOf.businessCategory": {"values": ["Vendor"]}}}]}
+        _ldap_c = unittest.mock.MagicMock()
+        _level = logging.getLogger().level
+
+        with unittest.mock.patch.object(OcLdapUserLocker, "_connect_ldap", return_value=_ldap_c) as _connect:
+            try:
+                _init_worker(self._config_path, _config, None, logging.WARNING)
+                _connect.assert_called_once_with()
+                self.assertIs(_ldap_c, workers._worker_locker._ldap_c)
+            finally:
+                workers._worker_locker = None
+                logging.getLogger().setLevel(_level)
+
+    def test_invalid_workers(self):
+        with self.assertRaises(ValueError):
+            EvaluationPool(self._get_locker(), 0)
+
+    def test_shutdown(self):
+        # batches not started are cancelled
+        with unittest.mock.patch("concurrent.futures.ProcessPoolExecutor") as _executor:
+            _executor.return_value.submit.side_effect = lambda *args: unittest.mock.MagicMock(
+                    done=unittest.mock.MagicMock(return_value=False))
+
+            with EvaluationPool(self._get_locker(), 2) as _pool:
+                _futures = list(_pool.submit(list()) for _ in range(0, 3))
+
+        for _future in _futures:
+            _future.cancel.assert_called_once()
+
+        _executor.return_value.shutdown.assert_called_once_with(wait=True)
+
+    def test_process_users_pooled(self):
+        # results are to be the same as for evaluation in this process
+        _locker = self._get_locker()
+        _locker._process_users_batch(list(range(0, len(self._records))))
+        _expected = self._get_applied(_locker)
+        self.assertEqual(15, len(_expected))
+
+        _locker = self._get_locker(workers=2)
+        self.assertEqual(dict(), _locker._get_policy().collect_statistics())
+
+        with EvaluationPool(_locker, 2) as _pool:
+            _locker._process_users_pooled(range(0, len(self._records)), _pool, 4)
+
+        self.assertEqual(_expected, self._get_applied(_locker))
+        _locker._get_user_view.assert_not_called()
+
+        # condition statistics observed by workers are counted here
+        _statistics = _locker._get_policy().collect_statistics()
+        self.assertLess(0, sum(_x["evaluations"] for _x in _statistics.values()))
@@ -0,0 +1,92 @@
+import concurrent.futures
+import logging
+from .locker import OcLdapUserLocker
+
+# worker process state, set by '_init_worker'
+_worker_locker = None
+
+
+def _init_worker(config_path, config, snapshot_path, log_level):
+    """
+    Worker process initialization: the locker with compiled policy is created once per process
+    Referenced records are read from the snapshot if given, from LDAP with own connection otherwise,
+    made as the locker does: with retries and timeouts configured
+    """
+    global _worker_locker
+    logging.getLogger().setLevel(log_level)
+    _locker = OcLdapUserLocker(config_path, snapshot_path=snapshot_path, offline=True, config=config)
+
+    if not snapshot_path and _locker._get_policy().referenced_projection:
+        _locker._ldap_c = _locker._connect_ldap()
+
+    _locker._prepare_evaluation()
+    _worker_locker = _locker
+
+
+def _evaluate_records(records):
+    """
+    Worker task: find configuration sections to apply
+    :param list records: tuples (DN, dictionary of projected attributes)
+    :return tuple: (list of section indexes, 'None' where nothing is suitable; condition statistics observed)
+    """
+    _policy = _worker_locker._get_policy()
+    _schema = _policy.user_schema
+    _section_indexes = dict((id(_x.conf), _x.index) for _x in _policy.sections)
+    _result = list()
+
+    for _dn, _attributes in records:
+        _conf = _worker_locker._find_valid_conf(_schema.make_view(_dn, _attributes))
+        _result.append(None if _conf is None else _section_indexes.get(id(_conf)))
+
+    return (_result, _policy.collect_statistics())
+
+
+class EvaluationPool:
+    def __init__(self, locker, workers):
+        """
+        Worker processes evaluating rules for batches of projected user records
+        Workers hold the compiled policy and return decisions only,
+        LDAP writes and mail sending are left to the calling process
+        :param OcLdapUserLocker locker: locker to take configuration and snapshot from, prepared for evaluation
+        :param int workers: number of worker processes
+        """
+        if not workers or workers < 1:
+            raise ValueError("Invalid number of workers: '%s'" % workers)
+
+        self._workers = workers
+        self._futures = list()
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_worker,
+                initargs=(locker._config_path, locker.config,
+                          locker._snapshot_path if locker._snapshot is not None else None,
+                          logging.getLogger().level))
+
+    @property
+    def workers(self):
+        return self._workers
+
+    def submit(self, records):
+        """
+        Schedule evaluation of a batch
+        :param list records: tuples (DN, dictionary of projected attributes)
+        :return concurrent.futures.Future: result of '_evaluate_records'
+        """
+        # the futures done are dropped, not to keep results of the whole run
+        self._futures = list(_x for _x in self._futures if not _x.done())
+        _future = self._executor.submit(_evaluate_records, records)
+        self._futures.append(_future)
+        return _future
+
+    def shutdown(self):
+        # batches not started yet are cancelled, 'cancel_futures' argument requires Python 3.9
+        for _future in self._futures:
+            _future.cancel()
+
+        self._futures = list()
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
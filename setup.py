@@ -12,8 +12,12 @@ spec = {
     "packages": ["oc_ldap_user_locker"],
     "install_requires": [ 
         'oc-ldap-client >= 1.0.0',
-        'oc-mailer'
+        'oc-mailer',
+        'pyasn1'
       ],
+    "extras_require": {
+        "bulk": ['numpy']
+      },
     "python_requires": ">=3.6"
 }
 